@@ -1,4 +1,11 @@
+from __future__ import annotations
+
 from dataclasses import dataclass
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
 
 @dataclass
 class Decision:
@@ -48,3 +55,109 @@ def decide_from_indicators(
         conf = min(1.0, 0.3 + 0.3*score_sell + (0.1*(trend_strength or 0)))
         return Decision("sell", conf, " & ".join(reasons))
     return Decision("hold", 0.2, "No strong signal")
+
+
+@dataclass
+class BatchDecision:
+    actions: np.ndarray       # dtype=object: "buy" | "sell" | "hold"
+    confidences: np.ndarray   # float64
+    reasons: np.ndarray       # dtype=object
+
+    def __len__(self) -> int:
+        return len(self.actions)
+
+    def __getitem__(self, i: int) -> Decision:
+        return Decision(str(self.actions[i]), float(self.confidences[i]), str(self.reasons[i]))
+
+
+def _column(values, n: int | None) -> np.ndarray | None:
+    import numpy as np
+
+    if values is None:
+        return None
+    arr = np.asarray([np.nan if v is None else v for v in values] if isinstance(values, (list, tuple))
+                     else values, dtype=np.float64)
+    if arr.ndim != 1 or (n is not None and len(arr) != n):
+        raise ValueError("all indicator columns must be 1-D and the same length")
+    return arr
+
+
+def decide_batch(
+    rsi=None,
+    macd=None,
+    macd_signal=None,
+    ema_fast=None,
+    ema_slow=None,
+    trend_strength=None,
+) -> BatchDecision:
+    """
+    نسخة متجهة من decide_from_indicators لأعمدة كاملة (NumPy).
+    القيمة الناقصة = None أو NaN، والعمود الغائب كله = None.
+    النتيجة مطابقة للدالة العددية صفًا بصف.
+    """
+    import numpy as np  # الدالة العددية وحدها لا تحتاجه
+
+    action_names, hold_reason, rsi_label, reason_rest = _tables()
+    n = None
+    cols = {}
+    for name, values in (("rsi", rsi), ("macd", macd), ("macd_signal", macd_signal),
+                         ("ema_fast", ema_fast), ("ema_slow", ema_slow), ("trend_strength", trend_strength)):
+        cols[name] = arr = _column(values, n)
+        if arr is not None:
+            n = len(arr)
+    n = n or 0
+    nan = np.full(n, np.nan)
+    rsi_a, macd_a, sig_a, fast_a, slow_a, ts_a = (
+        nan if cols[k] is None else cols[k]
+        for k in ("rsi", "macd", "macd_signal", "ema_fast", "ema_slow", "trend_strength")
+    )
+
+    # المقارنات مع NaN ترجع False، وهذا يطابق تخطي القيم None في الدالة العددية
+    with np.errstate(invalid="ignore"):
+        rsi_buy, rsi_sell = rsi_a <= 30, rsi_a >= 70
+        ema_buy, ema_sell = fast_a > slow_a, fast_a < slow_a
+        macd_buy, macd_sell = macd_a > sig_a, macd_a < sig_a
+    score_buy = rsi_buy.astype(np.int64) + ema_buy + macd_buy
+    score_sell = rsi_sell.astype(np.int64) + ema_sell + macd_sell
+
+    is_buy = (score_buy > score_sell) & (score_buy >= 2)
+    is_sell = (score_sell > score_buy) & (score_sell >= 2)
+    score = np.where(is_buy, score_buy, score_sell)
+    trend = np.nan_to_num(ts_a, nan=0.0)
+    conf = np.minimum(1.0, 0.3 + 0.3 * score + 0.1 * trend)
+
+    actions = action_names[is_buy.astype(np.int8) + 2 * is_sell]
+    confidences = np.where(is_buy | is_sell, conf, 0.2)
+
+    reasons = hold_reason[np.zeros(n, dtype=np.int8)]
+    act = np.flatnonzero(is_buy | is_sell)
+    if len(act):
+        # نص السبب يُبنى من جداول صغيرة بدل حلقة بايثون لكل صف
+        rsi_code = (rsi_buy.astype(np.int8) + 2 * rsi_sell)[act]
+        rest = reason_rest[(ema_buy.astype(np.int8) + 2 * ema_sell)[act] * 3
+                            + (macd_buy.astype(np.int8) + 2 * macd_sell)[act]]
+        has_rsi = rsi_code > 0
+        if has_rsi.any():
+            # "%.1f" يطابق تنسيق f"{x:.1f}" في الدالة العددية
+            rsi_txt = np.array(["%.1f" % v for v in rsi_a[act][has_rsi].tolist()], dtype=object)
+            # صف قابل للتنفيذ فيه RSI يحتاج إشارة EMA/MACD ثانية، فالبقية غير فارغة دائمًا
+            rest[has_rsi] = rsi_label[rsi_code[has_rsi]] + rsi_txt + ") & " + rest[has_rsi]
+        reasons[act] = rest
+    return BatchDecision(actions, confidences, reasons)
+
+
+@lru_cache(maxsize=None)
+def _tables() -> tuple[np.ndarray, ...]:
+    import numpy as np
+
+    return (
+        np.array(["hold", "buy", "sell"], dtype=object),
+        np.array(["No strong signal"], dtype=object),
+        np.array(["", "RSI<=30(", "RSI>=70("], dtype=object),
+        # بقية السبب بعد جزء RSI، مفهرسة بـ ema_code*3 + macd_code (0=لا شيء، 1=شراء، 2=بيع)
+        np.array([
+            " & ".join(p for p in (ema, macd) if p)
+            for ema in ("", "EMA fast>slow", "EMA fast<slow")
+            for macd in ("", "MACD>Signal", "MACD<Signal")
+        ], dtype=object),
+    )
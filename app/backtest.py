@@ -0,0 +1,321 @@
+"""
+Offline backtests of the indicator rules in ``app.ai``.
+
+Bars are read one symbol at a time from ``<data_dir>/<SYMBOL>.csv`` or
+``.parquet`` (columns: ts/timestamp/date, open, high, low, close, volume).
+Indicators and decisions are computed over the whole series with NumPy. The
+actionable bars are then replayed through the webhook sizing rules
+(``risk.trade_qty`` and ``risk.within_exposure``) and ``PaperBroker``, whose
+fill quantity and price drive the position (``PAPER_DEPTH_PER_QUOTE`` can fill
+an order partially; the rest is cancelled, not carried to later bars).
+Symbols run in parallel on a process pool::
+
+    python -m app.backtest data/minute --workers 8 --json
+
+Every symbol is simulated as its own account funded with ``BASE_CAPITAL``,
+which matches running the bot on that symbol alone. Portfolio figures add up
+those accounts.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+import numpy as np
+
+from . import indicators
+from .ai import decide_batch
+from .broker import PaperBroker
+from .config import settings
+from .risk import trade_qty, within_exposure
+from .store import apply_fill
+
+BAR_SUFFIXES = (".parquet", ".csv")
+_TS_COLUMNS = ("ts", "timestamp", "datetime", "date", "time")
+_NS_PER_DAY = 86_400 * 1_000_000_000
+
+
+@dataclass(slots=True)
+class Bars:
+    symbol: str
+    ts: np.ndarray      # int64 nanoseconds since epoch
+    close: np.ndarray   # float64
+
+
+@dataclass
+class BacktestParams:
+    rsi_period: int = indicators.RSI_PERIOD
+    ema_fast: int = indicators.EMA_FAST
+    ema_slow: int = indicators.EMA_SLOW
+    macd_fast: int = indicators.MACD_FAST
+    macd_slow: int = indicators.MACD_SLOW
+    macd_signal: int = indicators.MACD_SIGNAL
+    # "edge": act only when the decision changes (one alert per signal),
+    # "every-bar": act on every actionable bar close
+    signal_mode: str = "edge"
+    max_trade_amount: float | None = None
+
+    @property
+    def warmup(self) -> int:
+        return max(self.rsi_period, self.ema_slow, self.macd_slow + self.macd_signal)
+
+
+@dataclass
+class SymbolResult:
+    symbol: str
+    bars: int
+    trades: int = 0
+    buys: int = 0
+    sells: int = 0
+    rejected_exposure: int = 0
+    unfilled: int = 0
+    closing_trades: int = 0
+    winning_trades: int = 0
+    realized_pnl: float = 0.0
+    final_equity: float = 0.0
+    return_pct: float = 0.0
+    max_drawdown_pct: float = 0.0
+    elapsed_s: float = 0.0
+    error: str | None = None
+    # equity at the end of each calendar day, used for the portfolio curve
+    days: list[int] = field(default_factory=list, repr=False)
+    daily_equity: list[float] = field(default_factory=list, repr=False)
+
+
+def iter_bar_files(data_dir: str | Path, symbols: list[str] | None = None) -> list[Path]:
+    """
+    List one bar file per symbol, preferring Parquet when both exist.
+    """
+    found: dict[str, Path] = {}
+    for suffix in reversed(BAR_SUFFIXES):
+        for path in sorted(Path(data_dir).glob(f"*{suffix}")):
+            found[path.stem.upper()] = path
+    if symbols:
+        wanted = {s.strip().upper() for s in symbols}
+        found = {s: p for s, p in found.items() if s in wanted}
+    return [found[s] for s in sorted(found)]
+
+
+def load_bars(path: str | Path) -> Bars:
+    """
+    Read the timestamp and close columns of one bar file.
+    """
+    import pandas as pd  # ثقيل: يُحمّل فقط عند الحاجة
+
+    path = Path(path)
+    if path.suffix == ".parquet":
+        frame = pd.read_parquet(path)
+    else:
+        frame = pd.read_csv(path)
+    frame.columns = [str(c).strip().lower() for c in frame.columns]
+    ts_col = next((c for c in _TS_COLUMNS if c in frame.columns), None)
+    if ts_col is None or "close" not in frame.columns:
+        raise ValueError(f"{path.name}: expected a timestamp column and 'close'")
+    raw = frame[ts_col]
+    if pd.api.types.is_numeric_dtype(raw):
+        # epoch رقمي: نستنتج الوحدة من المقدار (ثوانٍ / ms / µs / ns)
+        scale = float(np.nanmax(np.abs(raw.to_numpy()))) if len(raw) else 0.0
+        unit = "s" if scale < 1e11 else "ms" if scale < 1e14 else "us" if scale < 1e17 else "ns"
+        parsed = pd.to_datetime(raw, unit=unit, utc=True)
+    else:
+        parsed = pd.to_datetime(raw, utc=True)
+    ts = parsed.to_numpy(dtype="datetime64[ns]").view(np.int64)
+    close = frame["close"].to_numpy(dtype=np.float64)
+    order = np.argsort(ts, kind="stable")
+    return Bars(path.stem.upper(), ts[order], close[order])
+
+
+def _max_drawdown_pct(equity: np.ndarray) -> float:
+    if len(equity) == 0:
+        return 0.0
+    peak = np.maximum.accumulate(equity)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dd = np.where(peak > 0, (equity - peak) / peak, 0.0)
+    return round(float(-dd.min()) * 100.0, 4)
+
+
+def _day_end(ts: np.ndarray, equity: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    day = ts // _NS_PER_DAY
+    last = np.flatnonzero(np.append(day[1:] != day[:-1], True))
+    return day[last], equity[last]
+
+
+def simulate(bars: Bars, params: BacktestParams | None = None) -> tuple[SymbolResult, np.ndarray]:
+    """
+    Backtest one symbol. Returns the summary and the per-bar equity curve.
+    """
+    params = params or BacktestParams()
+    t0 = time.perf_counter()
+    close = bars.close
+    n = len(close)
+    res = SymbolResult(bars.symbol, n)
+    capital = float(settings.BASE_CAPITAL)
+
+    rsi = indicators.rsi(close, params.rsi_period)
+    fast = indicators.ema(close, params.ema_fast)
+    slow = indicators.ema(close, params.ema_slow)
+    line, signal = indicators.macd(close, params.macd_fast, params.macd_slow, params.macd_signal)
+    warm = min(n, params.warmup)
+    for arr in (rsi, fast, slow, line, signal):
+        arr[:warm] = np.nan
+    dec = decide_batch(rsi=rsi, macd=line, macd_signal=signal, ema_fast=fast, ema_slow=slow)
+
+    code = (dec.actions == "buy").astype(np.int8) + 2 * (dec.actions == "sell")
+    if params.signal_mode == "every-bar":
+        events = np.flatnonzero(code)
+    else:
+        prev = np.concatenate(([0], code[:-1]))
+        events = np.flatnonzero((code != 0) & (code != prev))
+
+    broker = PaperBroker()
+    d_qty = np.zeros(n, dtype=np.int64)
+    d_cash = np.zeros(n, dtype=np.float64)
+    pos = (0, 0.0, 0.0)
+    exposure = 0.0  # مثل get_exposure_value: مجموع قيم الشراء
+    for i in events.tolist():
+        price = float(close[i])
+        if price <= 0:
+            continue
+        side = "buy" if code[i] == 1 else "sell"
+        qty = trade_qty(price, params.max_trade_amount)
+        if side == "buy" and not within_exposure(exposure, qty * price):
+            res.rejected_exposure += 1
+            continue
+        # IOC: ما لم يُنفَّذ على شمعة الإشارة يُلغى بدل أن يُكمل لاحقًا دون أن نراه
+        order = broker.submit_order(bars.symbol, side, qty, tif="ioc", price=price)
+        filled, fill_price = order["filled_qty"], order["avg_price"]
+        if not filled:
+            res.unfilled += 1
+            continue
+        before = pos
+        pos = apply_fill(pos, side, filled, fill_price)
+        if pos[2] != before[2]:
+            res.closing_trades += 1
+            res.winning_trades += pos[2] > before[2]
+        if side == "buy":
+            exposure += filled * fill_price
+            d_qty[i] += filled
+            d_cash[i] -= filled * fill_price
+            res.buys += 1
+        else:
+            d_qty[i] -= filled
+            d_cash[i] += filled * fill_price
+            res.sells += 1
+
+    equity = capital + np.cumsum(d_cash) + np.cumsum(d_qty) * close
+    res.trades = res.buys + res.sells
+    res.realized_pnl = round(pos[2], 2)
+    res.final_equity = round(float(equity[-1]) if n else capital, 2)
+    res.return_pct = round((res.final_equity / capital - 1.0) * 100.0, 4) if capital > 0 else 0.0
+    res.max_drawdown_pct = _max_drawdown_pct(equity)
+    if n:
+        days, eq = _day_end(bars.ts, equity)
+        res.days, res.daily_equity = days.tolist(), eq.tolist()
+    res.elapsed_s = round(time.perf_counter() - t0, 4)
+    return res, equity
+
+
+def _run_file(path: str, params: BacktestParams) -> SymbolResult:
+    try:
+        return simulate(load_bars(path), params)[0]
+    except Exception as exc:
+        return SymbolResult(Path(path).stem.upper(), 0, error=f"{type(exc).__name__}: {exc}")
+
+
+def _portfolio(results: list[SymbolResult]) -> dict:
+    ok = [r for r in results if r.error is None and r.days]
+    capital = float(settings.BASE_CAPITAL) * len(ok)
+    if not ok:
+        return {"symbols": 0, "initial_capital": 0.0}
+    days = np.unique(np.concatenate([np.asarray(r.days, dtype=np.int64) for r in ok]))
+    total = np.zeros(len(days))
+    for r in ok:
+        # آخر قيمة معروفة لكل يوم؛ قبل أول يوم للرمز يبقى رأس ماله كما هو
+        idx = np.searchsorted(np.asarray(r.days), days, side="right") - 1
+        eq = np.asarray(r.daily_equity)
+        total += np.where(idx >= 0, eq[np.clip(idx, 0, None)], float(settings.BASE_CAPITAL))
+    closing = sum(r.closing_trades for r in ok)
+    return {
+        "symbols": len(ok),
+        "initial_capital": round(capital, 2),
+        "final_equity": round(float(total[-1]), 2),
+        "return_pct": round((float(total[-1]) / capital - 1.0) * 100.0, 4),
+        "max_drawdown_pct": _max_drawdown_pct(total),
+        "trades": sum(r.trades for r in ok),
+        "rejected_exposure": sum(r.rejected_exposure for r in ok),
+        "unfilled": sum(r.unfilled for r in ok),
+        "win_rate_pct": round(100.0 * sum(r.winning_trades for r in ok) / closing, 2) if closing else None,
+        "bars": sum(r.bars for r in ok),
+        "equity_curve": {"days": days.tolist(), "equity": np.round(total, 2).tolist()},
+    }
+
+
+def run_backtest(
+    data_dir: str | Path,
+    params: BacktestParams | None = None,
+    symbols: list[str] | None = None,
+    workers: int | None = None,
+) -> dict:
+    """
+    Backtest every bar file in ``data_dir``. ``workers=1`` runs in-process.
+    """
+    params = params or BacktestParams()
+    files = [str(p) for p in iter_bar_files(data_dir, symbols)]
+    workers = workers or os.cpu_count() or 1
+    t0 = time.perf_counter()
+    if workers <= 1 or len(files) <= 1:
+        results = [_run_file(f, params) for f in files]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(files))) as pool:
+            results = list(pool.map(_run_file, files, [params] * len(files), chunksize=1))
+    elapsed = time.perf_counter() - t0
+    portfolio = _portfolio(results)
+    return {
+        "params": asdict(params),
+        "elapsed_s": round(elapsed, 3),
+        "bars_per_s": round(portfolio.get("bars", 0) / elapsed) if elapsed > 0 else None,
+        "portfolio": portfolio,
+        "symbols": [
+            {k: v for k, v in asdict(r).items() if k not in ("days", "daily_equity")} for r in results
+        ],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Backtest app.ai rules on local OHLCV files")
+    parser.add_argument("data_dir")
+    parser.add_argument("--symbols", nargs="*", help="restrict to these symbols")
+    parser.add_argument("--workers", type=int, default=None, help="process pool size (default: CPUs)")
+    parser.add_argument("--signal-mode", choices=["edge", "every-bar"], default="edge")
+    parser.add_argument("--max-trade-amount", type=float, default=None)
+    parser.add_argument("--json", action="store_true", help="print the full report as JSON")
+    args = parser.parse_args()
+
+    params = BacktestParams(signal_mode=args.signal_mode, max_trade_amount=args.max_trade_amount)
+    report = run_backtest(args.data_dir, params, args.symbols, args.workers)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    pf = report["portfolio"]
+    print(f"{pf.get('symbols', 0)} symbols, {pf.get('bars', 0)} bars in {report['elapsed_s']}s "
+          f"({report['bars_per_s']} bars/s)")
+    if pf.get("symbols"):
+        print(f"equity {pf['initial_capital']} -> {pf['final_equity']} ({pf['return_pct']}%), "
+              f"max drawdown {pf['max_drawdown_pct']}%, trades {pf['trades']}, "
+              f"win rate {pf['win_rate_pct']}%, rejected by exposure {pf['rejected_exposure']}")
+    for r in report["symbols"]:
+        if r["error"]:
+            print(f"  {r['symbol']:<8} ERROR {r['error']}")
+        else:
+            print(f"  {r['symbol']:<8} trades={r['trades']:<5} return={r['return_pct']:>9}% "
+                  f"maxdd={r['max_drawdown_pct']:>8}%")
+
+
+if __name__ == "__main__":
+    main()
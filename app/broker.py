@@ -1,18 +1,126 @@
-from time import time
+import threading
+import uuid
+from typing import Callable
+
+from .config import settings
+from .matching import Fill, MatchingEngine
 from .quotes import get_last_price
 
+OPEN_STATUSES = ("new", "partially_filled")
+
+
 class PaperBroker:
+    """
+    وسيط ورقي فوق محرك مطابقة في الذاكرة (app.matching): الأوامر تُنفَّذ
+    مقابل دفتر الأوامر وآخر سعر، فقد تمتلئ جزئيًا أو تبقى معلّقة حتى يعبرها سعر لاحق.
+    التنفيذات التي تحدث لاحقًا (عند وصول سعر جديد) تُرسل إلى مستمعي on_fill.
+    """
+
+    def __init__(self, engine: MatchingEngine | None = None):
+        self.engine = engine or MatchingEngine(settings.PAPER_TICK_SIZE, settings.PAPER_DEPTH_PER_QUOTE)
+        # معرّفات فريدة عبر العمليات وإعادة التشغيل (بدل int(time()) الذي يتكرر في نفس الثانية)
+        self._prefix = f"paper-{uuid.uuid4().hex[:8]}-"
+        self._listeners: list[Callable[[list[Fill]], None]] = []
+        # أوامر شراء لها حجز تعرّض: engine oid -> (ref, سعر الوحدة المحجوز).
+        # يُربط تحت نفس القفل الذي يدخل به الأمر للمحرك، فأي تنفيذ لاحق له يجد حجزه
+        self._holds: dict[int, tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
     def get_last_price(self, symbol: str) -> float:
-        p = get_last_price(symbol)
-        return p if p > 0 else 100.0  # احتياط
-
-    def submit_order(self, symbol: str, side: str, qty: int, order_type="market", tif="day"):
-        return {
-            "id": f"paper-{int(time())}",
-            "symbol": symbol,
-            "side": side,
-            "qty": int(qty),
-            "type": order_type,
-            "time_in_force": tif,
-            "status": "accepted"
-        }
+        # بلا سعر احتياطي: QuoteUnavailable أفضل من تحجيم صفقة على سعر مختلق
+        return get_last_price(symbol)
+
+    def on_fill(self, fn: Callable[[list[Fill]], None]) -> None:
+        self._listeners.append(fn)
+
+    def on_quote(self, symbol: str, price: float) -> list[Fill]:
+        """
+        سعر جديد من المصدر: يفعّل أوامر الإيقاف وينفّذ الأوامر المعلّقة التي يعبرها.
+        """
+        with self._lock:
+            fills = self.engine.on_quote(symbol.upper(), price)
+        self._dispatch(fills)
+        return fills
+
+    def submit_order(self, symbol: str, side: str, qty: int, order_type="market", tif="day",
+                     limit_price: float | None = None, stop_price: float | None = None,
+                     price: float | None = None, hold: tuple[str, float] | None = None):
+        """
+        price = سعر السوق المعروف لحظة الإرسال (من الإنذار أو الكاش)، يُمرَّر للدفتر كسعر أخير.
+        hold = (ref, سعر الوحدة) لحجز التعرّض الذي يغطي باقي الأمر إن بقي معلّقًا.
+        """
+        symbol = symbol.upper()
+        if price and price != self.engine.last_price(symbol):
+            self.on_quote(symbol, price)
+        with self._lock:
+            oid, fills = self.engine.submit(symbol, side, qty, order_type, limit_price, stop_price, tif)
+            order = self._order(oid, [f for f in fills if f.order_id == oid])
+            if hold and order["status"] in OPEN_STATUSES:
+                self._holds[oid] = hold
+        self._dispatch([f for f in fills if f.order_id != oid])
+        return order
+
+    def cancel_order(self, order_id: str) -> bool:
+        oid = self._oid(order_id)
+        with self._lock:
+            self._holds.pop(oid, None)
+            return self.engine.cancel(oid)
+
+    def replace_order(self, order_id: str, qty: int | None = None, limit_price: float | None = None,
+                      stop_price: float | None = None, hold: tuple[str, float] | None = None):
+        # لا يوجد مسار آخر يسجّل تنفيذات التعديل: كلها تذهب للمستمعين
+        oid = self._oid(order_id)
+        with self._lock:
+            new, fills = self.engine.replace(oid, qty, limit_price, stop_price)
+            self._holds.pop(oid, None)
+            if hold:
+                self._holds[new] = hold
+        self._dispatch(fills)
+        order = self._order(new, [f for f in fills if f.order_id == new])
+        if order["status"] not in OPEN_STATUSES:
+            with self._lock:
+                self._holds.pop(new, None)
+        return order
+
+    def hold(self, order_id: str) -> tuple[str, float] | None:
+        """
+        (ref, سعر الوحدة) لحجز التعرّض المربوط بالأمر، أو None.
+        """
+        oid = self._oid(order_id)
+        with self._lock:
+            return self._holds.get(oid)
+
+    def get_order(self, order_id: str):
+        return self._order(self._oid(order_id))
+
+    def open_orders(self, symbol: str | None = None):
+        return [self._public(o) for o in self.engine.open_orders(symbol.upper() if symbol else None)]
+
+    def fill_id(self, fill: Fill) -> str:
+        return f"{self._prefix}{fill.order_id}"
+
+    def _oid(self, order_id: str) -> int:
+        if not order_id.startswith(self._prefix) or not order_id[len(self._prefix):].isdigit():
+            raise KeyError(order_id)
+        return int(order_id[len(self._prefix):])
+
+    def _public(self, o: dict) -> dict:
+        o["id"] = f"{self._prefix}{o.pop('order_id')}"
+        return o
+
+    def _order(self, oid: int, fills: list[Fill] = ()):
+        o = self._public(self.engine.order(oid))
+        o["fills"] = [{"qty": f.qty, "price": f.price, "liquidity": f.liquidity} for f in fills]
+        return o
+
+    def _dispatch(self, fills: list[Fill]) -> None:
+        if fills:
+            try:
+                for fn in self._listeners:
+                    fn(fills)
+            finally:
+                # بعد المستمعين: آخر تنفيذ لأمر ما زال يحتاج حجزه ليُخصم منه
+                with self._lock:
+                    for f in fills:
+                        if not f.leaves:
+                            self._holds.pop(f.order_id, None)
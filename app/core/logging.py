@@ -1,13 +1,25 @@
 from __future__ import annotations
 
+import atexit
+import copy
 import json
 import logging
+import logging.handlers
+import queue
+import random
 import sys
+import threading
 import time
 import uuid
 from typing import Any, Mapping
 
+try:  # optional: several times faster than the stdlib encoder
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
 DEFAULT_LOG_LEVEL = "INFO"
+DEFAULT_QUEUE_MAX = 10_000
 
 
 class JsonFormatter(logging.Formatter):
@@ -32,13 +44,160 @@ class JsonFormatter(logging.Formatter):
                 continue
             if isinstance(value, (str, int, float, bool)) or value is None:
                 base[key] = value
-        return json.dumps(base, default=str)
+        return _dumps(base)
+
+
+def _dumps(obj: dict[str, Any]) -> str:
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=str).decode()
+        except TypeError:  # e.g. ints wider than 64 bits
+            pass
+    return json.dumps(obj, default=str)
 
 
-def configure_logging(level: str | int = DEFAULT_LOG_LEVEL) -> None:
+class SamplingFilter(logging.Filter):
+    """
+    Per-logger sampling and rate limits for noisy loggers.
+
+    ``rules`` maps a logger name (it also covers the logger's children) to a
+    keep fraction ``"0.1"`` or a rate ``"20/s"``. WARNING and above always pass.
+    """
+
+    def __init__(self, rules: Mapping[str, str] | None = None):
+        super().__init__()
+        self._rules: dict[str, tuple[float, float]] = {}  # name -> (fraction, rate/s)
+        for name, spec in (rules or {}).items():
+            spec = str(spec).strip()
+            if spec.endswith("/s"):
+                self._rules[name] = (1.0, float(spec[:-2]))
+            else:
+                self._rules[name] = (float(spec), 0.0)
+        self._resolved: dict[str, str | None] = {}
+        self._buckets: dict[str, list[float]] = {}  # name -> [tokens, last refill]
+        self._lock = threading.Lock()
+        self.suppressed: dict[str, int] = {}
+
+    @classmethod
+    def parse(cls, spec: str | None) -> "SamplingFilter":
+        """
+        ``"app.decisions=10/s,app.quotes=0.25"`` -> filter.
+        """
+        rules = {}
+        for part in (spec or "").split(","):
+            if "=" in part:
+                name, value = part.split("=", 1)
+                rules[name.strip()] = value.strip()
+        return cls(rules)
+
+    def _rule_for(self, name: str) -> str | None:
+        try:
+            return self._resolved[name]
+        except KeyError:
+            pass
+        rule, probe = None, name
+        while probe:
+            if probe in self._rules:
+                rule = probe
+                break
+            probe = probe.rpartition(".")[0]
+        self._resolved[name] = rule
+        return rule
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not self._rules or record.levelno >= logging.WARNING:
+            return True
+        rule = self._rule_for(record.name)
+        if rule is None:
+            return True
+        fraction, rate = self._rules[rule]
+        if rate:
+            now = time.monotonic()
+            with self._lock:
+                bucket = self._buckets.setdefault(rule, [rate, now])
+                bucket[0] = min(rate, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+                keep = bucket[0] >= 1.0
+                if keep:
+                    bucket[0] -= 1.0
+        else:
+            keep = random.random() < fraction
+        if not keep:
+            with self._lock:
+                self.suppressed[rule] = self.suppressed.get(rule, 0) + 1
+        return keep
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Never blocks the caller: a full queue drops the record and counts it.
+    Only the message is merged here; JSON encoding, tracebacks and the write
+    happen on the listener thread.
+    """
+
+    def __init__(self, q: queue.Queue):
+        super().__init__(q)
+        self.dropped = 0
+        self.enqueued = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+            self.enqueued += 1
+        except queue.Full:
+            self.dropped += 1
+
+
+class _Listener(logging.handlers.QueueListener):
+    def __init__(self, q: queue.Queue, source: _QueueHandler, *handlers: logging.Handler):
+        super().__init__(q, *handlers, respect_handler_level=True)
+        self._source = source
+        self._reported = 0
+        self._next_report = 0.0
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)  # waits for room: a full queue is still drained
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            super().stop()
+
+    def handle(self, record: logging.LogRecord) -> None:
+        super().handle(record)
+        dropped = self._source.dropped
+        if dropped != self._reported and time.monotonic() >= self._next_report:
+            # at most one notice per second while the queue overflows
+            self._next_report = time.monotonic() + 1.0
+            notice = logging.LogRecord("app.core.logging", logging.WARNING, __file__, 0,
+                                       "log records dropped: queue full", None, None)
+            notice.dropped = dropped - self._reported
+            notice.dropped_total = dropped
+            self._reported = dropped
+            super().handle(notice)
+
+
+_pipeline: tuple[_QueueHandler, _Listener, SamplingFilter] | None = None
+
+
+def configure_logging(
+    level: str | int = DEFAULT_LOG_LEVEL,
+    queue_max: int = DEFAULT_QUEUE_MAX,
+    sampling: str | None = None,
+) -> None:
     """
     Configure application-wide logging once at process startup.
+
+    Records go through a bounded queue to a background listener that formats
+    and writes them, so a slow or blocked stdout never stalls a request.
+    ``sampling`` is a ``SamplingFilter.parse`` spec.
     """
+    global _pipeline
     root = logging.getLogger()
     if root.handlers:
         # Assume logging already configured (e.g., by gunicorn)
@@ -47,11 +206,50 @@ def configure_logging(level: str | int = DEFAULT_LOG_LEVEL) -> None:
     handler = logging.StreamHandler(sys.stdout)
     handler.setFormatter(JsonFormatter())
 
-    logging.basicConfig(level=level, handlers=[handler])
+    q: queue.Queue = queue.Queue(max(1, int(queue_max)))
+    queue_handler = _QueueHandler(q)
+    sampler = SamplingFilter.parse(sampling)
+    queue_handler.addFilter(sampler)
+    listener = _Listener(q, queue_handler, handler)
+    listener.start()
+    atexit.register(shutdown_logging)
+    _pipeline = (queue_handler, listener, sampler)
+
+    logging.basicConfig(level=level, handlers=[queue_handler])
     logging.getLogger("uvicorn.error").handlers = []
     logging.getLogger("uvicorn.access").handlers = []
 
 
+def shutdown_logging() -> None:
+    """
+    Write out what is still queued and stop the listener thread.
+    """
+    global _pipeline
+    if _pipeline is None:
+        return
+    queue_handler, listener, _ = _pipeline
+    _pipeline = None
+    logging.getLogger().removeHandler(queue_handler)
+    listener.stop()
+
+
+def logging_stats() -> dict[str, Any]:
+    """
+    Counters of the queued pipeline (empty if it is not in use).
+    """
+    if _pipeline is None:
+        return {}
+    queue_handler, _, sampler = _pipeline
+    return {
+        "serializer": "orjson" if orjson is not None else "json",
+        "queued": queue_handler.queue.qsize(),
+        "queue_max": queue_handler.queue.maxsize,
+        "enqueued": queue_handler.enqueued,
+        "dropped": queue_handler.dropped,
+        "sampled_out": dict(sampler.suppressed),
+    }
+
+
 def bind_logger(logger: logging.Logger, **extra: Any) -> logging.LoggerAdapter:
     """
     Return a logger adapter that injects additional context keys.
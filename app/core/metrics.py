@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any
+
+from .logging import correlation_id
+
+# 50us .. 10s: SQLite commits sit at the bottom, yfinance/Telegram at the top
+DEFAULT_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+STAGES = (
+    "request", "hmac", "decision", "quote", "exposure", "order", "log_trade", "notify_send",
+)
+
+CORRELATION_HEADER = "x-correlation-id"
+
+logger = logging.getLogger(__name__)
+
+
+class _Trace:
+    """
+    Per-request context: the correlation id and time spent in each stage.
+    """
+
+    __slots__ = ("cid", "stages")
+
+    def __init__(self, cid: str):
+        self.cid = cid
+        self.stages: dict[str, float] = {}
+
+
+_trace: ContextVar[_Trace | None] = ContextVar("metrics_trace", default=None)
+
+
+def current_correlation_id() -> str | None:
+    trace = _trace.get()
+    return trace.cid if trace is not None else None
+
+
+class Histogram:
+    """
+    Prometheus histogram with a fixed label set and preallocated buckets.
+
+    Every thread writes to its own shard, so ``observe`` takes no lock; shards
+    are only summed when ``/metrics`` is scraped. The last observation of each
+    bucket keeps its correlation id as an OpenMetrics exemplar.
+    """
+
+    def __init__(self, name: str, help: str, label: str, values: tuple[str, ...],
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.values = values
+        self.bounds = tuple(buckets)
+        self._index = {v: i for i, v in enumerate(values)}
+        self._local = threading.local()
+        self._shards: list[list[list[float]]] = []
+        self._lock = threading.Lock()
+        self._exemplars: list[list[tuple[str, float, float] | None]] = [
+            [None] * (len(self.bounds) + 1) for _ in values
+        ]
+
+    def _shard(self) -> list[list[float]]:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            # per label: one slot per bucket, +Inf, then the running sum
+            shard = [[0] * (len(self.bounds) + 1) + [0.0] for _ in self.values]
+            with self._lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+    def observe(self, value: str, seconds: float) -> None:
+        i = self._index[value]
+        row = self._shard()[i]
+        b = bisect_left(self.bounds, seconds)
+        row[b] += 1
+        row[-1] += seconds
+        trace = _trace.get()
+        if trace is not None:
+            trace.stages[value] = trace.stages.get(value, 0.0) + seconds
+            self._exemplars[i][b] = (trace.cid, seconds, time.time())
+
+    def collect(self) -> list[tuple[str, list[int], float]]:
+        """
+        Per label value: (value, cumulative bucket counts incl. +Inf, sum).
+        """
+        with self._lock:
+            shards = list(self._shards)
+        out = []
+        for i, value in enumerate(self.values):
+            counts = [0] * (len(self.bounds) + 1)
+            total = 0.0
+            for shard in shards:
+                row = shard[i]
+                for b in range(len(counts)):
+                    counts[b] += row[b]
+                total += row[-1]
+            running = 0
+            for b in range(len(counts)):
+                running += counts[b]
+                counts[b] = running
+            out.append((value, counts, total))
+        return out
+
+    def render(self, openmetrics: bool = False) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        les = [_fmt(b) for b in self.bounds] + ["+Inf"]
+        for i, (value, counts, total) in enumerate(self.collect()):
+            lab = f'{self.label}="{value}"'
+            for b, (le, count) in enumerate(zip(les, counts)):
+                line = f'{self.name}_bucket{{{lab},le="{le}"}} {count}'
+                ex = self._exemplars[i][b] if openmetrics else None
+                if ex is not None:
+                    line += f' # {{correlation_id="{ex[0]}"}} {_fmt(ex[1])} {ex[2]:.3f}'
+                lines.append(line)
+            lines.append(f"{self.name}_sum{{{lab}}} {_fmt(total)}")
+            lines.append(f"{self.name}_count{{{lab}}} {counts[-1]}")
+        return lines
+
+
+def _fmt(x: float) -> str:
+    return repr(float(x))
+
+
+STAGE_SECONDS = Histogram(
+    "bot_stage_seconds", "Time spent per stage of the execution hot path.", "stage", STAGES,
+)
+
+
+class _Timer:
+    __slots__ = ("stage", "t0")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self) -> "_Timer":
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        STAGE_SECONDS.observe(self.stage, time.perf_counter() - self.t0)
+
+
+def stage(name: str) -> _Timer:
+    """
+    ``with stage("quote"): ...`` records the block into ``bot_stage_seconds``.
+    """
+    return _Timer(name)
+
+
+def render(openmetrics: bool = False) -> str:
+    lines = STAGE_SECONDS.render(openmetrics)
+    if openmetrics:
+        lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+class CorrelationMiddleware:
+    """
+    ASGI middleware: binds a correlation id (from ``X-Correlation-ID`` or a new
+    one) for the request, echoes it back, and for ``timed_paths`` records the
+    whole request as the ``request`` stage. Requests slower than
+    ``slow_request_s`` are logged with their per-stage breakdown.
+    """
+
+    def __init__(self, app, timed_paths: tuple[str, ...] = (), slow_request_s: float = 1.0):
+        self.app = app
+        self.timed_paths = frozenset(timed_paths)
+        self.slow_request_s = slow_request_s
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        cid = None
+        for key, value in scope.get("headers") or ():
+            if key == CORRELATION_HEADER.encode():
+                # only characters that are safe inside an exemplar label value
+                cid = "".join(ch for ch in value.decode("latin-1")[:64] if ch.isalnum() or ch in "-_.") or None
+                break
+        trace = _Trace(cid or correlation_id())
+        token = _trace.set(trace)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = [*message["headers"], (CORRELATION_HEADER.encode(), trace.cid.encode())]
+            await send(message)
+
+        timed = scope.get("path") in self.timed_paths
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            if timed:
+                elapsed = time.perf_counter() - t0
+                STAGE_SECONDS.observe("request", elapsed)
+                if elapsed >= self.slow_request_s:
+                    logger.warning(
+                        "slow request",
+                        extra={"correlation_id": trace.cid, "path": scope.get("path"),
+                               **{f"{k}_ms": round(v * 1000, 2) for k, v in trace.stages.items()}},
+                    )
+            _trace.reset(token)
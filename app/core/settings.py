@@ -26,6 +26,47 @@ class Settings(BaseSettings):
     MAX_PORTFOLIO_EXPOSURE_PCT: float = Field(default=0.3)
     MAX_TRADE_AMOUNT: float = Field(default=500.0)
 
+    DB_PATH: str = Field(default="bot.db")
+    DB_READ_POOL_SIZE: int = Field(default=4)
+
+    QUOTE_CACHE_TTL_S: float = Field(default=5.0)
+    QUOTE_CACHE_MAX_SYMBOLS: int = Field(default=1024)
+    QUOTE_MAX_STALE_S: float = Field(default=300.0)
+    QUOTE_PROVIDER: str = Field(default="yahoo_unofficial")
+    QUOTE_FETCH_WORKERS: int = Field(default=8)
+    QUOTE_PROVIDERS: str = Field(default="")
+    QUOTE_TIMEOUT_S: float = Field(default=3.0)
+    QUOTE_HEDGE_MIN_MS: float = Field(default=50.0)
+    QUOTE_BREAKER_FAILURES: int = Field(default=5)
+    QUOTE_BREAKER_RESET_S: float = Field(default=30.0)
+    QUOTE_STREAM_INTERVAL_S: float = Field(default=5.0)
+    QUOTE_STREAM_QUEUE_MAX: int = Field(default=100)
+
+    EXECUTION_WORKERS: int = Field(default=16)
+    WEBHOOK_DEDUP_TTL_S: float = Field(default=300.0)
+    WEBHOOK_DEDUP_MAX: int = Field(default=10_000)
+    EXPOSURE_RESERVATION_TTL_S: float = Field(default=30.0)
+    EXPOSURE_HOLD_S: float = Field(default=86_400.0)
+
+    PAPER_TICK_SIZE: float = Field(default=0.0001)
+    PAPER_DEPTH_PER_QUOTE: int = Field(default=0)
+
+    EVENT_QUEUE_MAX: int = Field(default=1000)
+    NOTIFY_QUEUE_MAX: int = Field(default=1000)
+    NOTIFY_RATE_PER_S: float = Field(default=1.0)
+    NOTIFY_MAX_RETRIES: int = Field(default=5)
+    NOTIFY_DIGEST_MAX_LINES: int = Field(default=30)
+
+    INDICATOR_FLUSH_S: float = Field(default=5.0)
+
+    METRICS_SLOW_REQUEST_MS: float = Field(default=1000.0)
+    LOG_LEVEL: str = Field(default="INFO")
+    LOG_QUEUE_MAX: int = Field(default=10_000)
+    LOG_SAMPLING: str = Field(default="app.decisions=10/s")
+
+    PREWARM_IMPORTS: bool = Field(default=True)
+    TICK_STORE_DIR: str = Field(default="ticks")
+
     WEBHOOK_SECRET: SecretStr | None = None
     TELEGRAM_BOT_TOKEN: SecretStr | None = None
     TELEGRAM_CHAT_ID: str | None = None
@@ -35,6 +76,10 @@ class Settings(BaseSettings):
     ALPACA_KEY_ID: SecretStr | None = None
     ALPACA_SECRET_KEY: SecretStr | None = None
 
+    FINNHUB_API_KEY: SecretStr | None = None
+    ALPHA_VANTAGE_API_KEY: SecretStr | None = None
+    TWELVE_DATA_API_KEY: SecretStr | None = None
+
     @computed_field  # type: ignore[misc]
     @property
     def env(self) -> str:
@@ -0,0 +1,192 @@
+"""
+SQLite connection management for ``app.store``.
+
+Writers reuse one long-lived connection per thread; GET endpoints borrow from
+a small pool of read-only connections. Everything runs in WAL mode with
+``synchronous=NORMAL`` so readers never block the writer and a commit costs a
+WAL append instead of a full fsync of the database file.
+"""
+
+from __future__ import annotations
+
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from .config import settings
+
+STATEMENT_CACHE_SIZE = 256
+BUSY_TIMEOUT_S = 5.0
+
+
+class Database:
+    """
+    Connection manager bound to a single SQLite file.
+
+    Connections are created lazily, re-created after ``fork`` (SQLite handles
+    must never cross a process boundary) and run in autocommit mode: callers
+    open transactions explicitly through :meth:`transaction`.
+    """
+
+    def __init__(self, path: str | Path, read_pool_size: int = 4):
+        self.path = Path(path)
+        self.read_pool_size = max(1, int(read_pool_size))
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._pid = os.getpid()
+        self._local = threading.local()
+        self._pool: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue()
+        self._pool_created = 0
+        self._opened: list[sqlite3.Connection] = []
+
+    def _check_pid(self) -> None:
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    # لا نغلق اتصالات الأب: يكفي نسيانها
+                    self._reset()
+
+    def _connect(self, readonly: bool = False) -> sqlite3.Connection:
+        if readonly:
+            target, uri = f"{self.path.resolve().as_uri()}?mode=ro", True
+        else:
+            target, uri = str(self.path), False
+        conn = sqlite3.connect(
+            target,
+            uri=uri,
+            timeout=BUSY_TIMEOUT_S,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        conn.row_factory = sqlite3.Row
+        if readonly:
+            conn.execute("PRAGMA query_only=ON")
+        else:
+            conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with self._lock:
+            self._opened.append(conn)
+        return conn
+
+    def connection(self) -> sqlite3.Connection:
+        """
+        Return the calling thread's read-write connection.
+        """
+        self._check_pid()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def dedicated(self, readonly: bool = True) -> sqlite3.Connection:
+        """
+        Open a connection owned by the caller instead of the pool, for long-lived
+        uses such as polling ``PRAGMA data_version``.
+        """
+        self._check_pid()
+        return self._connect(readonly=readonly)
+
+    @contextmanager
+    def transaction(self, immediate: bool = False) -> Iterator[sqlite3.Connection]:
+        """
+        Run a block inside one transaction on the thread's connection.
+
+        ``immediate=True`` takes the write lock up front, which is required for
+        read-modify-write sequences that must not interleave across workers.
+        """
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            # SQLite may already have rolled back (e.g. disk I/O error); a failed
+            # COMMIT (SQLITE_BUSY) leaves it open and the next BEGIN would fail
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+    @contextmanager
+    def read(self) -> Iterator[sqlite3.Connection]:
+        """
+        Borrow a read-only connection from the pool.
+        """
+        self._check_pid()
+        if not self.path.exists():
+            # mode=ro cannot create the file; fall back until init_db has run
+            yield self.connection()
+            return
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                grow = self._pool_created < self.read_pool_size
+                if grow:
+                    self._pool_created += 1
+            conn = self._connect(readonly=True) if grow else self._pool.get()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            self._pool.put(conn)
+
+    def close(self) -> None:
+        """
+        Close every connection opened by this manager.
+        """
+        with self._lock:
+            opened, self._opened = self._opened, []
+        for conn in opened:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._reset()
+
+
+_db: Database | None = None
+_db_lock = threading.Lock()
+
+
+def get_db() -> Database:
+    """
+    Return the process-wide database manager, creating it on first use.
+    """
+    global _db
+    if _db is None:
+        with _db_lock:
+            if _db is None:
+                _db = Database(settings.DB_PATH, settings.DB_READ_POOL_SIZE)
+    return _db
+
+
+def configure(path: str | Path, read_pool_size: int | None = None) -> Database:
+    """
+    Point the process at another database file (benchmarks, maintenance).
+    """
+    global _db
+    with _db_lock:
+        if _db is not None:
+            _db.close()
+        _db = Database(path, read_pool_size or settings.DB_READ_POOL_SIZE)
+    return _db
+
+
+def connection() -> sqlite3.Connection:
+    return get_db().connection()
+
+
+def transaction(immediate: bool = False):
+    return get_db().transaction(immediate)
+
+
+def read():
+    return get_db().read()
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+from . import store
+from .config import settings
+from .offload import run_blocking
+
+PENDING_TIMEOUT_S = 30.0
+WAIT_POLL_S = 0.05
+PRUNE_EVERY = 256
+HEADER = "X-Dedup"
+
+
+def body_key(path: str, body: bytes) -> str:
+    return hashlib.sha256(path.encode() + b"\0" + body).hexdigest()
+
+
+class DedupCache:
+    """
+    إزالة تكرار الـ webhook بمفتاح من الجسم الموقّع: الأول يحجز المفتاح في webhook_dedup وينفّذ،
+    والمكرر خلال TTL يأخذ النتيجة المخزنة. أمامه LRU في الذاكرة للنتائج المنتهية.
+    """
+
+    def __init__(self, ttl_s: float, max_entries: int):
+        self.ttl_s = float(ttl_s)
+        self.max_entries = max(1, int(max_entries))
+        self._done: OrderedDict[str, tuple[float, int, Any]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._claims = 0
+        self._stats = dict.fromkeys(("hits", "misses", "waits", "released", "conflicts", "pruned"), 0)
+
+    def _remember(self, key: str, status: int, result: Any, expires: float) -> None:
+        self._done[key] = (expires, status, result)
+        self._done.move_to_end(key)
+        while len(self._done) > self.max_entries:
+            self._done.popitem(last=False)
+
+    def _recall(self, key: str, now: float) -> tuple[int, Any] | None:
+        entry = self._done.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            del self._done[key]
+            return None
+        return entry[1], entry[2]
+
+    async def run(self, key: str, handler: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        ينفّذ handler مرة لكل مفتاح؛ المكرر يأخذ الحالة والجسم الأصليين مع X-Dedup: hit.
+        """
+        now = time.time()
+        hit = self._recall(key, now)
+        if hit is None and key in self._inflight:
+            self._stats["waits"] += 1
+            await asyncio.shield(self._inflight[key])
+            hit = self._recall(key, time.time())
+        if hit is None:
+            done = self._inflight[key] = asyncio.get_running_loop().create_future()
+            try:
+                hit = await self._claim(key, now)
+                if hit is None:
+                    self._stats["misses"] += 1
+                    return await self._first(key, handler, now)
+            finally:
+                self._inflight.pop(key, None)
+                done.set_result(None)
+        self._stats["hits"] += 1
+        return _replay(*hit)
+
+    async def _claim(self, key: str, now: float) -> tuple[int, Any] | None:
+        """
+        None إن حجز هذا العامل المفتاح، وإلا (الحالة، الجسم) المخزنان.
+        """
+        while True:
+            state, status, raw = await run_blocking(store.dedup_claim, key, now, self.ttl_s, PENDING_TIMEOUT_S)
+            if state == "claimed":
+                return None
+            if state == "pending":
+                status, raw = await self._wait_other_worker(key)
+                if status is None:
+                    continue  # العامل الآخر تخلّى عنه: نحجزه نحن
+            hit = status, json.loads(raw)
+            self._remember(key, *hit, now + self.ttl_s)
+            return hit
+
+    async def _first(self, key: str, handler: Callable[[], Awaitable[Any]], now: float) -> Any:
+        try:
+            result = await handler()
+        except BaseException:
+            # النجاح فقط يُحفظ: رفض 4xx (مفتاح الإيقاف، حد التعرّض) قد يتغير قبل إعادة المحاولة
+            await self._release(key)
+            raise
+        await self._complete(key, 200, result, now)
+        return result
+
+    async def _release(self, key: str) -> None:
+        self._stats["released"] += 1
+        await run_blocking(store.dedup_release, key)
+
+    async def _complete(self, key: str, status: int, result: Any, now: float) -> None:
+        raw = json.dumps(result, default=str)
+        # الإعادة من الذاكرة ومن SQLite يجب أن تتطابق حرفيًا
+        self._remember(key, status, json.loads(raw), now + self.ttl_s)
+        await run_blocking(store.dedup_complete, key, status, raw)
+        self._claims += 1
+        if self._claims % PRUNE_EVERY == 0:
+            self._stats["pruned"] += await run_blocking(store.dedup_prune, time.time(), self.ttl_s,
+                                                        self.max_entries)
+
+    async def _wait_other_worker(self, key: str) -> tuple[int | None, str | None]:
+        """
+        عامل آخر ينفّذ نفس التنبيه: ننتظر نتيجته. (None, None) يعني أنه حرر المفتاح.
+        """
+        self._stats["waits"] += 1
+        deadline = time.monotonic() + PENDING_TIMEOUT_S
+        while time.monotonic() < deadline:
+            await asyncio.sleep(WAIT_POLL_S)
+            found, status, raw = await run_blocking(store.dedup_get, key)
+            if not found:
+                return None, None
+            if status is not None:
+                return status, raw
+        self._stats["conflicts"] += 1
+        raise HTTPException(status_code=409, detail="Duplicate alert still in progress")
+
+    def stats(self) -> dict:
+        return {**self._stats, "cached": len(self._done), "inflight": len(self._inflight),
+                "ttl_s": self.ttl_s, "max_entries": self.max_entries}
+
+
+def _replay(status: int, result: Any) -> JSONResponse:
+    return JSONResponse(result, status_code=status, headers={HEADER: "hit"})
+
+
+_cache = DedupCache(settings.WEBHOOK_DEDUP_TTL_S, settings.WEBHOOK_DEDUP_MAX)
+
+
+async def run(path: str, body: bytes, handler: Callable[[], Awaitable[Any]]) -> Any:
+    if _cache.ttl_s <= 0:
+        return await handler()
+    return await _cache.run(body_key(path, body), handler)
+
+
+def stats() -> dict:
+    return _cache.stats()
@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+import os
+import queue
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass, field
+from typing import Callable
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Event:
+    ts: float = field(default_factory=time.time, kw_only=True)
+
+    @property
+    def type(self) -> str:
+        return type(self).__name__
+
+    def to_dict(self) -> dict:
+        return {"type": self.type, **asdict(self)}
+
+
+@dataclass(frozen=True)
+class Trade:
+    id: int
+    symbol: str
+    side: str
+    qty: int
+    price: float
+    note: str
+
+
+@dataclass(frozen=True)
+class TradesLogged(Event):
+    trades: tuple[Trade, ...]
+
+
+@dataclass(frozen=True)
+class KillSwitchChanged(Event):
+    on: bool
+
+
+@dataclass(frozen=True)
+class WatchlistChanged(Event):
+    symbols: tuple[str, ...]
+
+
+class _Subscription(ABC):
+    def __init__(self, id: int, name: str, types: tuple[type[Event], ...]):
+        self.id = id
+        self.name = name
+        self.types = types
+        self.delivered = 0
+        self.dropped = 0
+
+    def wants(self, event: Event) -> bool:
+        return not self.types or isinstance(event, self.types)
+
+    @abstractmethod
+    def offer(self, event: Event) -> None: ...
+
+    def stats(self) -> dict:
+        return {"name": self.name, "types": [t.__name__ for t in self.types] or ["*"],
+                "delivered": self.delivered, "dropped": self.dropped}
+
+
+# subscribe(): المعالج يعمل على خيط daemon خاص به
+class ThreadSubscription(_Subscription):
+    def __init__(self, id: int, name: str, types: tuple[type[Event], ...], handler: Callable[[Event], None],
+                 maxsize: int):
+        super().__init__(id, name, types)
+        self.handler = handler
+        self.queue: queue.Queue = queue.Queue(maxsize)
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._pid = 0
+        self._thread: threading.Thread | None = None
+        self._ensure_worker()
+
+    def _ensure_worker(self) -> None:
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                if self._pid and self._pid != os.getpid():
+                    # بعد fork لا يوجد خيط: نبدأ بطابور جديد
+                    self.queue = queue.Queue(self.queue.maxsize)
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name=f"events-{self.name}", daemon=True)
+                self._thread.start()
+
+    def offer(self, event: Event) -> None:
+        self._ensure_worker()
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def close(self) -> None:
+        self.queue.put(None)
+
+    def _run(self) -> None:
+        while (event := self.queue.get()) is not None:
+            try:
+                self.handler(event)
+                self.delivered += 1
+            except Exception:
+                self.errors += 1
+                logger.exception("event handler failed", extra={"subscriber": self.name, "event": event.type})
+
+    def stats(self) -> dict:
+        return {**super().stats(), "queued": self.queue.qsize(), "errors": self.errors}
+
+
+# subscribe_async(): طابور مربوط بحلقة الحدث الحالية (WebSocket/SSE)
+class AsyncSubscription(_Subscription):
+    def __init__(self, id: int, name: str, types: tuple[type[Event], ...], maxsize: int):
+        super().__init__(id, name, types)
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+
+    def offer(self, event: Event) -> None:
+        # الناشرون يعملون على خيوط العمّال وعلى الحلقة نفسها
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:  # الحلقة أُغلقت: المشترك لم يعد موجودًا
+            self.dropped += 1
+
+    def _put(self, event: Event) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def next(self, timeout: float | None = None) -> Event | None:
+        """
+        الحدث التالي، أو None بعد timeout ثانية.
+        """
+        try:
+            event = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self.delivered += 1
+        return event
+
+    def stats(self) -> dict:
+        return {**super().stats(), "queued": self.queue.qsize()}
+
+
+class EventBus:
+    """
+    ناقل أحداث داخل العملية: لكل مشترك طابور محدود، فالبطيء يُسقط أحداثه هو فقط (dropped).
+    لكل عامل uvicorn ناقله: يرى التغييرات التي أجراها بنفسه فقط.
+    """
+
+    def __init__(self, queue_max: int):
+        self.queue_max = max(1, int(queue_max))
+        self._ids = itertools.count(1)
+        self._subs: tuple[_Subscription, ...] = ()  # يُستبدل ولا يُعدَّل: publish يقرؤه بلا قفل
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._published: dict[str, int] = {}
+
+    def subscribe(self, handler: Callable[[Event], None], *types: type[Event], name: str | None = None,
+                  maxsize: int | None = None) -> ThreadSubscription:
+        sub = ThreadSubscription(next(self._ids), name or getattr(handler, "__name__", "handler"), types,
+                                 handler, maxsize or self.queue_max)
+        self._add(sub)
+        return sub
+
+    def subscribe_async(self, *types: type[Event], name: str = "async",
+                        maxsize: int | None = None) -> AsyncSubscription:
+        sub = AsyncSubscription(next(self._ids), name, types, maxsize or self.queue_max)
+        self._add(sub)
+        return sub
+
+    def unsubscribe(self, sub: _Subscription) -> None:
+        with self._lock:
+            self._subs = tuple(s for s in self._subs if s is not sub)
+        if isinstance(sub, ThreadSubscription):
+            sub.close()
+
+    def _add(self, sub: _Subscription) -> None:
+        with self._lock:
+            self._subs = (*self._subs, sub)
+
+    def _check_pid(self) -> None:
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    # بعد fork: مشتركو async مربوطون بحلقة الأب، وعدّاداته ليست لنا
+                    self._subs = tuple(s for s in self._subs if not isinstance(s, AsyncSubscription))
+                    self._published = {}
+                    self._pid = os.getpid()
+
+    def publish(self, event: Event) -> None:
+        self._check_pid()
+        for sub in self._subs:
+            if sub.wants(event):
+                sub.offer(event)
+        with self._lock:
+            self._published[event.type] = self._published.get(event.type, 0) + 1
+
+    def stats(self) -> dict:
+        self._check_pid()
+        with self._lock:
+            published = dict(self._published)
+        return {"published": published, "subscribers": [s.stats() for s in self._subs]}
+
+
+bus = EventBus(settings.EVENT_QUEUE_MAX)
+
+
+def publish(event: Event) -> None:
+    bus.publish(event)
+
+
+def subscribe(handler: Callable[[Event], None], *types: type[Event], name: str | None = None,
+              maxsize: int | None = None) -> ThreadSubscription:
+    return bus.subscribe(handler, *types, name=name, maxsize=maxsize)
+
+
+def subscribe_async(*types: type[Event], name: str = "async", maxsize: int | None = None) -> AsyncSubscription:
+    return bus.subscribe_async(*types, name=name, maxsize=maxsize)
+
+
+def unsubscribe(sub: _Subscription) -> None:
+    bus.unsubscribe(sub)
+
+
+def stats() -> dict:
+    return bus.stats()
@@ -0,0 +1,163 @@
+"""
+Server-side indicator state per symbol (and timeframe).
+
+Every price that reaches the bot through a webhook or ``/api/ticks`` advances
+that series' :class:`~app.indicators.StreamingIndicators` in O(1). Alerts can
+then send just a price and let the server fill in RSI / EMA / MACD.
+
+State lives in memory and is written behind to the ``indicator_state`` table
+by a daemon thread every ``INDICATOR_FLUSH_S`` seconds (and at exit), so a
+restart resumes the series instead of warming up again. Each process keeps
+its own copy: feed a given symbol to one worker, otherwise the last flush wins.
+"""
+
+from __future__ import annotations
+
+import atexit
+import os
+import threading
+
+from . import store
+from .config import settings
+from .indicators import StreamingIndicators
+
+FIELDS = ("rsi", "ema_fast", "ema_slow", "macd", "macd_signal")
+
+
+def series_key(symbol: str, timeframe: str | None = None) -> str:
+    symbol = (symbol or "").strip().upper()
+    timeframe = (timeframe or "").strip()
+    return f"{symbol}:{timeframe}" if timeframe else symbol
+
+
+class IndicatorBook:
+    """
+    In-memory map of series key -> streaming indicators with write-behind.
+    """
+
+    def __init__(self, flush_interval_s: float):
+        self.flush_interval_s = max(0.1, float(flush_interval_s))
+        self._lock = threading.Lock()
+        self._pid = 0
+        self._series: dict[str, StreamingIndicators] = {}
+        self._dirty: set[str] = set()
+        self._wake = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._stats = dict.fromkeys(("ticks", "flushes", "flush_errors"), 0)
+
+    def loaded(self) -> bool:
+        return self._pid == os.getpid()
+
+    def _ensure_loaded(self) -> None:
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # first use or after fork: start from what the last flush saved
+            series = {}
+            for key, state in store.load_indicator_states().items():
+                restored = StreamingIndicators.from_state(state)
+                if restored is not None:
+                    series[key] = restored
+            self._series = series
+            self._dirty = set()
+            self._wake = threading.Event()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="indicator-flush", daemon=True)
+            self._thread.start()
+
+    def update(self, symbol: str, price: float, timeframe: str | None = None) -> dict[str, float | None]:
+        """
+        Advance the series with a new price and return the current values.
+        """
+        self._ensure_loaded()
+        key = series_key(symbol, timeframe)
+        with self._lock:
+            state = self._series.get(key)
+            if state is None:
+                state = self._series[key] = StreamingIndicators()
+            values = state.update(price)
+            self._dirty.add(key)
+            self._stats["ticks"] += 1
+        return values
+
+    def values(self, symbol: str, timeframe: str | None = None) -> dict[str, float | None] | None:
+        """
+        Current values without advancing; ``None`` for an unknown series.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            state = self._series.get(series_key(symbol, timeframe))
+            return state.values() if state is not None else None
+
+    def flush(self) -> int:
+        """
+        Persist the series touched since the last flush. Returns how many.
+        """
+        if self._pid != os.getpid():
+            return 0
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            states = {k: self._series[k].to_state() for k in dirty}
+        try:
+            store.save_indicator_states(states)
+        except Exception:
+            with self._lock:
+                self._dirty |= dirty
+                self._stats["flush_errors"] += 1
+            raise
+        with self._lock:
+            self._stats["flushes"] += 1
+        return len(states)
+
+    def _run(self) -> None:
+        wake = self._wake
+        while not wake.wait(self.flush_interval_s):
+            try:
+                self.flush()
+            except Exception:
+                pass  # counted in stats; retried on the next round
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "series": len(self._series), "dirty": len(self._dirty)}
+
+
+_book = IndicatorBook(settings.INDICATOR_FLUSH_S)
+
+
+def load() -> None:
+    """
+    Load the saved series and start the flush thread. Blocking (SQLite): call it
+    at startup or from a worker thread, not on the event loop.
+    """
+    _book._ensure_loaded()
+
+
+def loaded() -> bool:
+    return _book.loaded()
+
+
+def update(symbol: str, price: float, timeframe: str | None = None) -> dict[str, float | None]:
+    return _book.update(symbol, price, timeframe)
+
+
+def values(symbol: str, timeframe: str | None = None) -> dict[str, float | None] | None:
+    return _book.values(symbol, timeframe)
+
+
+def flush() -> int:
+    return _book.flush()
+
+
+def stats() -> dict:
+    return _book.stats()
+
+
+@atexit.register
+def _flush_at_exit() -> None:
+    try:
+        _book.flush()
+    except Exception:
+        pass
@@ -0,0 +1,185 @@
+"""
+Technical indicators matching the TradingView alert fields (RSI, EMA, MACD).
+
+Whole-series versions operate on NumPy arrays without a per-bar Python loop:
+the EMA recurrence is solved block by block in closed form, carrying the last
+value between blocks.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+RSI_PERIOD = 14
+EMA_FAST = 9
+EMA_SLOW = 21
+MACD_FAST = 12
+MACD_SLOW = 26
+MACD_SIGNAL = 9
+
+# d**-m must stay far from float64 overflow inside one block
+_MAX_BLOCK_GROWTH = 300.0
+
+
+def ema_recursive(x: np.ndarray, alpha: float, init: float) -> np.ndarray:
+    """
+    y[t] = alpha * x[t] + (1 - alpha) * y[t-1], with y[-1] = init.
+
+    Within a block of length m the recurrence unrolls to
+    y[k] = d**(k+1) * carry + alpha * d**k * cumsum(x[j] * d**-j), d = 1 - alpha.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    out = np.empty_like(x)
+    d = 1.0 - alpha
+    if len(x) == 0:
+        return out
+    if d <= 0.0:
+        out[:] = x
+        return out
+    block = max(1, min(len(x), int(_MAX_BLOCK_GROWTH / -np.log(d)))) if d < 1.0 else len(x)
+    grow = d ** -np.arange(block, dtype=np.float64)
+    shrink = 1.0 / grow
+    carry = float(init)
+    for start in range(0, len(x), block):
+        seg = x[start:start + block]
+        k = len(seg)
+        acc = np.cumsum(seg * grow[:k])
+        out[start:start + k] = shrink[:k] * (d * carry + alpha * acc)
+        carry = out[start + k - 1]
+    return out
+
+
+def ema(x: np.ndarray, span: int) -> np.ndarray:
+    """
+    EMA with alpha = 2 / (span + 1), seeded with the first value (Pine ``ta.ema``).
+    """
+    x = np.asarray(x, dtype=np.float64)
+    if len(x) == 0:
+        return x.copy()
+    return ema_recursive(x, 2.0 / (span + 1.0), x[0])
+
+
+def rsi(close: np.ndarray, period: int = RSI_PERIOD) -> np.ndarray:
+    """
+    Wilder RSI: averages seeded with the SMA of the first ``period`` changes,
+    then smoothed with alpha = 1 / period. The first ``period`` bars are NaN.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    out = np.full(len(close), np.nan)
+    if len(close) <= period:
+        return out
+    diff = np.diff(close)
+    gains = np.clip(diff, 0.0, None)
+    losses = np.clip(-diff, 0.0, None)
+    alpha = 1.0 / period
+    avg_gain = np.empty(len(diff) - period + 1)
+    avg_loss = np.empty_like(avg_gain)
+    avg_gain[0] = gains[:period].mean()
+    avg_loss[0] = losses[:period].mean()
+    avg_gain[1:] = ema_recursive(gains[period:], alpha, avg_gain[0])
+    avg_loss[1:] = ema_recursive(losses[period:], alpha, avg_loss[0])
+    out[period:] = rsi_from_averages(avg_gain, avg_loss)
+    return out
+
+
+def rsi_from_averages(avg_gain, avg_loss):
+    """
+    100 when there were no losses, 0 when there were no gains (Pine ``ta.rsi``).
+    """
+    avg_gain = np.asarray(avg_gain, dtype=np.float64)
+    avg_loss = np.asarray(avg_loss, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        value = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+    value = np.where(avg_loss == 0.0, 100.0, value)
+    return np.where((avg_gain == 0.0) & (avg_loss != 0.0), 0.0, value)
+
+
+def macd(close: np.ndarray, fast: int = MACD_FAST, slow: int = MACD_SLOW,
+         signal: int = MACD_SIGNAL) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Return (macd_line, signal_line).
+    """
+    line = ema(close, fast) - ema(close, slow)
+    return line, ema(line, signal)
+
+
+class StreamingIndicators:
+    """
+    Incremental RSI / EMA fast+slow / MACD+signal for one price series.
+
+    Each ``update`` is O(1) and reproduces the whole-series functions above
+    bar for bar (same seeding). Values are ``None`` until enough prices have
+    been seen for that indicator.
+    """
+
+    __slots__ = ("count", "last", "gain", "loss", "ema_fast", "ema_slow",
+                 "macd_fast", "macd_slow", "signal")
+
+    PARAMS = (RSI_PERIOD, EMA_FAST, EMA_SLOW, MACD_FAST, MACD_SLOW, MACD_SIGNAL)
+
+    def __init__(self):
+        self.count = 0
+        self.last = self.gain = self.loss = 0.0
+        self.ema_fast = self.ema_slow = self.macd_fast = self.macd_slow = self.signal = 0.0
+
+    def update(self, price: float) -> dict[str, float | None]:
+        price = float(price)
+        if self.count == 0:
+            self.ema_fast = self.ema_slow = self.macd_fast = self.macd_slow = price
+            self.signal = 0.0
+        else:
+            change = price - self.last
+            up, down = (change, 0.0) if change > 0 else (0.0, -change)
+            if self.count <= RSI_PERIOD:
+                # seed phase: sum the first RSI_PERIOD changes, then average
+                self.gain += up
+                self.loss += down
+                if self.count == RSI_PERIOD:
+                    self.gain /= RSI_PERIOD
+                    self.loss /= RSI_PERIOD
+            else:
+                a = 1.0 / RSI_PERIOD
+                self.gain = a * up + (1.0 - a) * self.gain
+                self.loss = a * down + (1.0 - a) * self.loss
+            self.ema_fast = _step(self.ema_fast, price, EMA_FAST)
+            self.ema_slow = _step(self.ema_slow, price, EMA_SLOW)
+            self.macd_fast = _step(self.macd_fast, price, MACD_FAST)
+            self.macd_slow = _step(self.macd_slow, price, MACD_SLOW)
+            self.signal = _step(self.signal, self.macd_fast - self.macd_slow, MACD_SIGNAL)
+        self.last = price
+        self.count += 1
+        return self.values()
+
+    def values(self) -> dict[str, float | None]:
+        n = self.count
+        line = self.macd_fast - self.macd_slow
+        rsi_value = None
+        if n > RSI_PERIOD:
+            rsi_value = float(rsi_from_averages(self.gain, self.loss))
+        return {
+            "rsi": rsi_value,
+            "ema_fast": self.ema_fast if n >= EMA_FAST else None,
+            "ema_slow": self.ema_slow if n >= EMA_SLOW else None,
+            "macd": line if n >= MACD_SLOW else None,
+            "macd_signal": self.signal if n >= MACD_SLOW + MACD_SIGNAL else None,
+        }
+
+    def to_state(self) -> list:
+        return [list(self.PARAMS), *(getattr(self, f) for f in self.__slots__)]
+
+    @classmethod
+    def from_state(cls, state: list) -> "StreamingIndicators | None":
+        """
+        Restore a saved state; ``None`` if it was saved with other periods.
+        """
+        if not state or list(state[0]) != list(cls.PARAMS) or len(state) != len(cls.__slots__) + 1:
+            return None
+        obj = cls()
+        for name, value in zip(cls.__slots__, state[1:]):
+            setattr(obj, name, int(value) if name == "count" else float(value))
+        return obj
+
+
+def _step(prev: float, value: float, span: int) -> float:
+    a = 2.0 / (span + 1.0)
+    return a * value + (1.0 - a) * prev
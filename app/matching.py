@@ -0,0 +1,404 @@
+from __future__ import annotations
+
+import sys
+import threading
+from array import array
+from bisect import bisect_left, insort
+from collections import deque
+from decimal import Decimal
+from typing import NamedTuple
+
+BUY, SELL = 0, 1
+SIDES = ("buy", "sell")
+MARKET, LIMIT, STOP, STOP_LIMIT = 0, 1, 2, 3
+TYPES = ("market", "limit", "stop", "stop_limit")
+NEW, PARTIAL, FILLED, CANCELLED, REPLACED = 0, 1, 2, 3, 4
+STATUSES = ("new", "partially_filled", "filled", "cancelled", "replaced")
+DAY, GTC, IOC = 0, 1, 2
+TIFS = ("day", "gtc", "ioc")
+
+_SIDE_CODES = {name: i for i, name in enumerate(SIDES)}
+_TYPE_CODES = {name: i for i, name in enumerate(TYPES)}
+_TIF_CODES = {name: i for i, name in enumerate(TIFS)}
+_UNLIMITED = sys.maxsize
+
+
+class Fill(NamedTuple):
+    order_id: int
+    symbol: str
+    side: str
+    qty: int
+    price: float
+    leaves: int
+    liquidity: str  # "book" (أمر قائم آخر) أو "quote" (السوق)
+
+
+class _Levels:
+    """
+    جانب واحد من الدفتر: تيكات تصاعدية وطابور FIFO لأرقام الأوامر عند كل تيك.
+    """
+
+    __slots__ = ("ticks", "queues")
+
+    def __init__(self):
+        self.ticks = array("q")
+        self.queues: dict[int, deque] = {}
+
+    def add(self, tick: int, oid: int) -> None:
+        q = self.queues.get(tick)
+        if q is None:
+            q = self.queues[tick] = deque()
+            insort(self.ticks, tick)
+        q.append(oid)
+
+    def drop(self, tick: int) -> None:
+        del self.queues[tick]
+        del self.ticks[bisect_left(self.ticks, tick)]
+
+
+class OrderBook:
+    """
+    دفتر رمز واحد بأولوية السعر ثم الوقت.
+    """
+
+    __slots__ = ("symbol", "index", "bids", "asks", "buy_stops", "sell_stops", "market",
+                 "last_tick", "last_price", "supply")
+
+    def __init__(self, symbol: str, index: int):
+        self.symbol = symbol
+        self.index = index
+        self.bids = _Levels()
+        self.asks = _Levels()
+        self.buy_stops = _Levels()
+        self.sell_stops = _Levels()
+        self.market = (deque(), deque())  # أوامر سوق تنتظر سعرًا، لكل جانب
+        self.last_tick: int | None = None
+        self.last_price = 0.0
+        self.supply = [0, 0]  # ما بقي من depth_per_quote في السعر الحالي للمشترين / البائعين
+
+
+class MatchingEngine:
+    """
+    مطابقة أوامر التداول الورقي. حقول الأوامر في أعمدة array مفهرسة برقم الأمر (بلا كائن لكل أمر)،
+    والإلغاء كسول: يبقى الرقم في الطابور ويُتخطى. كل دالة عامة تحت قفل واحد، وما يُنفّذ منها
+    يعيد تنفيذات كل الأوامر بترتيب حدوثها.
+    """
+
+    def __init__(self, tick_size: float = 0.0001, depth_per_quote: int = 0):
+        if tick_size <= 0:
+            raise ValueError("tick_size must be > 0")
+        self.tick_size = float(tick_size)
+        # منازل التيك العشرية: tick * tick_size يعطي 53.11999999999999 بدل 53.12
+        self._decimals = max(0, -Decimal(repr(self.tick_size)).normalize().as_tuple().exponent)
+        self.depth_per_quote = max(0, int(depth_per_quote))
+        self._lock = threading.Lock()
+        self._books: dict[str, OrderBook] = {}
+        self._by_index: list[OrderBook] = []
+        # أعمدة الأوامر، مفهرسة برقم الأمر
+        self._book = array("I")
+        self._side = array("b")
+        self._type = array("b")
+        self._tif = array("b")
+        self._status = array("b")
+        self._qty = array("q")
+        self._filled = array("q")
+        self._limit = array("q")
+        self._stop = array("q")
+        self._notional = array("d")
+        self._stats = dict.fromkeys(("orders", "fills", "cancels", "replaces", "quotes"), 0)
+
+    # ----- الواجهة العامة -----
+    def submit(self, symbol: str, side: str, qty: int, order_type: str = "market",
+               limit_price: float | None = None, stop_price: float | None = None,
+               tif: str = "day") -> tuple[int, list[Fill]]:
+        side_i = _code(_SIDE_CODES, side, "side")
+        type_i = _code(_TYPE_CODES, order_type, "order_type")
+        tif_i = _code(_TIF_CODES, tif, "tif")
+        qty = int(qty)
+        if qty <= 0:
+            raise ValueError("qty must be > 0")
+        if type_i in (LIMIT, STOP_LIMIT) and not limit_price:
+            raise ValueError(f"{order_type} order needs limit_price")
+        if type_i in (STOP, STOP_LIMIT) and not stop_price:
+            raise ValueError(f"{order_type} order needs stop_price")
+        limit = self._tick(limit_price) if type_i in (LIMIT, STOP_LIMIT) else 0
+        stop = self._tick(stop_price) if type_i in (STOP, STOP_LIMIT) else 0
+        fills: list[Fill] = []
+        with self._lock:
+            book = self._book_for(symbol)
+            oid = self._new_order(book.index, side_i, type_i, tif_i, qty, limit, stop)
+            self._enter(book, oid, fills)
+        return oid, fills
+
+    def cancel(self, oid: int) -> bool:
+        with self._lock:
+            if not 0 <= oid < len(self._status) or self._status[oid] >= FILLED:
+                return False
+            self._status[oid] = CANCELLED
+            self._stats["cancels"] += 1
+            return True
+
+    def replace(self, oid: int, qty: int | None = None, limit_price: float | None = None,
+                stop_price: float | None = None) -> tuple[int, list[Fill]]:
+        """
+        تخفيض الكمية فقط يُبقي الأمر ومكانه في الطابور؛ غير ذلك يلغيه ويُدخل أمرًا جديدًا
+        للباقي برقم جديد (يُعاد) ويفقد أولوية الوقت.
+        """
+        fills: list[Fill] = []
+        with self._lock:
+            if not 0 <= oid < len(self._status) or self._status[oid] >= FILLED:
+                raise KeyError(oid)
+            type_i = self._type[oid]
+            new_qty = int(qty) if qty is not None else self._qty[oid]
+            if new_qty <= self._filled[oid]:
+                raise ValueError("qty must exceed the filled quantity")
+            limit = self._tick(limit_price) if limit_price and type_i in (LIMIT, STOP_LIMIT) else self._limit[oid]
+            stop = self._tick(stop_price) if stop_price and type_i in (STOP, STOP_LIMIT) else self._stop[oid]
+            self._stats["replaces"] += 1
+            if new_qty <= self._qty[oid] and limit == self._limit[oid] and stop == self._stop[oid]:
+                self._qty[oid] = new_qty
+                return oid, fills
+            self._status[oid] = REPLACED
+            book = self._by_index[self._book[oid]]
+            new = self._new_order(book.index, self._side[oid], type_i, self._tif[oid],
+                                  new_qty - self._filled[oid], limit, stop)
+            self._enter(book, new, fills)
+        return new, fills
+
+    def on_quote(self, symbol: str, price: float) -> list[Fill]:
+        """
+        آخر سعر: يفعّل أوامر الإيقاف ثم ينفّذ أوامر السوق والحدود التي يعبرها، الأفضل أولًا.
+        """
+        if not price or price <= 0:
+            return []
+        fills: list[Fill] = []
+        with self._lock:
+            self._stats["quotes"] += 1
+            book = self._book_for(symbol)
+            tick = self._tick(price)
+            book.last_tick, book.last_price = tick, float(price)
+            depth = self.depth_per_quote or _UNLIMITED
+            book.supply[BUY] = book.supply[SELL] = depth
+
+            stops = book.buy_stops
+            while stops.ticks and stops.ticks[0] <= tick:
+                self._trigger(book, stops, stops.ticks[0], fills)
+            stops = book.sell_stops
+            while stops.ticks and stops.ticks[-1] >= tick:
+                self._trigger(book, stops, stops.ticks[-1], fills)
+
+            self._sweep(book, BUY, fills)
+            self._sweep(book, SELL, fills)
+        return fills
+
+    def last_price(self, symbol: str) -> float:
+        book = self._books.get(symbol)
+        return book.last_price if book is not None else 0.0
+
+    def order(self, oid: int) -> dict:
+        with self._lock:
+            if not 0 <= oid < len(self._status):
+                raise KeyError(oid)
+            return self._describe(oid)
+
+    def open_orders(self, symbol: str | None = None) -> list[dict]:
+        with self._lock:
+            books = [self._books[symbol]] if symbol in self._books else [] if symbol else self._by_index
+            ids: set[int] = set()
+            for book in books:
+                for levels in (book.bids, book.asks, book.buy_stops, book.sell_stops):
+                    for q in levels.queues.values():
+                        ids.update(q)
+                for q in book.market:
+                    ids.update(q)
+            return [self._describe(oid) for oid in sorted(ids) if self._status[oid] < FILLED]
+
+    def depth(self, symbol: str, levels: int = 10) -> dict:
+        """
+        الكمية الحية مجمّعة لكل مستوى سعر، الأفضل أولًا.
+        """
+        with self._lock:
+            book = self._books.get(symbol)
+            if book is None:
+                return {"symbol": symbol, "last": 0.0, "bids": [], "asks": []}
+            return {
+                "symbol": symbol,
+                "last": book.last_price,
+                "bids": self._aggregate(book.bids, reversed(book.bids.ticks), levels),
+                "asks": self._aggregate(book.asks, book.asks.ticks, levels),
+            }
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "books": len(self._books)}
+
+    # ----- داخلي (القفل مأخوذ) -----
+    def _tick(self, price: float) -> int:
+        return int(round(float(price) / self.tick_size))
+
+    def _price(self, tick: int) -> float:
+        return round(tick * self.tick_size, self._decimals)
+
+    def _book_for(self, symbol: str) -> OrderBook:
+        book = self._books.get(symbol)
+        if book is None:
+            book = self._books[symbol] = OrderBook(symbol, len(self._by_index))
+            self._by_index.append(book)
+        return book
+
+    def _new_order(self, book: int, side: int, type_i: int, tif: int, qty: int, limit: int, stop: int) -> int:
+        oid = len(self._status)
+        self._book.append(book)
+        self._side.append(side)
+        self._type.append(type_i)
+        self._tif.append(tif)
+        self._status.append(NEW)
+        self._qty.append(qty)
+        self._filled.append(0)
+        self._limit.append(limit)
+        self._stop.append(stop)
+        self._notional.append(0.0)
+        self._stats["orders"] += 1
+        return oid
+
+    def _enter(self, book: OrderBook, oid: int, fills: list[Fill]) -> None:
+        side, type_i = self._side[oid], self._type[oid]
+        if type_i in (STOP, STOP_LIMIT):
+            stop, last = self._stop[oid], book.last_tick
+            if last is None or (last < stop if side == BUY else last > stop):
+                (book.buy_stops if side == BUY else book.sell_stops).add(stop, oid)
+                return
+            type_i = self._type[oid] = MARKET if type_i == STOP else LIMIT
+        leaves = self._match(book, oid, side, type_i == MARKET, fills)
+        if not leaves:
+            return
+        if self._tif[oid] == IOC:
+            self._status[oid] = CANCELLED
+        elif type_i == MARKET:
+            book.market[side].append(oid)
+        else:
+            (book.bids if side == BUY else book.asks).add(self._limit[oid], oid)
+
+    def _match(self, book: OrderBook, oid: int, side: int, is_market: bool, fills: list[Fill]) -> int:
+        leaves = self._qty[oid] - self._filled[oid]
+        limit = self._limit[oid]
+        if side == BUY:
+            levels = book.asks
+            while leaves and levels.ticks:
+                tick = levels.ticks[0]
+                if not is_market and tick > limit:
+                    break
+                leaves = self._cross(book, levels, tick, oid, leaves, fills)
+        else:
+            levels = book.bids
+            while leaves and levels.ticks:
+                tick = levels.ticks[-1]
+                if not is_market and tick < limit:
+                    break
+                leaves = self._cross(book, levels, tick, oid, leaves, fills)
+        last = book.last_tick
+        if leaves and last is not None and (is_market or (limit >= last if side == BUY else limit <= last)):
+            leaves = self._take_quote(book, oid, side, leaves, fills)
+        return leaves
+
+    def _cross(self, book: OrderBook, levels: _Levels, tick: int, oid: int, leaves: int,
+               fills: list[Fill]) -> int:
+        q = levels.queues[tick]
+        price = self._price(tick)
+        status, qty, filled = self._status, self._qty, self._filled
+        while q and leaves:
+            rid = q[0]
+            if status[rid] >= FILLED:
+                q.popleft()
+                continue
+            avail = qty[rid] - filled[rid]
+            n = avail if avail < leaves else leaves
+            self._fill(book, rid, n, price, "book", fills)
+            self._fill(book, oid, n, price, "book", fills)
+            leaves -= n
+            if n == avail:
+                q.popleft()
+        if not q:
+            levels.drop(tick)
+        return leaves
+
+    def _take_quote(self, book: OrderBook, oid: int, side: int, leaves: int, fills: list[Fill]) -> int:
+        avail = book.supply[side]
+        n = avail if avail < leaves else leaves
+        if n:
+            book.supply[side] -= n
+            self._fill(book, oid, n, book.last_price, "quote", fills)
+        return leaves - n
+
+    def _fill(self, book: OrderBook, oid: int, n: int, price: float, liquidity: str,
+              fills: list[Fill]) -> None:
+        self._filled[oid] += n
+        self._notional[oid] += n * price
+        leaves = self._qty[oid] - self._filled[oid]
+        self._status[oid] = PARTIAL if leaves else FILLED
+        self._stats["fills"] += 1
+        fills.append(Fill(oid, book.symbol, SIDES[self._side[oid]], n, price, leaves, liquidity))
+
+    def _trigger(self, book: OrderBook, stops: _Levels, tick: int, fills: list[Fill]) -> None:
+        q = stops.queues[tick]
+        stops.drop(tick)
+        for oid in q:
+            if self._status[oid] < FILLED:
+                self._enter(book, oid, fills)
+
+    def _sweep(self, book: OrderBook, side: int, fills: list[Fill]) -> None:
+        status = self._status
+        q = book.market[side]
+        while q and book.supply[side]:
+            oid = q[0]
+            if status[oid] >= FILLED or not self._take_quote(book, oid, side, self._qty[oid] - self._filled[oid], fills):
+                q.popleft()
+        levels, last = book.bids if side == BUY else book.asks, book.last_tick
+        while levels.ticks and book.supply[side]:
+            tick = levels.ticks[-1] if side == BUY else levels.ticks[0]
+            if (tick < last) if side == BUY else (tick > last):
+                break
+            q = levels.queues[tick]
+            while q and book.supply[side]:
+                oid = q[0]
+                if status[oid] >= FILLED or not self._take_quote(book, oid, side, self._qty[oid] - self._filled[oid], fills):
+                    q.popleft()
+            if not q:
+                levels.drop(tick)
+
+    def _aggregate(self, levels: _Levels, ticks, limit: int) -> list[list]:
+        out = []
+        for tick in ticks:
+            live = [oid for oid in levels.queues[tick] if self._status[oid] < FILLED]
+            if live:
+                out.append([self._price(tick), sum(self._qty[o] - self._filled[o] for o in live), len(live)])
+                if len(out) >= limit:
+                    break
+        return out
+
+    def _describe(self, oid: int) -> dict:
+        filled = self._filled[oid]
+        type_i = self._type[oid]
+        return {
+            "order_id": oid,
+            "symbol": self._by_index[self._book[oid]].symbol,
+            "side": SIDES[self._side[oid]],
+            "type": TYPES[type_i],
+            "time_in_force": TIFS[self._tif[oid]],
+            "status": STATUSES[self._status[oid]],
+            "qty": self._qty[oid],
+            "filled_qty": filled,
+            # VWAP كما هو: تقريبه للتيك يسجّل صفقة بغير ما نُفّذ (5@101 + 3@100 = 100.625)
+            "avg_price": self._notional[oid] / filled if filled else 0.0,
+            "limit_price": self._price(self._limit[oid]) if self._limit[oid] else None,
+            "stop_price": self._price(self._stop[oid]) if self._stop[oid] else None,
+        }
+
+
+def _code(codes: dict[str, int], value: str, what: str) -> int:
+    code = codes.get(value)
+    if code is None:
+        code = codes.get(str(value).lower())
+        if code is None:
+            raise ValueError(f"{what} must be one of {tuple(codes)}")
+    return code
@@ -1,8 +1,24 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
 from typing import Any
 
-import requests
-
 from .config import settings
+from .core import metrics
+
+TELEGRAM_MAX_TEXT = 4096
+
+_session = None  # requests.Session: يُنشأ عند أول إرسال (استيراد requests ثقيل ولا حاجة له إن كان تيليجرام معطّلًا)
+
+def session():
+    global _session
+    if _session is None:
+        import requests
+        _session = requests.Session()
+    return _session
 
 def _token() -> str:
     return settings.telegram_token
@@ -24,6 +40,9 @@ def _sanitize(text: str) -> str:
     return text
 
 def send(text: str, *, parse_mode: str | None = None) -> dict[str, Any]:
+    """
+    إرسال متزامن (للتشخيص مثل /ping-telegram). مسار التداول يستخدم enqueue.
+    """
     if not enabled():
         return {"ok": False, "reason": "Telegram disabled (missing TOKEN/CHAT_ID)"}
     token = _token()
@@ -31,16 +50,207 @@ def send(text: str, *, parse_mode: str | None = None) -> dict[str, Any]:
     payload: dict[str, Any] = {"chat_id": _chat_id(), "text": text}
     if parse_mode:
         payload["parse_mode"] = parse_mode
+    import requests
     try:
-        r = requests.post(url, json=payload, timeout=15)
+        r = session().post(url, json=payload, timeout=15)
         r.raise_for_status()
         return r.json()
     except requests.HTTPError as e:
+        body: dict[str, Any] = {}
+        try:
+            body = r.json()
+        except ValueError:
+            pass
         return {
             "ok": False,
             "status_code": getattr(r, "status_code", None),
+            "retry_after": (body.get("parameters") or {}).get("retry_after"),
             "error": _sanitize(str(e)),
             "body": _sanitize(getattr(r, "text", ""))
         }
     except Exception as e:
         return {"ok": False, "error": _sanitize(str(e))}
+
+
+# ===== طابور إرسال غير حاجب =====
+@dataclass
+class _Pending:
+    lines: list[str]
+    parse_mode: str | None = None
+    digest: str | None = None
+    attempts: int = 0
+    not_before: float = 0.0
+
+    def render(self) -> str:
+        if len(self.lines) == 1:
+            return self.lines[0][:TELEGRAM_MAX_TEXT]
+        limit = max(1, settings.NOTIFY_DIGEST_MAX_LINES)
+        shown = self.lines[-limit:]
+        head = f"📦 {len(self.lines)}× {self.digest}"
+        if len(self.lines) > limit:
+            head += f" (آخر {limit})"
+        return "\n".join([head, *shown])[:TELEGRAM_MAX_TEXT]
+
+
+class _Notifier:
+    """
+    عامل خلفي يرسل إلى Telegram عبر جلسة HTTP مشتركة.
+    يلتزم بحد المعدل لكل محادثة، ويدمج الرسائل المتشابهة (digest) التي تتراكم
+    أثناء الانتظار في رسالة واحدة، ويعيد المحاولة مع تراجع أسّي.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pid = 0
+        self._thread: threading.Thread | None = None
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, settings.NOTIFY_QUEUE_MAX))
+        self._pending: deque[_Pending] = deque()
+        self._by_digest: dict[tuple[str, str | None], _Pending] = {}
+        self._busy = False
+        self._next_send = 0.0
+        self._stats = dict.fromkeys(("enqueued", "sent", "dropped", "failed", "retried", "merged"), 0)
+
+    def _ensure_worker(self) -> None:
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                if self._pid != os.getpid():
+                    # بعد fork لا يوجد عامل: نبدأ بطابور جديد
+                    self._queue = queue.Queue(maxsize=self._queue.maxsize)
+                    self._pending.clear()
+                    self._by_digest.clear()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="notify-worker", daemon=True)
+                self._thread.start()
+
+    def enqueue(self, text: str, parse_mode: str | None = None, digest: str | None = None) -> bool:
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((text, parse_mode, digest))
+        except queue.Full:
+            with self._lock:
+                self._stats["dropped"] += 1
+            return False
+        with self._lock:
+            self._stats["enqueued"] += 1
+        return True
+
+    def _absorb(self, item: tuple[str, str | None, str | None]) -> None:
+        text, parse_mode, digest = item
+        if digest:
+            key = (digest, parse_mode)
+            pending = self._by_digest.get(key)
+            if pending is not None:
+                pending.lines.append(text)
+                self._stats["merged"] += 1
+                return
+            pending = self._by_digest[key] = _Pending([text], parse_mode, digest)
+        else:
+            pending = _Pending([text], parse_mode)
+        self._pending.append(pending)
+
+    def _drain(self, timeout: float | None) -> None:
+        try:
+            item = self._queue.get(timeout=timeout) if timeout is None or timeout > 0 else self._queue.get_nowait()
+        except queue.Empty:
+            return
+        with self._lock:
+            self._absorb(item)
+            while True:
+                try:
+                    self._absorb(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+    def _run(self) -> None:
+        min_interval = 1.0 / max(settings.NOTIFY_RATE_PER_S, 1e-3)
+        while True:
+            with self._lock:
+                has_work = bool(self._pending)
+                if not has_work and self._queue.empty():
+                    self._busy = False
+                    self._idle.notify_all()
+            self._drain(None if not has_work else 0)
+            with self._lock:
+                if not self._pending:
+                    continue
+                self._busy = True
+                head = self._pending[0]
+                wait = max(self._next_send, head.not_before) - time.monotonic()
+            if wait > 0:
+                # أثناء الانتظار تتراكم رسائل جديدة وتُدمج في الـ digest
+                self._drain(wait)
+                continue
+
+            with self._lock:
+                msg = self._pending.popleft()
+                if msg.digest and self._by_digest.get((msg.digest, msg.parse_mode)) is msg:
+                    del self._by_digest[(msg.digest, msg.parse_mode)]
+            if enabled():
+                with metrics.stage("notify_send"):
+                    res = send(msg.render(), parse_mode=msg.parse_mode)
+            else:
+                res = {"ok": False}
+            self._next_send = time.monotonic() + min_interval
+            self._settle(msg, res)
+
+    def _settle(self, msg: _Pending, res: dict[str, Any]) -> None:
+        with self._lock:
+            if res.get("ok"):
+                self._stats["sent"] += 1
+                return
+            status = res.get("status_code")
+            retryable = status is None or status == 429 or status >= 500
+            msg.attempts += 1
+            if not enabled() or not retryable or msg.attempts > settings.NOTIFY_MAX_RETRIES:
+                self._stats["failed"] += 1
+                return
+            self._stats["retried"] += 1
+            delay = res.get("retry_after") or min(30.0, 2.0 ** (msg.attempts - 1))
+            msg.not_before = time.monotonic() + float(delay)
+            if status == 429:
+                self._next_send = msg.not_before
+            self._pending.appendleft(msg)
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """
+        ينتظر حتى يفرغ الطابور (للاختبارات والإيقاف). يرجّع False عند انتهاء المهلة.
+        """
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while self._busy or self._pending or not self._queue.empty():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(min(remaining, 0.05))
+        return True
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            out: dict[str, Any] = dict(self._stats)
+            out.update(queue_depth=self._queue.qsize() + len(self._pending),
+                       queue_max=self._queue.maxsize)
+        return out
+
+
+_notifier = _Notifier()
+
+
+def enqueue(text: str, *, parse_mode: str | None = None, digest: str | None = None) -> bool:
+    """
+    يضع الرسالة في الطابور ويعود فورًا. digest يجمع الرسائل المتشابهة
+    (مثل "HOLD") المتراكمة في رسالة واحدة. يرجّع False إذا امتلأ الطابور أو Telegram معطّل.
+    """
+    if not enabled():
+        return False
+    return _notifier.enqueue(text, parse_mode, digest)
+
+
+def flush(timeout: float = 5.0) -> bool:
+    return _notifier.flush(timeout)
+
+
+def stats() -> dict[str, Any]:
+    return {"enabled": enabled(), **_notifier.stats()}
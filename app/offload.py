@@ -0,0 +1,47 @@
+"""
+Bounded thread pool for running blocking work (yfinance, SQLite) from async
+endpoints without stalling the event loop.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+from .config import settings
+
+T = TypeVar("T")
+
+_executor: ThreadPoolExecutor | None = None
+_pid = 0
+_lock = threading.Lock()
+
+
+def executor() -> ThreadPoolExecutor:
+    """
+    Return the process-wide executor, recreating it after a fork.
+    """
+    global _executor, _pid
+    if _executor is None or _pid != os.getpid():
+        with _lock:
+            if _executor is None or _pid != os.getpid():
+                _executor = ThreadPoolExecutor(
+                    max_workers=max(1, settings.EXECUTION_WORKERS), thread_name_prefix="exec"
+                )
+                _pid = os.getpid()
+    return _executor
+
+
+async def run_blocking(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Await ``fn(*args, **kwargs)`` on the bounded executor, carrying over the
+    caller's context variables (correlation id) like ``asyncio.to_thread``.
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(executor(), functools.partial(ctx.run, fn, *args, **kwargs))
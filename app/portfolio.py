@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+from dataclasses import dataclass
+from typing import Callable
+
+from fastapi import Response
+
+from .config import settings
+from .quotes import get_quotes, quote_ages, quotes_version
+from .store import get_book
+
+CACHE_CONTROL = "no-cache"  # المتصفح يحتفظ بالجسم لكن يتحقق منه (If-None-Match) في كل طلب
+
+
+@dataclass(frozen=True, slots=True)
+class _Body:
+    etag: str
+    payload: dict
+
+
+@dataclass(frozen=True, slots=True)
+class Snapshot:
+    version: tuple[int, int]
+    symbols: tuple[str, ...]
+    portfolio: _Body
+    positions: _Body
+
+
+def _body(payload: dict, volatile: tuple[str, ...]) -> _Body:
+    stable = {k: v for k, v in payload.items() if k not in volatile}
+    if "positions" in stable:
+        stable["positions"] = [{k: v for k, v in p.items() if k not in volatile} for p in stable["positions"]]
+    digest = hashlib.blake2b(json.dumps(stable, sort_keys=True).encode(), digest_size=12).hexdigest()
+    return _Body(f'W/"{digest}"', payload)
+
+
+def _build(version: tuple[int, int], positions: list[dict], cash: float, quotes: dict) -> Snapshot:
+    market_val = sum(p["net_qty"] * quotes[p["symbol"]].price for p in positions if p["symbol"] in quotes)
+    equity = cash + market_val
+    pnl = equity - settings.BASE_CAPITAL
+    pnl_pct = (pnl / settings.BASE_CAPITAL) * 100.0 if settings.BASE_CAPITAL > 0 else 0.0
+    portfolio = {
+        "base_capital": round(settings.BASE_CAPITAL, 2),
+        "cash": round(cash, 2),
+        "market_value": round(market_val, 2),
+        "equity": round(equity, 2),
+        "pnl": round(pnl, 2),
+        "pnl_pct": round(pnl_pct, 2),
+        "quotes_max_age_s": 0.0,  # يُملأ عند كل رد
+    }
+    rows = []
+    for p in positions:
+        q = quotes.get(p["symbol"])
+        cur = q.price if q else 0.0
+        rows.append({
+            "symbol": p["symbol"], "qty": p["net_qty"], "avg_cost": round(p["avg_cost"], 4),
+            "last": round(cur, 4), "last_age_s": None,
+            "pnl": round((cur - p["avg_cost"]) * p["net_qty"], 2),
+            "pnl_pct": round(((cur / p["avg_cost"]) - 1.0) * 100.0 if p["avg_cost"] > 0 else 0.0, 2),
+        })
+    return Snapshot(
+        version=version,
+        symbols=tuple(p["symbol"] for p in positions),
+        portfolio=_body(portfolio, ("quotes_max_age_s",)),
+        positions=_body({"positions": rows}, ("last_age_s",)),
+    )
+
+
+class SnapshotCache:
+    """
+    لقطة المحفظة لـ /api/portfolio و /api/open-positions: تُبنى من جديد فقط عندما يتغيّر
+    إصدارها (آخر id صفقة، إصدار أسعار الرموز المحتفظ بها). ETag من المحتوى دون حقول العمر،
+    فيتفق بين العمّال ويرجع 304 ما دام ما يراه العميل لم يتغيّر.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snap: Snapshot | None = None
+        self._stats = dict.fromkeys(("hits", "builds", "not_modified"), 0)
+
+    def get(self) -> Snapshot:
+        trade_id, positions, cash = get_book()
+        symbols = [p["symbol"] for p in positions]
+        # الإصدار أولًا ثم البيانات: تحديث بينهما يكلّف إعادة بناء إضافية فقط
+        version = (trade_id, quotes_version(symbols))
+        with self._lock:
+            snap = self._snap
+        if snap is not None and snap.version == version and _fresh(symbols):
+            return self._hit(snap)
+        quotes = get_quotes(symbols) if symbols else {}
+        after = (trade_id, quotes_version(symbols))
+        if after != version:
+            # الجلب نفسه غيّر الأسعار: نقرؤها ثانية من الكاش (طازجة، بلا جلب) ونتحقق أن
+            # الإصدار لم يتحرك بينهما، وإلا تبقى اللقطة على الإصدار القديم وتُبنى مرة أخرى
+            quotes = get_quotes(symbols)
+            if quotes_version(symbols) == after[1]:
+                version = after
+        if snap is not None and snap.version == version:
+            return self._hit(snap)  # أُعيد الجلب ولم يتحرك أي سعر
+        snap = _build(version, positions, cash, quotes)
+        with self._lock:
+            self._stats["builds"] += 1
+            self._snap = snap
+        return snap
+
+    def _hit(self, snap: Snapshot) -> Snapshot:
+        with self._lock:
+            self._stats["hits"] += 1
+        return snap
+
+    def respond(self, body: _Body, if_none_match: str | None, render: Callable[[dict], dict]) -> Response:
+        headers = {"ETag": body.etag, "Cache-Control": CACHE_CONTROL}
+        if if_none_match and _matches(if_none_match, body.etag):
+            with self._lock:
+                self._stats["not_modified"] += 1
+            return Response(status_code=304, headers=headers)
+        return Response(json.dumps(render(body.payload)).encode(), media_type="application/json", headers=headers)
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self._stats)
+            out["version"] = list(self._snap.version) if self._snap else None
+        return out
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    # مقارنة ضعيفة (RFC 9110 13.1.2): البادئة W/ تُتجاهل
+    tag = etag.removeprefix("W/")
+    return any(t.strip() == "*" or t.strip().removeprefix("W/") == tag for t in if_none_match.split(","))
+
+
+def _fresh(symbols: list[str]) -> bool:
+    return all(a is not None and a <= settings.QUOTE_CACHE_TTL_S for a in quote_ages(symbols).values())
+
+
+def _ages(symbols: tuple[str, ...]) -> dict[str, float | None]:
+    # وقت الرد: جلب بنفس السعر يُبقي اللقطة لكنه يصفّر العمر
+    return {s: round(a, 3) if a is not None else None for s, a in quote_ages(list(symbols)).items()}
+
+
+_cache = SnapshotCache()
+
+
+def portfolio_response(if_none_match: str | None = None) -> Response:
+    snap = _cache.get()
+
+    def render(payload: dict) -> dict:
+        ages = [a for a in _ages(snap.symbols).values() if a is not None]
+        return {**payload, "quotes_max_age_s": max(ages, default=0.0)}
+
+    return _cache.respond(snap.portfolio, if_none_match, render)
+
+
+def positions_response(if_none_match: str | None = None) -> Response:
+    snap = _cache.get()
+
+    def render(payload: dict) -> dict:
+        ages = _ages(snap.symbols)
+        return {"positions": [{**row, "last_age_s": ages.get(row["symbol"])} for row in payload["positions"]]}
+
+    return _cache.respond(snap.positions, if_none_match, render)
+
+
+def stats() -> dict:
+    return _cache.stats()
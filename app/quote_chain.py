@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any
+
+from .config import settings
+from .quotes import QuoteProvider
+
+logger = logging.getLogger(__name__)
+
+MIN_SAMPLES = 20  # قبل هذا العدد من القياسات: التحوّط عند نصف المهلة
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitBreaker:
+    """
+    فشل متتالٍ يفتح القاطع لمدة reset_s، ثم طلب تجريبي واحد يقرر إغلاقه.
+    """
+
+    def __init__(self, failures: int, reset_s: float):
+        self.threshold = max(1, int(failures))
+        self.reset_s = float(reset_s)
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_s:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def success(self) -> None:
+        with self._lock:
+            self.state, self.failures, self._probing = CLOSED, 0, False
+
+    def failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == HALF_OPEN or self.failures >= self.threshold:
+                if self.state != OPEN:
+                    self.trips += 1
+                self.state, self.opened_at = OPEN, time.monotonic()
+
+
+class _Member:
+    """
+    مزوّد واحد في السلسلة: قاطعه وزمن استجاباته الأخير وعدّاداته.
+    """
+
+    def __init__(self, provider: QuoteProvider, max_inflight: int, window: int = 256):
+        self.provider = provider
+        self.name = provider.name
+        self.max_inflight = max(1, int(max_inflight))
+        self.inflight = 0
+        self.breaker = CircuitBreaker(settings.QUOTE_BREAKER_FAILURES, settings.QUOTE_BREAKER_RESET_S)
+        self._latencies: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.counts = dict.fromkeys(("calls", "errors", "timeouts", "hedges", "wins", "skipped", "saturated"), 0)
+
+    def acquire(self) -> bool:
+        """
+        يحجز خيطًا من حصة المزوّد؛ False إن كانت كلها مشغولة بطلبات عالقة أو متروكة.
+        """
+        with self._lock:
+            if self.inflight >= self.max_inflight:
+                return False
+            self.inflight += 1
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            self.inflight -= 1
+
+    def count(self, key: str) -> None:
+        with self._lock:
+            self.counts[key] += 1
+
+    def observe(self, elapsed: float) -> None:
+        with self._lock:
+            self._latencies.append(elapsed)
+
+    def quantile(self, q: float) -> float | None:
+        with self._lock:
+            data = sorted(self._latencies)
+        if not data:
+            return None
+        return data[min(len(data) - 1, int(q * len(data)))]
+
+    def hedge_delay(self, timeout_s: float) -> float:
+        with self._lock:
+            n = len(self._latencies)
+        if n < MIN_SAMPLES:
+            return timeout_s / 2
+        return min(timeout_s, max(settings.QUOTE_HEDGE_MIN_MS / 1000.0, self.quantile(0.95)))
+
+    def stats(self) -> dict[str, Any]:
+        calls = self.counts["calls"]
+        p50, p95, p99 = (self.quantile(q) for q in (0.5, 0.95, 0.99))
+        return {
+            "name": self.name,
+            "state": self.breaker.state,
+            "breaker_trips": self.breaker.trips,
+            "inflight": self.inflight,
+            **self.counts,
+            "error_rate": round((self.counts["errors"] + self.counts["timeouts"]) / calls, 4) if calls else 0.0,
+            **{k: round(v * 1000, 2) if v is not None else None
+               for k, v in (("p50_ms", p50), ("p95_ms", p95), ("p99_ms", p99))},
+        }
+
+
+class ProviderChain(QuoteProvider):
+    """
+    سلسلة مزوّدين مرتبة: الأول ذو القاطع المغلق، تحوّط للتالي بعد p95، والرموز الناقصة
+    تنتقل للتالي. الجلب كله محدود بـ QUOTE_TIMEOUT_S؛ رمز لم يُسعَّر يرجع None.
+    """
+
+    name = "chain"
+
+    def __init__(self, providers: list[QuoteProvider], timeout_s: float | None = None):
+        if not providers:
+            raise ValueError("ProviderChain needs at least one provider")
+        # لكل مزوّد حصة ثابتة من المجمّع: مزوّد عالق (yfinance بلا مهلة) لا يملؤه على الباقين
+        share = max(2, 2 * settings.QUOTE_FETCH_WORKERS)
+        self.members = [_Member(p, share) for p in providers]
+        self.timeout_s = float(timeout_s if timeout_s is not None else settings.QUOTE_TIMEOUT_S)
+        # مجمّع خاص: المزوّدون يتفرعون على مجمّع quotes، والانتظار عليه من داخله قد يعلّق
+        self._pool = ThreadPoolExecutor(max_workers=share * len(providers), thread_name_prefix="quote-chain")
+        self._lock = threading.Lock()
+        self._unpriced = 0
+
+    @property
+    def providers(self) -> list[QuoteProvider]:
+        return [m.provider for m in self.members]
+
+    def fetch_last(self, symbol: str) -> float | None:
+        return self.fetch_many([symbol])[symbol]
+
+    def fetch_detail(self, symbol: str) -> dict | None:
+        return self.fetch_many_details([symbol])[symbol]
+
+    def fetch_many(self, symbols: list[str]) -> dict[str, float | None]:
+        return self._fetch("fetch_many", symbols)
+
+    def fetch_many_details(self, symbols: list[str]) -> dict[str, dict | None]:
+        return self._fetch("fetch_many_details", symbols)
+
+    def _call(self, member: _Member, method: str, symbols: list[str]) -> dict[str, Any]:
+        t0 = time.perf_counter()
+        try:
+            return getattr(member.provider, method)(symbols) or {}
+        finally:
+            # الردود المتأخرة تُحسب أيضًا: هي ما يجب أن يغطيه p95
+            member.observe(time.perf_counter() - t0)
+            member.release()
+
+    def _fetch(self, method: str, symbols: list[str]) -> dict[str, Any]:
+        out: dict[str, Any] = dict.fromkeys(symbols)
+        if not symbols:
+            return out
+        deadline = time.monotonic() + self.timeout_s
+        queue = list(self.members)
+        running: dict[Future, tuple[_Member, list[str]]] = {}
+        pending = list(symbols)
+
+        def launch(hedge: bool) -> bool:
+            while queue:
+                m = queue.pop(0)
+                if not m.acquire():
+                    m.count("saturated")
+                    continue
+                if not m.breaker.allow():
+                    m.release()
+                    m.count("skipped")
+                    continue
+                m.count("calls")
+                if hedge:
+                    m.count("hedges")
+                running[self._pool.submit(self._call, m, method, list(pending))] = (m, list(pending))
+                return True
+            return False
+
+        launch(False)
+        while running:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            # طلب وحيد جارٍ يُتحوَّط له حين يتجاوز p95 المعتاد
+            first = next(iter(running.values()))[0]
+            hedge_in = first.hedge_delay(self.timeout_s) if len(running) == 1 and queue else None
+            done, _ = wait(running, timeout=min(deadline - now, hedge_in if hedge_in is not None else deadline - now),
+                           return_when=FIRST_COMPLETED)
+            if not done:
+                if hedge_in is not None and time.monotonic() < deadline:
+                    launch(True)
+                continue
+            for fut in done:
+                m, asked = running.pop(fut)
+                try:
+                    values = fut.result()
+                except Exception as exc:
+                    m.count("errors")
+                    self._failed(m, str(exc))
+                    continue
+                m.breaker.success()
+                got = [s for s in asked if out.get(s) is None and values.get(s) is not None]
+                if got:
+                    m.count("wins")
+                for s in got:
+                    out[s] = values[s]
+            pending = [s for s in symbols if out[s] is None]
+            if not pending:
+                break
+            if not running:
+                launch(False)  # المزوّد التالي لما بقي ناقصًا
+
+        for fut, (m, _) in running.items():
+            # متروك: الخيط ينتهي وحده ويُهمل رده
+            if pending:
+                m.count("timeouts")
+                self._failed(m, "timeout")
+            else:  # خسر السباق: نتيجته تخبر القاطع بحاله مع ذلك
+                fut.add_done_callback(lambda f, m=m: m.breaker.failure() if f.exception() else m.breaker.success())
+        unpriced = sum(v is None for v in out.values())
+        if unpriced:
+            with self._lock:
+                self._unpriced += unpriced
+        return out
+
+    def _failed(self, m: _Member, error: str) -> None:
+        trips = m.breaker.trips
+        m.breaker.failure()
+        logger.info("quote provider failed", extra={"provider": m.name, "error": error[:200]})
+        if m.breaker.trips != trips:
+            logger.warning("quote provider circuit opened",
+                           extra={"provider": m.name, "reset_s": m.breaker.reset_s})
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "timeout_s": self.timeout_s,
+            "unpriced": self._unpriced,
+            "providers": [m.stats() for m in self.members],
+        }
@@ -0,0 +1,206 @@
+"""
+جالب أسعار واحد لكل عملية يوزّع على عملاء SSE/WebSocket: لقطة أولى ثم ما تغيّر فقط.
+الحمل على المزوّد بعدد الرموز لا بعدد المشاهدين.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+import time
+from dataclasses import dataclass
+
+from . import events
+from .config import settings
+from .offload import run_blocking
+from .quotes import get_quotes_details
+from .store import get_open_positions, get_watchlist
+
+logger = logging.getLogger(__name__)
+
+KEEPALIVE_S = 15.0
+ERROR_LOG_INTERVAL_S = 60.0
+
+
+@dataclass(eq=False)
+class Subscriber:
+    id: int
+    symbols: frozenset[str]
+    queue: asyncio.Queue
+    needs_snapshot: bool = True
+    dropped: int = 0
+
+    async def next(self, timeout: float = KEEPALIVE_S) -> dict | None:
+        """
+        الرسالة التالية، أو None بعد timeout (وقت keep-alive).
+        """
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+@dataclass
+class _Stats:
+    rounds: int = 0
+    errors: int = 0
+    pushed: int = 0
+    overflows: int = 0
+    last_symbols: int = 0
+    last_error_log: float = 0.0
+    errors_logged: int = 0
+
+
+class QuoteStream:
+    """
+    مهمة الجلب وسجل المشتركين: تعمل على event loop أول مشترك وتنتهي بخروج آخرهم.
+    """
+
+    def __init__(self, interval_s: float, queue_max: int):
+        self.interval_s = max(0.2, float(interval_s))
+        self.queue_max = max(1, int(queue_max))
+        self._ids = itertools.count(1)
+        self._subs: dict[int, Subscriber] = {}
+        self._last: dict[str, dict] = {}
+        self._base: frozenset[str] = frozenset()
+        self._task: asyncio.Task | None = None
+        self._wake: asyncio.Event | None = None
+        self._events: events.ThreadSubscription | None = None
+        self._stats = _Stats()
+
+    def subscribe(self, symbols: list[str] | None = None) -> Subscriber:
+        sub = Subscriber(
+            id=next(self._ids),
+            symbols=frozenset(s.strip().upper() for s in symbols or () if s.strip()),
+            queue=asyncio.Queue(maxsize=self.queue_max),
+        )
+        self._subs[sub.id] = sub
+        if self._events is None:
+            self._events = events.subscribe(self._on_change, events.TradesLogged, events.WatchlistChanged,
+                                            name="quote-stream")
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._wake = asyncio.Event()
+            self._task = loop.create_task(self._run(), name="quote-stream")
+        else:
+            self._wake.set()  # عميل جديد: جلب الآن لا في الدورة التالية
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        if self._subs.pop(sub.id, None) is None:
+            return
+        # رموز لم يعد يطلبها أحد تخرج من _last حتى لا يكبر مع كل رمز طُلب يومًا
+        kept = self._base.union(*(s.symbols for s in self._subs.values())) if self._subs else frozenset()
+        for symbol in sub.symbols - kept:
+            self._last.pop(symbol, None)
+        if not self._subs:
+            self._last.clear()
+
+    def _on_change(self, event: events.Event) -> None:
+        # على خيط الناقل: رمز جديد في المراكز أو الواتش ليست يظهر الآن لا في الدورة التالية.
+        # الرموز نفسها تُقرأ كل دورة، فتغييرات العمّال الآخرين تظهر أيضًا
+        task, wake = self._task, self._wake
+        if task is not None and not task.done() and wake is not None:
+            try:
+                task.get_loop().call_soon_threadsafe(wake.set)
+            except RuntimeError:  # loop closed
+                pass
+
+    def _base_symbols(self) -> list[str]:
+        return list(dict.fromkeys([*get_watchlist(), *(p["symbol"] for p in get_open_positions())]))
+
+    async def _run(self) -> None:
+        while self._subs:
+            try:
+                await self._poll_once()
+            except Exception:
+                self._log_error()
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval_s)
+            except asyncio.TimeoutError:
+                pass
+        if self._task is asyncio.current_task():
+            self._task = None
+
+    async def _poll_once(self) -> None:
+        base = await run_blocking(self._base_symbols)
+        extra = set().union(*(s.symbols for s in self._subs.values()))
+        symbols = list(dict.fromkeys([*(s.upper() for s in base), *sorted(extra)]))
+        details = await run_blocking(get_quotes_details, symbols) if symbols else []
+
+        for symbol in self._last.keys() - set(symbols):
+            del self._last[symbol]  # خرج من الواتش ليست أو المراكز
+        changed: dict[str, dict] = {}
+        for d in details:
+            prev = self._last.get(d["symbol"])
+            if prev is None or prev["last"] != d["last"] or prev["change_pct"] != d["change_pct"]:
+                changed[d["symbol"]] = d
+            self._last[d["symbol"]] = d
+        self._stats.rounds += 1
+        self._stats.last_symbols = len(symbols)
+
+        base_set = self._base = frozenset(s.upper() for s in base)
+        for sub in list(self._subs.values()):
+            wanted = base_set | sub.symbols
+            if sub.needs_snapshot:
+                msg = {"type": "snapshot",
+                       "quotes": [self._last[s] for s in symbols if s in wanted and s in self._last]}
+            else:
+                quotes = [d for s, d in changed.items() if s in wanted]
+                if not quotes:
+                    continue
+                msg = {"type": "quotes", "quotes": quotes}
+            self._offer(sub, msg)
+
+    def _log_error(self) -> None:
+        # مزوّد معطّل يفشل كل دورة: traceback واحد في الدقيقة مع عدد الأخطاء منذ السابق
+        s = self._stats
+        s.errors += 1
+        now = time.monotonic()
+        if now - s.last_error_log >= ERROR_LOG_INTERVAL_S:
+            logger.exception("quote stream poll failed", extra={"errors_since_last_log": s.errors - s.errors_logged})
+            s.last_error_log, s.errors_logged = now, s.errors
+
+    def _offer(self, sub: Subscriber, msg: dict) -> None:
+        try:
+            sub.queue.put_nowait(msg)
+        except asyncio.QueueFull:
+            # عميل بطيء: يُرمى ما تراكم له ولقطة كاملة في الدورة التالية
+            while not sub.queue.empty():
+                sub.queue.get_nowait()
+            sub.dropped += 1
+            sub.needs_snapshot = True
+            self._stats.overflows += 1
+            return
+        sub.needs_snapshot = False
+        self._stats.pushed += len(msg["quotes"])
+
+    def stats(self) -> dict:
+        s = self._stats
+        return {
+            "subscribers": len(self._subs),
+            "running": self._task is not None and not self._task.done(),
+            "interval_s": self.interval_s,
+            "rounds": s.rounds,
+            "errors": s.errors,
+            "quotes_pushed": s.pushed,
+            "overflows": s.overflows,
+            "symbols": s.last_symbols,
+        }
+
+
+_stream = QuoteStream(settings.QUOTE_STREAM_INTERVAL_S, settings.QUOTE_STREAM_QUEUE_MAX)
+
+
+def subscribe(symbols: list[str] | None = None) -> Subscriber:
+    return _stream.subscribe(symbols)
+
+
+def unsubscribe(sub: Subscriber) -> None:
+    _stream.unsubscribe(sub)
+
+
+def stats() -> dict:
+    return _stream.stats()
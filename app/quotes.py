@@ -1,66 +1,639 @@
-import yfinance as yf
+import logging
+import random
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable
 
-def _safe_info(t: yf.Ticker) -> dict:
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class Quote:
+    symbol: str
+    price: float
+    age_s: float          # عمر السعر بالثواني منذ جلبه من المصدر
+    stale: bool = False   # True = انتهت صلاحيته وفشل التحديث فأُعيدت آخر قيمة معروفة
+
+
+class QuoteCache:
+    """
+    كاش مشترك للأسعار مع TTL وإخلاء LRU محدود الحجم.
+    الطلبات المتزامنة لنفس المفتاح تنتظر نداءً واحدًا للمصدر بدل تكراره.
+    """
+
+    def __init__(self, ttl_s: float, max_entries: int, max_stale_s: float):
+        self.ttl_s = float(ttl_s)
+        self.max_entries = max(1, int(max_entries))
+        self.max_stale_s = float(max_stale_s)
+        self._lock = threading.Lock()
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._inflight: dict[str, Future] = {}
+        # رقم تسلسلي لكل مفتاح يزيد كلما تغيّرت قيمته (جلب بنفس السعر لا يغيّره)
+        self._seq = 0
+        self._versions: dict[str, int] = {}
+        self._stats = dict.fromkeys(
+            ("hits", "misses", "stale", "coalesced", "errors", "stale_served", "evictions"), 0
+        )
+
+    def _store(self, key: str, value: Any, fetched_at: float) -> None:
+        prev = self._data.get(key)
+        self._data[key] = (fetched_at, value)
+        self._data.move_to_end(key)
+        if prev is None or prev[1] != value:
+            self._seq += 1
+            self._versions[key] = self._seq
+        while len(self._data) > self.max_entries:
+            evicted, _ = self._data.popitem(last=False)
+            self._versions.pop(evicted, None)
+            self._stats["evictions"] += 1
+
+    def version(self, keys: list[str]) -> int:
+        """
+        أكبر رقم تسلسلي بين المفاتيح: يتغيّر كلما تغيّرت قيمة أي منها.
+        """
+        with self._lock:
+            return max((self._versions.get(k, 0) for k in keys), default=0)
+
+    def ages(self, keys: list[str]) -> dict[str, float | None]:
+        """
+        عمر كل قيمة محفوظة بالثواني (None إن لم تكن محفوظة)، دون جلب أو تعديل ترتيب LRU.
+        """
+        now = time.monotonic()
+        with self._lock:
+            return {k: now - e[0] if (e := self._data.get(k)) is not None else None for k in keys}
+
+    def put(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._store(key, value, time.monotonic())
+
+    def get(self, key: str, loader: Callable[[], Any]) -> tuple[Any, float, bool]:
+        """
+        يرجّع (value, age_s, stale). value=None إذا فشل المصدر ولا توجد قيمة صالحة.
+        loader يرجّع None عند الفشل.
+        """
+        return self.get_many([key], lambda keys: {key: loader()})[key]
+
+    def get_many(
+        self, keys: list[str], loader: Callable[[list[str]], dict[str, Any]]
+    ) -> dict[str, tuple[Any, float, bool]]:
+        """
+        مثل get لعدة مفاتيح: كل المفاتيح الناقصة تُجلب بنداء واحد لـ loader،
+        والمفاتيح التي يجلبها طلب آخر حاليًا يُنتظر نداؤه بدل تكراره.
+        """
+        now = time.monotonic()
+        out: dict[str, tuple[Any, float, bool]] = {}
+        owned: dict[str, Future] = {}
+        waiting: dict[str, Future] = {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                entry = self._data.get(key)
+                if entry is not None and now - entry[0] <= self.ttl_s:
+                    self._data.move_to_end(key)
+                    self._stats["hits"] += 1
+                    out[key] = (entry[1], now - entry[0], False)
+                elif key in self._inflight:
+                    self._stats["coalesced"] += 1
+                    waiting[key] = self._inflight[key]
+                else:
+                    self._stats["stale" if entry is not None else "misses"] += 1
+                    owned[key] = self._inflight[key] = Future()
+
+        if owned:
+            values: dict[str, Any] = {}
+            try:
+                values = loader(list(owned)) or {}
+            except Exception:
+                pass
+            finally:
+                # حتى مع BaseException (إلغاء/مقاطعة): المنتظرون لا يبقون معلّقين للأبد
+                fetched_at = time.monotonic()
+                with self._lock:
+                    for key in owned:
+                        self._inflight.pop(key, None)
+                        if values.get(key) is not None:
+                            self._store(key, values[key], fetched_at)
+                        else:
+                            self._stats["errors"] += 1
+                for key, fut in owned.items():
+                    fut.set_result((fetched_at, values.get(key)))
+
+        for key, fut in {**owned, **waiting}.items():
+            fetched_at, value = fut.result()
+            if value is not None:
+                out[key] = (value, time.monotonic() - fetched_at, False)
+                continue
+            # المصدر فشل: نعيد آخر قيمة معروفة إن لم تكن قديمة جدًا
+            with self._lock:
+                entry = self._data.get(key)
+                age = time.monotonic() - entry[0] if entry is not None else None
+                if age is not None and age <= self.max_stale_s:
+                    self._stats["stale_served"] += 1
+                    out[key] = (entry[1], age, True)
+                else:
+                    out[key] = (None, 0.0, False)
+        return out
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            out: dict[str, Any] = dict(self._stats)
+            out.update(size=len(self._data), inflight=len(self._inflight),
+                       ttl_s=self.ttl_s, max_entries=self.max_entries)
+        lookups = out["hits"] + out["misses"] + out["stale"] + out["coalesced"]
+        out["hit_ratio"] = round((out["hits"] + out["coalesced"]) / lookups, 4) if lookups else 0.0
+        return out
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._versions.clear()
+
+
+_cache = QuoteCache(settings.QUOTE_CACHE_TTL_S, settings.QUOTE_CACHE_MAX_SYMBOLS, settings.QUOTE_MAX_STALE_S)
+
+
+def cache_stats() -> dict[str, Any]:
+    return _cache.stats()
+
+
+def _norm(symbol: str) -> str:
+    return (symbol or "").strip().upper()
+
+
+_pool: ThreadPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def _fetch_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(
+                    max_workers=max(1, settings.QUOTE_FETCH_WORKERS), thread_name_prefix="quotes"
+                )
+    return _pool
+
+
+class QuoteUnavailable(LookupError):
+    """
+    لا يوجد سعر حقيقي للرمز (كل المصادر فشلت ولا قيمة محفوظة صالحة).
+    """
+
+
+class QuoteProvider(ABC):
+    """
+    مصدر أسعار. يكفي تنفيذ fetch_last/fetch_detail لرمز واحد؛ النسخ الجماعية
+    الافتراضية توزّع الرموز على مجمّع خيوط محدود. المصادر التي تملك endpoint
+    جماعيًا تعيد تعريف fetch_many.
+    None = الرمز غير معروف لدى المصدر؛ أعطال المصدر (شبكة، حد معدل) ترفع استثناء
+    حتى تحسبها سلسلة المصادر (app.quote_chain) وتنتقل للمصدر التالي.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def fetch_last(self, symbol: str) -> float | None: ...
+
+    @abstractmethod
+    def fetch_detail(self, symbol: str) -> dict | None: ...
+
+    def fetch_many(self, symbols: list[str]) -> dict[str, float | None]:
+        return self._map(self.fetch_last, symbols)
+
+    def fetch_many_details(self, symbols: list[str]) -> dict[str, dict | None]:
+        return self._map(self.fetch_detail, symbols)
+
+    def _map(self, fn: Callable[[str], Any], symbols: list[str]) -> dict[str, Any]:
+        if len(symbols) <= 1:
+            return {s: fn(s) for s in symbols}
+        futures = [_fetch_pool().submit(fn, s) for s in symbols]
+        out: dict[str, Any] = {}
+        error: Exception | None = None
+        for s, fut in zip(symbols, futures):
+            try:
+                out[s] = fut.result()
+            except Exception as exc:
+                out[s], error = None, exc
+        # فشل رمز واحد لا يُسقط الدفعة، لكن فشل الكل عطل في المصدر
+        if error is not None and all(v is None for v in out.values()):
+            raise error
+        return out
+
+
+def _yf():
+    # yfinance يسحب pandas معه (~0.7 ث): يُستورد عند أول جلب فعلي من Yahoo لا عند الإقلاع
+    import yfinance
+    return yfinance
+
+
+def _safe_info(t) -> dict:
     try:
         return t.info or {}
     except Exception:
         return {}
 
-def get_last_price(symbol: str) -> float:
-    try:
-        t = yf.Ticker(symbol)
+
+class YahooProvider(QuoteProvider):
+    """
+    yfinance (بدون مفتاح، لكن بحدود معدل). fetch_many يستخدم yf.download لكل
+    الرموز في طلب واحد، وما ينقص منه يُجلب رمزًا رمزًا.
+    """
+
+    name = "yahoo_unofficial"
+
+    def fetch_last(self, symbol: str) -> float | None:
+        t = _yf().Ticker(symbol)
         p = t.fast_info.get("last_price")
         if p is None:
-            hist = t.history(period="1d")
+            hist = t.history(period="1d", timeout=settings.QUOTE_TIMEOUT_S)
             if not hist.empty:
                 p = float(hist["Close"].iloc[-1])
-        return float(p) if p is not None else 0.0
-    except Exception:
-        return 0.0
+        return float(p) if p else None
+
+    def fetch_many(self, symbols: list[str]) -> dict[str, float | None]:
+        out: dict[str, float | None] = dict.fromkeys(symbols)
+        if len(symbols) > 1:
+            try:
+                data = _yf().download(symbols, period="1d", interval="1m", group_by="column",
+                                   progress=False, threads=True, auto_adjust=False,
+                                   timeout=settings.QUOTE_TIMEOUT_S)
+                closes = data["Close"].ffill()
+                if not closes.empty:
+                    last_row = closes.iloc[-1]
+                    for s in symbols:
+                        p = last_row.get(s)
+                        if p is not None and p == p and p > 0:
+                            out[s] = float(p)
+            except Exception:
+                pass
+        missing = [s for s, p in out.items() if p is None]
+        if missing:
+            out.update(self._map(self.fetch_last, missing))
+        return out
+
+    def fetch_detail(self, symbol: str) -> dict | None:
+        t = _yf().Ticker(symbol)
+        last = 0.0; change_pct = 0.0; name = symbol
+
+        try:
+            last = t.fast_info.get("last_price") or 0.0
+            prev = t.fast_info.get("previous_close")
+            if (prev is None or prev == 0) and last:
+                hist = t.history(period="2d", timeout=settings.QUOTE_TIMEOUT_S)
+                if len(hist) >= 2:
+                    prev = float(hist["Close"].iloc[-2])
+            if last and prev:
+                change_pct = (float(last) / float(prev) - 1.0) * 100.0
+        except Exception:
+            pass
+        if not last:
+            return None
+
+        info = _safe_info(t)
+        if info:
+            name = info.get("shortName") or info.get("longName") or symbol
+
+        return {
+            "symbol": symbol,
+            "name": name,
+            "last": round(float(last or 0.0), 4),
+            "change_pct": round(float(change_pct or 0.0), 2)
+        }
+
+
+_http_session = None  # requests.Session مشترك لمصادر HTTP، يُنشأ عند أول طلب
+
+
+def _http_get(url: str, params: dict) -> dict:
+    global _http_session
+    if _http_session is None:
+        import requests
+        _http_session = requests.Session()
+    r = _http_session.get(url, params=params, timeout=settings.QUOTE_TIMEOUT_S)
+    r.raise_for_status()
+    return r.json()
+
+
+def _num(value: Any) -> float | None:
+    try:
+        v = float(str(value).rstrip("%"))
+    except (TypeError, ValueError):
+        return None
+    return v if v == v else None
+
+
+class _HttpProvider(QuoteProvider):
+    """
+    مصدر REST بمفتاح API. بدون مفتاح يرفع خطأً فيتخطّاه قاطع الدائرة.
+    """
+
+    key_setting = ""
+
+    def _key(self) -> str:
+        key = settings.secret_value(getattr(settings, self.key_setting))
+        if not key:
+            raise RuntimeError(f"{self.name}: {self.key_setting} is not set")
+        return key
+
+    def fetch_last(self, symbol: str) -> float | None:
+        d = self.fetch_detail(symbol)
+        return d["last"] if d else None
+
+
+class FinnhubProvider(_HttpProvider):
+    name = "finnhub"
+    key_setting = "FINNHUB_API_KEY"
+
+    def fetch_detail(self, symbol: str) -> dict | None:
+        j = _http_get("https://finnhub.io/api/v1/quote", {"symbol": symbol, "token": self._key()})
+        last = _num(j.get("c"))
+        if not last:  # رمز غير معروف: Finnhub يرجّع أصفارًا
+            return None
+        return {"symbol": symbol, "name": symbol, "last": round(last, 4),
+                "change_pct": round(_num(j.get("dp")) or 0.0, 2)}
+
+
+class AlphaVantageProvider(_HttpProvider):
+    name = "alpha_vantage"
+    key_setting = "ALPHA_VANTAGE_API_KEY"
+
+    def fetch_detail(self, symbol: str) -> dict | None:
+        j = _http_get("https://www.alphavantage.co/query",
+                      {"function": "GLOBAL_QUOTE", "symbol": symbol, "apikey": self._key()})
+        if "Note" in j or "Information" in j:  # حد المعدل يصل كـ 200 مع رسالة
+            raise RuntimeError(f"alpha_vantage: {j.get('Note') or j.get('Information')}")
+        q = j.get("Global Quote") or {}
+        last = _num(q.get("05. price"))
+        if not last:
+            return None
+        return {"symbol": symbol, "name": symbol, "last": round(last, 4),
+                "change_pct": round(_num(q.get("10. change percent")) or 0.0, 2)}
+
+
+class TwelveDataProvider(_HttpProvider):
+    name = "twelve_data"
+    key_setting = "TWELVE_DATA_API_KEY"
+
+    def _get(self, path: str, symbol: str) -> dict | None:
+        j = _http_get(f"https://api.twelvedata.com/{path}", {"symbol": symbol, "apikey": self._key()})
+        if j.get("status") == "error":
+            if j.get("code") in (400, 404):  # رمز غير معروف
+                return None
+            raise RuntimeError(f"twelve_data: {j.get('message')}")
+        return j
+
+    def fetch_last(self, symbol: str) -> float | None:
+        j = self._get("price", symbol)
+        return _num(j.get("price")) if j else None
+
+    def fetch_detail(self, symbol: str) -> dict | None:
+        j = self._get("quote", symbol)
+        last = _num(j.get("close")) if j else None
+        if not last:
+            return None
+        return {"symbol": symbol, "name": j.get("name") or symbol, "last": round(last, 4),
+                "change_pct": round(_num(j.get("percent_change")) or 0.0, 2)}
+
+
+class FakeQuoteProvider(QuoteProvider):
+    """
+    مصدر محلي حتمي للاختبار وقياس الأداء بدون شبكة.
+    السعر الأساسي مشتق من crc32 للرمز، و advance() يحرّكه بمسار عشوائي ثابت البذرة.
+    latency_s يحاكي زمن الرحلة لكل نداء، و bulk=True يحاكي endpoint جماعيًا
+    (نداء واحد بزمن رحلة واحد لكل الدفعة).
+    """
+
+    name = "fake"
+
+    def __init__(self, latency_s: float = 0.0, bulk: bool = False, seed: int = 0,
+                 prices: dict[str, float] | None = None):
+        self.latency_s = float(latency_s)
+        self.bulk = bulk
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._prices: dict[str, float] = {_norm(k): float(v) for k, v in (prices or {}).items()}
+        self._prev: dict[str, float] = {}
+
+    @staticmethod
+    def base_price(symbol: str) -> float:
+        return round(5.0 + (zlib.crc32(symbol.encode()) % 49_500) / 100.0, 2)
+
+    def _price(self, symbol: str) -> float:
+        with self._lock:
+            if symbol not in self._prices:
+                self._prices[symbol] = self.base_price(symbol)
+            return self._prices[symbol]
+
+    def set_price(self, symbol: str, price: float) -> None:
+        with self._lock:
+            self._prices[_norm(symbol)] = float(price)
+
+    def advance(self, steps: int = 1, vol: float = 0.002) -> None:
+        with self._lock:
+            for sym in sorted(self._prices):
+                self._prev[sym] = p = self._prices[sym]
+                for _ in range(steps):
+                    p *= 1.0 + self._rng.gauss(0.0, vol)
+                self._prices[sym] = round(p, 4)
+
+    def _roundtrip(self) -> None:
+        with self._lock:
+            self.calls += 1
+        if self.latency_s:
+            time.sleep(self.latency_s)
+
+    def fetch_last(self, symbol: str) -> float | None:
+        self._roundtrip()
+        return self._price(symbol)
+
+    def fetch_detail(self, symbol: str) -> dict | None:
+        self._roundtrip()
+        last = self._price(symbol)
+        prev = self._prev.get(symbol) or last
+        return {
+            "symbol": symbol,
+            "name": f"{symbol} (fake)",
+            "last": round(last, 4),
+            "change_pct": round((last / prev - 1.0) * 100.0, 2),
+        }
+
+    def fetch_many(self, symbols: list[str]) -> dict[str, float | None]:
+        if not self.bulk:
+            return super().fetch_many(symbols)
+        self._roundtrip()
+        return {s: self._price(s) for s in symbols}
+
+
+PROVIDERS: dict[str, Callable[[], QuoteProvider]] = {
+    "yahoo_unofficial": YahooProvider,
+    "yahoo": YahooProvider,
+    "finnhub": FinnhubProvider,
+    "alpha_vantage": AlphaVantageProvider,
+    "twelve_data": TwelveDataProvider,
+    "fake": FakeQuoteProvider,
+}
+
+_provider: QuoteProvider | None = None
+
+
+def provider_names() -> list[str]:
+    """
+    سلسلة المصادر المضبوطة بالترتيب: QUOTE_PROVIDERS إن وُجدت، وإلا QUOTE_PROVIDER وحده.
+    """
+    names = [n.strip().lower() for n in (settings.QUOTE_PROVIDERS or "").split(",") if n.strip()]
+    names = list(dict.fromkeys(names)) or [(settings.QUOTE_PROVIDER or "yahoo_unofficial").strip().lower()]
+    unknown = [n for n in names if n not in PROVIDERS]
+    if unknown:
+        raise ValueError(f"Unknown quote provider(s) {unknown} (expected one of {sorted(PROVIDERS)})")
+    return names
+
+
+def get_provider() -> QuoteProvider:
+    global _provider
+    if _provider is None:
+        # مهلة وقاطع دائرة حتى لمصدر واحد؛ ومع أكثر من مصدر: احتياط وطلبات تحوّط
+        from .quote_chain import ProviderChain
+        _provider = ProviderChain([PROVIDERS[n]() for n in provider_names()])
+    return _provider
+
+
+def provider_stats() -> dict[str, Any]:
+    provider = get_provider()
+    return provider.stats() if hasattr(provider, "stats") else {"providers": [{"name": provider.name}]}
+
+
+def set_provider(provider: QuoteProvider) -> None:
+    """
+    يستبدل مصدر الأسعار (اختبارات/قياس أداء) ويمسح الكاش.
+    """
+    global _provider
+    _provider = provider
+    _cache.clear()
+
+
+# مستمعون لكل سعر جديد من المصدر (مثل محرك المطابقة الورقي): fn(symbol, price)
+_price_listeners: list[Callable[[str, float], None]] = []
+
+
+def add_price_listener(fn: Callable[[str, float], None]) -> None:
+    _price_listeners.append(fn)
+
+
+def _publish(prices: dict[str, float | None]) -> None:
+    for s, p in prices.items():
+        if p:
+            for fn in _price_listeners:
+                try:
+                    fn(s, float(p))
+                except Exception:
+                    logger.exception("price listener failed for %s", s)
+
+
+def _by_key(prefix: str, fetch: Callable[[list[str]], dict[str, Any]]) -> Callable[[list[str]], dict[str, Any]]:
+    def load(keys: list[str]) -> dict[str, Any]:
+        res = fetch([k[len(prefix):] for k in keys])
+        return {prefix + s: v for s, v in res.items()}
+    return load
+
+
+def get_quote(symbol: str) -> Quote:
+    """
+    سعر آخر صفقة مع عمره. price=0.0 إذا تعذّر الجلب ولا توجد قيمة محفوظة (للعرض فقط).
+    """
+    return get_quotes([symbol]).get(_norm(symbol)) or Quote(_norm(symbol), 0.0, 0.0)
+
+def get_last_price(symbol: str) -> float:
+    """
+    سعر حقيقي للتنفيذ: يرفع QuoteUnavailable بدل إرجاع 0.0 أو سعر مختلق.
+    """
+    q = get_quote(symbol)
+    if q.price <= 0:
+        raise QuoteUnavailable(f"No price available for {_norm(symbol)}")
+    return q.price
 
 def get_quote_detail(symbol: str) -> dict:
     """
-    يرجّع: {"symbol","name","last","change_pct"}
+    يرجّع: {"symbol","name","last","change_pct","age_s"}
     change_pct = نسبة التغير اليومية % (أخضر/أحمر)
     """
-    symbol = symbol.strip().upper()
-    t = yf.Ticker(symbol)
-    last = 0.0; change_pct = 0.0; name = symbol
+    details = get_quotes_details([symbol])
+    return details[0] if details else {"symbol": "", "name": "", "last": 0.0, "change_pct": 0.0,
+                                       "age_s": 0.0, "stale": False}
 
-    try:
-        last = t.fast_info.get("last_price") or 0.0
-        prev = t.fast_info.get("previous_close")
-        if (prev is None or prev == 0) and last:
-            hist = t.history(period="2d")
-            if len(hist) >= 2:
-                prev = float(hist["Close"].iloc[-2])
-        if last and prev:
-            change_pct = (float(last) / float(prev) - 1.0) * 100.0
-    except Exception:
-        pass
+def get_quotes_details(symbols: list[str]) -> list[dict]:
+    syms = list(dict.fromkeys(_norm(s) for s in symbols if s and s.strip()))
+    if not syms:
+        return []
+    provider = get_provider()
+    fresh: dict[str, float | None] = {}
 
-    info = _safe_info(t)
-    if info:
-        name = info.get("shortName") or info.get("longName") or symbol
+    def fetch(batch: list[str]) -> dict[str, dict | None]:
+        details = provider.fetch_many_details(batch)
+        for s, d in details.items():
+            if d and d.get("last"):
+                # السعر نفسه صالح لـ get_last_price: لا داعي لجلبه مرة ثانية
+                _cache.put(f"last:{s}", float(d["last"]))
+                fresh[s] = d["last"]
+        return details
 
-    return {
-        "symbol": symbol,
-        "name": name,
-        "last": round(float(last or 0.0), 4),
-        "change_pct": round(float(change_pct or 0.0), 2)
-    }
+    res = _cache.get_many([f"detail:{s}" for s in syms], _by_key("detail:", fetch))
+    # بعد أن يُحلّ كل المنتظرين: المستمعون (المطابقة ← تسجيل الصفقات) لا يمسكون الـ loader
+    _publish(fresh)
+    out = []
+    for s in syms:
+        detail, age, stale = res[f"detail:{s}"]
+        if detail is None:
+            detail = {"symbol": s, "name": s, "last": 0.0, "change_pct": 0.0}
+        out.append({**detail, "age_s": round(age, 3), "stale": stale})
+    return out
 
-def get_quotes_details(symbols: list[str]) -> list[dict]:
-    return [get_quote_detail(s) for s in symbols if s.strip()]
+def get_quotes(symbols: list[str]) -> dict[str, Quote]:
+    """
+    يرجّع قاموس {symbol: Quote} (السعر مع عمره). الرموز غير الموجودة في الكاش
+    تُجلب معًا بنداء fetch_many واحد.
+    """
+    syms = list(dict.fromkeys(_norm(s) for s in symbols or [] if s and s.strip()))
+    if not syms:
+        return {}
+    fresh: dict[str, float | None] = {}
+
+    def fetch(batch: list[str]) -> dict[str, float | None]:
+        prices = get_provider().fetch_many(batch)
+        fresh.update(prices)
+        return prices
+
+    res = _cache.get_many([f"last:{s}" for s in syms], _by_key("last:", fetch))
+    _publish(fresh)
+    out: dict[str, Quote] = {}
+    for s in syms:
+        price, age, stale = res[f"last:{s}"]
+        out[s] = Quote(s, float(price or 0.0), round(age, 3), stale)
+    return out
+
+def quotes_version(symbols: list[str]) -> int:
+    """
+    رقم يتغيّر كلما تغيّر سعر أي من الرموز في الكاش (لا يجلب شيئًا).
+    """
+    return _cache.version([f"last:{_norm(s)}" for s in symbols or [] if s and s.strip()])
+
+def quote_ages(symbols: list[str]) -> dict[str, float | None]:
+    """
+    يرجّع {symbol: age_s} لأسعار الكاش (None إن لم يكن محفوظًا). لا يجلب شيئًا.
+    """
+    syms = list(dict.fromkeys(_norm(s) for s in symbols or [] if s and s.strip()))
+    ages = _cache.ages([f"last:{s}" for s in syms])
+    return {s: ages[f"last:{s}"] for s in syms}
 
 def get_prices(symbols: list[str]) -> dict[str, float]:
     """
-    يرجّع قاموس {symbol: last_price} باستخدام get_last_price لكل رمز.
+    يرجّع قاموس {symbol: last_price}.
     """
-    out: dict[str, float] = {}
-    for s in symbols or []:
-        ss = (s or "").strip().upper()
-        if not ss:
-            continue
-        out[ss] = float(get_last_price(ss))
-    return out
+    return {s: q.price for s, q in get_quotes(symbols).items()}
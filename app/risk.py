@@ -1,5 +1,14 @@
+import math
+
 from .config import settings
 
 def within_exposure(current_exposure_value: float, new_value: float):
     max_exposure = settings.BASE_CAPITAL * settings.MAX_PORTFOLIO_EXPOSURE_PCT
     return (current_exposure_value + new_value) <= max_exposure + 1e-6
+
+def trade_qty(price: float, max_trade_amount: float | None = None) -> int:
+    """
+    عدد الأسهم لصفقة واحدة من سقف الصفقة (سهم واحد على الأقل).
+    """
+    cap = float(max_trade_amount or settings.MAX_TRADE_AMOUNT or 500.0)
+    return max(1, math.floor(cap / price))
@@ -1,21 +1,31 @@
-from fastapi import APIRouter, Header, HTTPException, Form, Request
-from fastapi.responses import RedirectResponse
+from fastapi import APIRouter, Header, HTTPException, Form, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse, RedirectResponse, StreamingResponse
 from pydantic import BaseModel, field_validator
 from .config import settings
-from .risk import within_exposure
+from .risk import trade_qty
 from .store import (
-    get_exposure_value, log_trade, is_kill_switch_on, toggle_kill_switch,
-    get_open_positions, sum_buys_sells, get_watchlist, set_watchlist,
-    get_recent_trades
+    get_exposure_value, get_reserved_exposure, log_trade, log_trades_bulk, reserve_exposure, settle_reservations,
+    consume_reservations,
+    is_kill_switch_on, toggle_kill_switch,
+    get_open_positions, get_cash, get_watchlist, set_watchlist,
+    get_trades, iter_trades, TRADE_COLUMNS
 )
-from .broker import PaperBroker
-from . import notify
-from .quotes import get_prices, get_last_price, get_quotes_details
-from .ai import decide_from_indicators
-import hmac, hashlib, math, sqlite3
+from .broker import PaperBroker, OPEN_STATUSES
+from . import dedup, events, notify, indicator_state, portfolio, quote_stream, tickstore, warmup
+from .quotes import get_quotes, get_quotes_details, cache_stats, add_price_listener, provider_stats, QuoteUnavailable
+from .ai import decide_from_indicators, decide_batch
+from .offload import run_blocking
+from .core import metrics
+from .core.logging import logging_stats
+import asyncio, csv, hmac, hashlib, io, json, logging, threading, time, uuid
+from urllib.parse import urlparse, parse_qs
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+decision_log = logging.getLogger("app.decisions")  # كثيف (HOLD): يُقيَّد بـ LOG_SAMPLING
 broker = PaperBroker()
+add_price_listener(broker.on_quote)  # كل سعر جديد من المصدر يحرّك دفتر الأوامر الورقي
+add_price_listener(tickstore.record)  # ويُحفظ في سجل التيكات المحلي
 
 # ===== نماذج التنفيذ اليدوي/المباشر =====
 class Alert(BaseModel):
@@ -24,6 +34,9 @@ class Alert(BaseModel):
     qty_shares: int
     note: str | None = None
     price: float | None = None
+    order_type: str = "market"   # market / limit / stop / stop_limit
+    limit_price: float | None = None
+    stop_price: float | None = None
 
     @field_validator("side")
     def _side_ok(cls, v):
@@ -41,29 +54,153 @@ def _execute(alert: Alert):
     if is_kill_switch_on() and alert.side == "buy":
         raise HTTPException(status_code=403, detail="Kill Switch ON (شراء معطّل مؤقتًا)")
 
-    price = alert.price or broker.get_last_price(alert.symbol)
+    price = alert.price
+    if not price:
+        try:
+            with metrics.stage("quote"):
+                price = broker.get_last_price(alert.symbol)
+        except QuoteUnavailable as exc:
+            raise HTTPException(status_code=503, detail=str(exc))
     qty = int(alert.qty_shares)
     if qty <= 0 or price <= 0:
         raise HTTPException(status_code=400, detail="Invalid qty/price")
 
-    # حد التعرّض العام غالبًا كبير الآن للتطوير، لكن نترك الفحص قائمًا
-    exposure_now = get_exposure_value()
-    if alert.side == "buy" and not within_exposure(exposure_now, qty * price):
-        raise HTTPException(status_code=400, detail="Exposure limit reached")
-
-    order = broker.submit_order(alert.symbol, alert.side, qty)
-    log_trade(alert.symbol, alert.side, qty, price, alert.note or "")
-
-    notify.send(
-        f"🤖 تنفيذ آلي\n"
-        f"رمز: {alert.symbol}\n"
-        f"اتجاه: {alert.side.upper()}\n"
-        f"كمية: {qty} سهم\n"
-        f"سعر: {price:.2f}\n"
-        f"ملاحظة: {alert.note or '-'}"
-    )
+    # فحص الحد + الحجز في معاملة واحدة (BEGIN IMMEDIATE)، فلا يتجاوز عمّال متزامنون الحد معًا
+    ref, unit = None, alert.limit_price or max(price, alert.stop_price or 0.0)
+    if alert.side == "buy":
+        ref = uuid.uuid4().hex
+        with metrics.stage("exposure"):
+            ok = reserve_exposure(ref, qty * unit, settings.EXPOSURE_RESERVATION_TTL_S)
+        if not ok:
+            raise HTTPException(status_code=400, detail="Exposure limit reached")
+
+    order = None
+    try:
+        with metrics.stage("order"):
+            # الحجز يُربط بالأمر داخل الوسيط قبل أن يستطيع سعر لاحق تنفيذ باقيه
+            order = broker.submit_order(alert.symbol, alert.side, qty, alert.order_type,
+                                        limit_price=alert.limit_price, stop_price=alert.stop_price, price=price,
+                                        hold=(ref, unit) if ref else None)
+        # نسجّل ما نُفّذ فعلًا الآن ونخصمه من الحجز في نفس المعاملة؛
+        # الباقي المعلّق يبقى محجوزًا ويُسجَّل عند تنفيذه (_log_resting_fills)
+        filled = order["filled_qty"]
+        consumed = {ref: filled * unit} if ref else None
+        if filled:
+            with metrics.stage("log_trade"):
+                log_trade(alert.symbol, alert.side, filled, order["avg_price"], alert.note or "", consumed)
+        elif consumed:
+            consume_reservations(consumed)
+        if ref and filled < qty and order["status"] not in OPEN_STATUSES:
+            settle_reservations({ref: 0.0})  # IOC: الباقي أُلغي
+    except BaseException as exc:
+        if order is not None and order["status"] in OPEN_STATUSES:
+            # التنفيذ لم يُسجَّل: لا نترك الأمر حيًّا يُكمل على حجز محرَّر
+            broker.cancel_order(order["id"])
+        if ref:
+            settle_reservations({ref: 0.0})
+        if isinstance(exc, ValueError):
+            raise HTTPException(status_code=400, detail=str(exc))
+        raise
+
+    # التنفيذ نفسه يصل للإشعارات عبر events.TradesLogged (من log_trade)
+    if not filled:
+        notify.enqueue(f"📝 أمر معلّق: {alert.side.upper()} {qty} {alert.symbol} ({alert.order_type})")
     return {"status": "ok", "qty": qty, "price": price, "order": order}
 
+# تنفيذات معلّقة نفّذها المحرك ولم تُكتب بعد (SQLITE_BUSY، خطأ قرص): تبقى بالترتيب وتُعاد
+# كتابتها حتى تنجح. حجزها في exposure_reservations لا يُخصم إلا معها، فيبقى التعرّض محسوبًا
+_unlogged: list[tuple[list[tuple], dict[str, float]]] = []
+_unlogged_lock = threading.Lock()
+_unlogged_retry: threading.Timer | None = None
+_unlogged_failures = 0
+UNLOGGED_RETRY_MAX_S = 30.0
+
+def _log_resting_fills(fills):
+    """
+    تنفيذات الأوامر المعلّقة (حدّية/إيقاف/باقي أمر جزئي) عند وصول سعر جديد.
+    """
+    consumed: dict[str, float] = {}
+    for f in fills:
+        hold = broker.hold(broker.fill_id(f))
+        if hold:
+            consumed[hold[0]] = consumed.get(hold[0], 0.0) + f.qty * hold[1]
+    trades = [(f.symbol, f.side, f.qty, f.price, f"paper-fill {broker.fill_id(f)}") for f in fills]
+    with _unlogged_lock:
+        _unlogged.append((trades, consumed))
+    _flush_unlogged()
+
+def _flush_unlogged() -> bool:
+    """
+    يكتب كل التنفيذات المنتظرة في معاملة واحدة؛ عند الفشل يبقيها ويجدول محاولة لاحقة.
+    """
+    global _unlogged_retry, _unlogged_failures
+    with _unlogged_lock:
+        if not _unlogged:
+            return True
+        trades = [t for batch, _ in _unlogged for t in batch]
+        consumed: dict[str, float] = {}
+        for _, c in _unlogged:
+            for ref, v in c.items():
+                consumed[ref] = consumed.get(ref, 0.0) + v
+        try:
+            log_trades_bulk(trades, consumed)
+        except Exception:
+            _unlogged_failures += 1
+            logger.exception("failed to log resting fills, will retry",
+                             extra={"fills": len(trades), "attempt": _unlogged_failures})
+            if _unlogged_failures == 1:
+                notify.enqueue(f"⚠️ تعذّر تسجيل {len(trades)} تنفيذ(ات) معلّقة؛ إعادة المحاولة جارية")
+            if _unlogged_retry is None:
+                delay = min(UNLOGGED_RETRY_MAX_S, 0.5 * 2 ** (_unlogged_failures - 1))
+                _unlogged_retry = threading.Timer(delay, _retry_unlogged)
+                _unlogged_retry.daemon = True
+                _unlogged_retry.start()
+            return False
+        if _unlogged_failures:
+            logger.warning("resting fills logged after retry",
+                           extra={"fills": len(trades), "attempts": _unlogged_failures + 1})
+        _unlogged.clear()
+        _unlogged_failures = 0
+        if _unlogged_retry is not None:
+            _unlogged_retry.cancel()
+            _unlogged_retry = None
+        return True
+
+def _retry_unlogged():
+    global _unlogged_retry
+    with _unlogged_lock:
+        _unlogged_retry = None
+    _flush_unlogged()
+
+def unlogged_fills() -> int:
+    with _unlogged_lock:
+        return sum(len(batch) for batch, _ in _unlogged)
+
+broker.on_fill(_log_resting_fills)
+
+def _notify_event(ev: events.Event):
+    """
+    مشترك في ناقل الأحداث: رسائل تيليجرام للصفقات ومفتاح الإيقاف، خارج مسار التنفيذ.
+    """
+    if isinstance(ev, events.KillSwitchChanged):
+        notify.enqueue(f"🛑 Kill Switch: {'ON' if ev.on else 'OFF'}")
+    elif len(ev.trades) == 1:
+        t = ev.trades[0]
+        notify.enqueue(
+            f"🤖 تنفيذ آلي\n"
+            f"رمز: {t.symbol}\n"
+            f"اتجاه: {t.side.upper()}\n"
+            f"كمية: {t.qty} سهم\n"
+            f"سعر: {t.price:.2f}\n"
+            f"ملاحظة: {t.note or '-'}"
+        )
+    else:
+        notify.enqueue("\n".join([f"📒 {len(ev.trades)} صفقات", *(
+            f"{t.side.upper()} {t.qty} {t.symbol} @ {t.price:.2f} ({t.note or '-'})" for t in ev.trades
+        )]))
+
+events.subscribe(_notify_event, events.TradesLogged, events.KillSwitchChanged, name="notify")
+
 # ===== HMAC اختياري =====
 def _verify_hmac(sig: str | None, body: bytes) -> bool:
     secret = settings.hmac_secret.encode() if settings.hmac_secret else b""
@@ -71,8 +208,9 @@ def _verify_hmac(sig: str | None, body: bytes) -> bool:
         return True
     if not sig:
         return False
-    calc = hmac.new(secret, body, hashlib.sha256).hexdigest()
-    return hmac.compare_digest(calc, sig)
+    with metrics.stage("hmac"):
+        calc = hmac.new(secret, body, hashlib.sha256).hexdigest()
+        return hmac.compare_digest(calc, sig)
 
 # ===== Webhook قديم (لو كنتِ تستخدمينه) =====
 @router.post("/webhook")
@@ -82,7 +220,7 @@ async def webhook(request: Request, alert: Alert, x_hook_secret: str | None = He
     body = await request.body()
     if not _verify_hmac(x_signature, body):
         raise HTTPException(status_code=401, detail="Invalid HMAC")
-    return _execute(alert)
+    return await dedup.run(request.url.path, body, lambda: run_blocking(_execute, alert))
 
 # ===== Webhook TradingView الجديد =====
 class TVPayload(BaseModel):
@@ -112,34 +250,184 @@ async def webhook_tv(
     if not _verify_hmac(x_signature, body):
         raise HTTPException(status_code=401, detail="Invalid HMAC")
 
+    # إعادة إرسال TradingView لنفس الجسم ترجع النتيجة الأولى بدون تنفيذ ثانٍ
+    return await dedup.run(request.url.path, body, lambda: _handle_tv(payload))
+
+async def _handle_tv(payload: TVPayload, debug: dict | None = None) -> dict:
+    """
+    مسار مشترك لـ /webhook-tv و /webhook-tv2. كل ما يحجب (سعر، SQLite) يمر عبر run_blocking
+    حتى لا يتوقف الـ event loop.
+    """
+    extra = {"debug": debug} if debug is not None else {}
+    await _indicators_ready()
+    payload = _with_stream_indicators(payload)
+
+    def _fail(status: int, err: str):
+        raise HTTPException(status_code=status, detail={"err": err, "debug": debug} if debug is not None else err)
+
     # قرار أولي
-    d = decide_from_indicators(
-        rsi=payload.rsi,
-        macd=payload.macd,
-        macd_signal=payload.macd_signal,
-        ema_fast=payload.ema_fast,
-        ema_slow=payload.ema_slow,
-        trend_strength=payload.trend_strength
-    )
+    with metrics.stage("decision"):
+        d = decide_from_indicators(
+            rsi=payload.rsi,
+            macd=payload.macd,
+            macd_signal=payload.macd_signal,
+            ema_fast=payload.ema_fast,
+            ema_slow=payload.ema_slow,
+            trend_strength=payload.trend_strength
+        )
 
     # لو ما في إشارة قوية: لا تنفيذ
     if d.action == "hold":
-        notify.send(f"🟡 HOLD {payload.symbol} — {d.reason}")
-        return {"ok": True, "action": "hold", "reason": d.reason, "confidence": d.confidence}
+        decision_log.info("hold", extra={"symbol": payload.symbol, "reason": d.reason, "confidence": d.confidence})
+        notify.enqueue(f"🟡 HOLD {payload.symbol} — {d.reason}", digest="HOLD")
+        return {"ok": True, "action": "hold", "reason": d.reason, "confidence": round(d.confidence, 2), **extra}
 
     side = d.action  # "buy" / "sell"
-    last = payload.price or broker.get_last_price(payload.symbol)
+    try:
+        last = payload.price or await run_blocking(_timed_last_price, payload.symbol)
+    except QuoteUnavailable as exc:
+        _fail(503, str(exc))
     if not last or last <= 0:
-        raise HTTPException(status_code=400, detail="No valid price")
+        _fail(400, "No valid price")
 
+    alert = _tv_alert(payload, side, last, d.reason)
+    result = await run_blocking(_execute, alert)
+    result.update({"ai_confidence": round(d.confidence, 2), "ai_reason": d.reason, **extra})
+    return result
+
+def _timed_last_price(symbol: str) -> float:
+    with metrics.stage("quote"):
+        return broker.get_last_price(symbol)
+
+async def _indicators_ready():
+    # يُحمَّل عند الإقلاع؛ هذا احتياط (عامل منسوخ بعد fork) حتى لا يُقرأ SQLite على الـ event loop
+    if not indicator_state.loaded():
+        await run_blocking(indicator_state.load)
+
+def _with_stream_indicators(payload: TVPayload) -> TVPayload:
+    """
+    السعر المرسل يحدّث مؤشرات الخادم لهذا الرمز، ثم نكمل بها أي مؤشر ناقص في الإنذار.
+    بدون سعر نستخدم آخر قيم محفوظة دون تحديث.
+    """
+    if payload.price and payload.price > 0:
+        vals = indicator_state.update(payload.symbol, payload.price, payload.timeframe)
+    else:
+        vals = indicator_state.values(payload.symbol, payload.timeframe)
+    if not vals:
+        return payload
+    missing = {k: v for k, v in vals.items() if v is not None and getattr(payload, k) is None}
+    return payload.model_copy(update=missing) if missing else payload
+
+def _tv_alert(payload: TVPayload, side: str, last: float, reason: str) -> Alert:
     # احسبي الكمية من سقف الصفقة
-    cap = float(payload.max_trade_amount or settings.MAX_TRADE_AMOUNT or 500.0)
-    qty = max(1, math.floor(cap / last))
+    qty = trade_qty(last, payload.max_trade_amount)
+    return Alert(symbol=payload.symbol, side=side, qty_shares=qty, note=payload.note or reason, price=last)
 
-    alert = Alert(symbol=payload.symbol, side=side, qty_shares=qty, note=payload.note or d.reason, price=last)
-    result = _execute(alert)
-    result.update({"ai_confidence": round(d.confidence, 2), "ai_reason": d.reason})
-    return result
+class TVBatch(BaseModel):
+    alerts: list[TVPayload]
+
+@router.post("/webhook-tv/batch")
+async def webhook_tv_batch(
+    batch: TVBatch,
+    request: Request,
+    x_hook_secret: str | None = Header(default=None),
+    x_signature: str | None = Header(default=None)
+):
+    """
+    إغلاق شمعة كامل من الـ screener في طلب واحد: قرار متجه لكل التنبيهات،
+    جلب الأسعار الناقصة دفعة واحدة، ثم التنفيذ بالترتيب (فحص التعرّض تراكمي).
+    """
+    if settings.webhook_secret and x_hook_secret != settings.webhook_secret:
+        raise HTTPException(status_code=401, detail="Invalid secret")
+    body = await request.body()
+    if not _verify_hmac(x_signature, body):
+        raise HTTPException(status_code=401, detail="Invalid HMAC")
+    return await dedup.run(request.url.path, body, lambda: _handle_batch(batch))
+
+async def _handle_batch(batch: TVBatch) -> dict:
+    await _indicators_ready()
+    alerts = [_with_stream_indicators(a) for a in batch.alerts]
+    cols = {k: [getattr(a, k) for a in alerts]
+            for k in ("rsi", "macd", "macd_signal", "ema_fast", "ema_slow", "trend_strength")}
+    with metrics.stage("decision"):
+        decisions = decide_batch(**cols)
+
+    results: list[dict] = []
+    todo: list[tuple[int, TVPayload]] = []
+    for i, a in enumerate(alerts):
+        d = decisions[i]
+        if d.action == "hold":
+            decision_log.info("hold", extra={"symbol": a.symbol, "reason": d.reason, "confidence": d.confidence})
+            notify.enqueue(f"🟡 HOLD {a.symbol} — {d.reason}", digest="HOLD")
+            results.append({"symbol": a.symbol, "ok": True, "action": "hold",
+                            "reason": d.reason, "confidence": round(d.confidence, 2)})
+        else:
+            results.append({})
+            todo.append((i, a))
+
+    def _run_actionable() -> None:
+        with metrics.stage("quote"):
+            prices = get_quotes([a.symbol for _, a in todo if not a.price])
+        for i, a in todo:
+            d = decisions[i]
+            q = prices.get(a.symbol.strip().upper())
+            last = a.price or (q.price if q else 0.0)
+            try:
+                if not last or last <= 0:
+                    raise HTTPException(status_code=400, detail="No valid price")
+                res = _execute(_tv_alert(a, d.action, last, d.reason))
+                res.update({"symbol": a.symbol, "action": d.action,
+                            "ai_confidence": round(d.confidence, 2), "ai_reason": d.reason})
+            except HTTPException as exc:
+                res = {"symbol": a.symbol, "ok": False, "action": d.action,
+                       "status_code": exc.status_code, "detail": exc.detail}
+            results[i] = res
+
+    if todo:
+        await run_blocking(_run_actionable)
+    counts = {k: int((decisions.actions == k).sum()) for k in ("buy", "sell", "hold")}
+    return {"ok": True, "count": len(alerts), "decisions": counts, "results": results}
+
+class Tick(BaseModel):
+    symbol: str
+    price: float
+    timeframe: str | None = None
+
+class TickBatch(BaseModel):
+    ticks: list[Tick]
+
+@router.post("/api/ticks")
+async def api_ticks(
+    batch: TickBatch,
+    request: Request,
+    x_hook_secret: str | None = Header(default=None),
+    x_signature: str | None = Header(default=None)
+):
+    """
+    تغذية أسعار خام بمعدل عالٍ لتحديث المؤشرات فقط (بدون قرار أو تنفيذ).
+    """
+    if settings.webhook_secret and x_hook_secret != settings.webhook_secret:
+        raise HTTPException(status_code=401, detail="Invalid secret")
+    body = await request.body()
+    if not _verify_hmac(x_signature, body):
+        raise HTTPException(status_code=401, detail="Invalid HMAC")
+    await _indicators_ready()
+    accepted = 0
+    for t in batch.ticks:
+        if t.price > 0:
+            indicator_state.update(t.symbol, t.price, t.timeframe)
+            accepted += 1
+    return {"ok": True, "accepted": accepted, "rejected": len(batch.ticks) - accepted}
+
+@router.get("/api/indicators")
+def api_indicators(symbols: str = "", timeframe: str | None = None):
+    syms = [s.strip().upper() for s in symbols.split(",") if s.strip()]
+    if not syms:
+        syms = get_watchlist()
+    return {
+        "indicators": {s: indicator_state.values(s, timeframe) for s in syms},
+        "stats": indicator_state.stats()
+    }
 
 # ===== باقي الـAPI (المحفظة/المراكز/الأسعار/الواتش ليست/القتل/التنفيذ اليدوي/التصفية) =====
 @router.post("/manual")
@@ -153,52 +441,39 @@ def kill_status(): return {"kill_on": is_kill_switch_on()}
 @router.post("/kill/toggle")
 def kill_toggle():
     state_on = toggle_kill_switch()
-    notify.send(f"🛑 Kill Switch: {'ON' if state_on else 'OFF'}")
     return {"kill_on": state_on}
 
 @router.get("/api/portfolio")
-def api_portfolio():
-    buys, sells = sum_buys_sells()
-    positions = get_open_positions()
-    symbols = [p["symbol"] for p in positions]
-    prices = get_prices(symbols) if symbols else {}
-    market_val = sum(p["net_qty"] * prices.get(p["symbol"], 0.0) for p in positions)
-    cash = settings.BASE_CAPITAL - buys + sells
-    equity = cash + market_val
-    pnl = equity - settings.BASE_CAPITAL
-    pnl_pct = (pnl / settings.BASE_CAPITAL) * 100.0 if settings.BASE_CAPITAL > 0 else 0.0
+def api_portfolio(if_none_match: str | None = Header(default=None)):
+    # تُخدم من لقطة واحدة لا يُعاد بناؤها إلا عند صفقة جديدة أو تحديث سعر
+    return portfolio.portfolio_response(if_none_match)
+
+@router.get("/api/open-positions")
+def api_open_positions(if_none_match: str | None = Header(default=None)):
+    return portfolio.positions_response(if_none_match)
+
+@router.get("/api/exposure")
+def api_exposure():
     return {
-        "base_capital": round(settings.BASE_CAPITAL, 2),
-        "cash": round(cash, 2),
-        "market_value": round(market_val, 2),
-        "equity": round(equity, 2),
-        "pnl": round(pnl, 2),
-        "pnl_pct": round(pnl_pct, 2)
+        "exposure": round(get_exposure_value(), 2),
+        "reserved": round(get_reserved_exposure(), 2),
+        "max_exposure": round(settings.BASE_CAPITAL * settings.MAX_PORTFOLIO_EXPOSURE_PCT, 2),
     }
 
-@router.get("/api/open-positions")
-def api_open_positions():
-    positions = get_open_positions()
-    symbols = [p["symbol"] for p in positions]
-    prices = get_prices(symbols) if symbols else {}
-    out = []
-    for p in positions:
-        cur = prices.get(p["symbol"], 0.0)
-        pnl = (cur - p["avg_cost"]) * p["net_qty"]
-        pnl_pct = ((cur / p["avg_cost"]) - 1.0) * 100.0 if p["avg_cost"] > 0 else 0.0
-        out.append({
-            "symbol": p["symbol"], "qty": p["net_qty"], "avg_cost": round(p["avg_cost"], 4),
-            "last": round(cur, 4), "pnl": round(pnl, 2), "pnl_pct": round(pnl_pct, 2)
-        })
-    return {"positions": out}
+@router.get("/api/portfolio/stats")
+def api_portfolio_stats():
+    return portfolio.stats()
 
 @router.get("/api/quotes")
 def api_quotes(symbols: str = ""):
     syms = [s.strip().upper() for s in symbols.split(",") if s.strip()]
     if not syms:
         syms = get_watchlist()
-    prices = get_prices(syms) if syms else {}
-    return {"quotes": prices}
+    quotes = get_quotes(syms) if syms else {}
+    return {
+        "quotes": {s: q.price for s, q in quotes.items()},
+        "age_s": {s: q.age_s for s, q in quotes.items()}
+    }
 
 @router.get("/api/quotes/list")
 def api_quotes_list(symbols: str = ""):
@@ -208,13 +483,135 @@ def api_quotes_list(symbols: str = ""):
     data = get_quotes_details(syms) if syms else []
     return {"quotes": data}
 
+def _symbols_arg(symbols: str) -> list[str]:
+    return [s.strip().upper() for s in symbols.split(",") if s.strip()]
+
+@router.get("/api/quotes/stream")
+async def api_quotes_stream(request: Request, symbols: str = ""):
+    """
+    SSE: لقطة أولى ثم الأسعار التي تغيّرت فقط، من مُجدول مشترك لكل العملاء.
+    symbols اختياري ويُضاف إلى الواتش ليست والمراكز المفتوحة.
+    """
+    sub = quote_stream.subscribe(_symbols_arg(symbols))
+
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                msg = await sub.next()
+                if msg is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {msg['type']}\ndata: {json.dumps(msg['quotes'])}\n\n"
+        finally:
+            quote_stream.unsubscribe(sub)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.websocket("/ws/quotes")
+async def ws_quotes(websocket: WebSocket, symbols: str = ""):
+    await websocket.accept()
+    sub = quote_stream.subscribe(_symbols_arg(symbols))
+    try:
+        while True:
+            msg = await sub.next()
+            # ping دوري حتى نكتشف انقطاع العميل حتى لو لم تتغير الأسعار
+            await websocket.send_json(msg or {"type": "ping"})
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        quote_stream.unsubscribe(sub)
+
+@router.get("/api/quotes/stream/stats")
+def api_quotes_stream_stats():
+    return quote_stream.stats()
+
+@router.get("/api/quotes/cache")
+def api_quotes_cache():
+    return cache_stats()
+
+@router.get("/api/quotes/providers")
+def api_quotes_providers():
+    return provider_stats()
+
+def _tick_store():
+    ts = tickstore.store()
+    if ts is None:
+        raise HTTPException(status_code=404, detail="Tick store disabled (TICK_STORE_DIR)")
+    return ts
+
+@router.get("/api/history/{symbol}")
+def api_history(symbol: str, interval_s: float = 60.0, since: float | None = None, until: float | None = None):
+    """
+    شموع OHLC من التيكات المحفوظة محليًا (since/until بثواني epoch)، بصيغة أعمدة.
+    """
+    if interval_s <= 0:
+        raise HTTPException(status_code=400, detail="interval_s must be > 0")
+    bars = _tick_store().ohlc(symbol, interval_s, since, until)
+    return {"symbol": symbol.upper(), "interval_s": interval_s,
+            **{name: bars[name].tolist() for name in bars.dtype.names}}
+
+@router.get("/api/history/{symbol}/ticks")
+def api_history_ticks(symbol: str, since: float | None = None, until: float | None = None, limit: int = 1000):
+    ticks = _tick_store().ticks(symbol, since, until)[-max(1, min(limit, 100_000)):]
+    return {"symbol": symbol.upper(), "ts": ticks["ts"].tolist(), "price": ticks["price"].tolist()}
+
+@router.get("/api/history")
+def api_history_stats():
+    ts = _tick_store()
+    return {**ts.stats(), "symbols": ts.symbols()}
+
 @router.get("/api/trades")
-def api_trades(limit: int = 100):
+def api_trades(limit: int = 100, cursor: int | None = None, symbol: str | None = None,
+               side: str | None = None, since: str | None = None, until: str | None = None):
     try:
-        trades = get_recent_trades(limit=limit)
+        trades, next_cursor = get_trades(limit, cursor, symbol, side, since, until)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid filter: {exc}") from exc
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"Failed to load trades: {exc}") from exc
-    return {"trades": trades}
+    return {"trades": trades, "next_cursor": next_cursor}
+
+@router.get("/api/trades/export")
+def api_trades_export(format: str = "csv", symbol: str | None = None, side: str | None = None,
+                      since: str | None = None, until: str | None = None):
+    """
+    تصدير كامل بالبث (CSV أو NDJSON) من مؤشر يُقرأ على دفعات: ذاكرة ثابتة لأي حجم.
+    """
+    if format not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be 'csv' or 'ndjson'")
+    try:
+        rows = iter_trades(symbol, side, since, until)
+        first = next(rows, None)  # يكشف أخطاء الفلاتر قبل بدء الاستجابة
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid filter: {exc}") from exc
+
+    def chunks(batch: int = 1000):
+        pending = [] if first is None else [first]
+        for row in rows:
+            pending.append(row)
+            if len(pending) >= batch:
+                yield _encode_rows(pending, format)
+                pending = []
+        if pending:
+            yield _encode_rows(pending, format)
+
+    def body():
+        if format == "csv":
+            yield _encode_rows([TRADE_COLUMNS], "csv")
+        yield from chunks()
+
+    media = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(body(), media_type=media, headers={
+        "Content-Disposition": f'attachment; filename="trades.{format}"'
+    })
+
+def _encode_rows(rows: list[tuple], format: str) -> str:
+    if format == "ndjson":
+        return "".join(json.dumps(dict(zip(TRADE_COLUMNS, r)), ensure_ascii=False) + "\n" for r in rows)
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    return buf.getvalue()
 
 @router.get("/api/watchlist")
 def api_watchlist_get(): return {"watchlist": get_watchlist()}
@@ -231,18 +628,117 @@ def api_watchlist_remove(symbol: str = Form(...)):
     set_watchlist(symbols); return {"watchlist": symbols}
 
 @router.post("/liquidate-all")
-def liquidate_all():
-    positions = get_open_positions()
-    results = []
-    for p in positions:
+async def liquidate_all():
+    """
+    إغلاق كل المراكز: جلب الأسعار دفعة واحدة، إرسال الأوامر بالتوازي،
+    ثم تسجيل كل الصفقات في معاملة واحدة. يرجّع زمن كل مرحلة ولكل مركز.
+    """
+    t0 = time.perf_counter()
+    positions = [p for p in await run_blocking(get_open_positions) if int(p["net_qty"]) > 0]
+    symbols = [p["symbol"] for p in positions]
+    quotes = await run_blocking(get_quotes, symbols) if symbols else {}
+    t_quotes = time.perf_counter()
+
+    async def _close(p: dict) -> dict:
         symbol, qty = p["symbol"], int(p["net_qty"])
-        if qty <= 0: continue
-        price = broker.get_last_price(symbol)
-        broker.submit_order(symbol, "sell", qty)
-        log_trade(symbol, "sell", qty, price, "liquidate-all")
-        results.append({"symbol": symbol, "sold_qty": qty, "price": price})
-    notify.send(f"🚪 Liquidate All — {len(results)} رمز")
-    return {"ok": True, "closed": results}
+        start = time.perf_counter()
+        q = quotes.get(symbol)
+        if q and q.price > 0:
+            # السعر من الجلب المجمّع: زمنه هو زمن الدفعة كاملة
+            price, price_s = q.price, t_quotes - t0
+        else:
+            try:
+                price = await run_blocking(broker.get_last_price, symbol)
+            except QuoteUnavailable as exc:
+                return {"symbol": symbol, "ok": False, "error": str(exc)}
+            price_s = time.perf_counter() - start
+        priced = time.perf_counter()
+        try:
+            order = await run_blocking(broker.submit_order, symbol, "sell", qty, price=price)
+        except Exception as exc:
+            return {"symbol": symbol, "ok": False, "error": str(exc)}
+        done = time.perf_counter()
+        return {"symbol": symbol, "ok": True, "sold_qty": order["filled_qty"],
+                "price": order["avg_price"] or price, "order_id": order.get("id"),
+                "price_ms": round(price_s * 1000, 2),
+                "order_ms": round((done - priced) * 1000, 2)}
+
+    results = list(await asyncio.gather(*(_close(p) for p in positions)))
+    t_orders = time.perf_counter()
+    filled = [r for r in results if r["ok"]]
+    await run_blocking(log_trades_bulk, [(r["symbol"], "sell", r["sold_qty"], r["price"], "liquidate-all")
+                                         for r in filled if r["sold_qty"]])
+    t_end = time.perf_counter()
+    return {
+        "ok": len(filled) == len(results),
+        "closed": results,
+        "timing_ms": {
+            "quotes": round((t_quotes - t0) * 1000, 2),
+            "orders": round((t_orders - t_quotes) * 1000, 2),
+            "log": round((t_end - t_orders) * 1000, 2),
+            "total": round((t_end - t0) * 1000, 2),
+        }
+    }
+
+# ===== أوامر الوسيط الورقي =====
+class OrderReplace(BaseModel):
+    qty: int | None = None
+    limit_price: float | None = None
+    stop_price: float | None = None
+
+@router.get("/api/orders")
+def api_orders(symbol: str = ""):
+    return {"orders": broker.open_orders(symbol.strip() or None), "engine": broker.engine.stats(),
+            "unlogged_fills": unlogged_fills()}
+
+@router.get("/api/orders/book/{symbol}")
+def api_order_book(symbol: str, levels: int = 10):
+    return broker.engine.depth(symbol.strip().upper(), max(1, min(levels, 100)))
+
+@router.get("/api/orders/{order_id}")
+def api_order(order_id: str):
+    try:
+        return broker.get_order(order_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Unknown order")
+
+@router.delete("/api/orders/{order_id}")
+def api_cancel_order(order_id: str):
+    try:
+        hold = broker.hold(order_id)
+        if not broker.cancel_order(order_id):
+            raise HTTPException(status_code=409, detail="Order is not open")
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Unknown order")
+    if hold:
+        settle_reservations({hold[0]: 0.0})
+    return broker.get_order(order_id)
+
+@router.post("/api/orders/{order_id}/replace")
+def api_replace_order(order_id: str, body: OrderReplace):
+    try:
+        old = broker.get_order(order_id)
+        held = broker.hold(order_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Unknown order")
+    if held:
+        # أمر شراء معلّق: نعيد حجز قيمته الجديدة قبل التعديل (قد تكبر الكمية أو السعر)
+        ref, unit = held[0], body.limit_price or held[1]
+        left = ((body.qty or old["qty"]) - old["filled_qty"]) * unit
+        if not reserve_exposure(ref, left, settings.EXPOSURE_HOLD_S):
+            raise HTTPException(status_code=400, detail="Exposure limit reached")
+    try:
+        order = broker.replace_order(order_id, body.qty, body.limit_price, body.stop_price,
+                                     hold=(ref, unit) if held else None)
+    except (KeyError, ValueError) as exc:
+        if held:
+            settle_reservations({held[0]: (old["qty"] - old["filled_qty"]) * held[1]})
+        if isinstance(exc, KeyError):
+            raise HTTPException(status_code=404, detail="Order is not open")
+        raise HTTPException(status_code=400, detail=str(exc))
+    if held and order["status"] not in OPEN_STATUSES:
+        settle_reservations({ref: 0.0})  # امتلأ أو أُلغي باقيه: ما نُفّذ خُصم عند تسجيله
+    return order
 
 @router.get("/ping-telegram")
 def ping_telegram():
@@ -253,14 +749,44 @@ def ping_telegram():
         return {"ok": False, "telegram_enabled": notify.enabled(), "error": str(e)}
 
 
+@router.get("/metrics")
+def prometheus_metrics(request: Request):
+    """
+    هيستوغرامات زمن المراحل بصيغة Prometheus؛ مع Accept: application/openmetrics-text
+    تُضاف exemplars تحمل correlation_id لآخر طلب في كل bucket.
+    """
+    openmetrics = "application/openmetrics-text" in request.headers.get("accept", "")
+    media = ("application/openmetrics-text; version=1.0.0; charset=utf-8" if openmetrics
+             else "text/plain; version=0.0.4; charset=utf-8")
+    return PlainTextResponse(metrics.render(openmetrics), media_type=media)
+
+@router.get("/api/webhook/dedup")
+def api_webhook_dedup():
+    return dedup.stats()
+
+@router.get("/api/events")
+def api_events():
+    return events.stats()
+
+@router.get("/api/logging")
+def api_logging():
+    return logging_stats()
+
+@router.get("/api/warmup")
+def api_warmup():
+    return warmup.stats()
+
+@router.get("/api/notify/stats")
+def api_notify_stats():
+    return notify.stats()
+
+
 @router.get("/debug/secret")
 def debug_secret():
     # ⚠️ لا تتركه مفعلاً في الإنتاج
     return {"expected_WEBHOOK_SECRET": settings.webhook_secret}
 
 
-from fastapi import Request, Header
-
 @router.post("/debug/echo")
 async def debug_echo(request: Request, x_hook_secret: str | None = Header(default=None)):
     from urllib.parse import urlparse, parse_qs
@@ -277,9 +803,6 @@ async def debug_echo(request: Request, x_hook_secret: str | None = Header(defaul
         "match_header": x_hook_secret == expected
     }
 
-
-from urllib.parse import urlparse, parse_qs
-
 @router.post("/webhook-tv2")
 async def webhook_tv2(
     payload: TVPayload,
@@ -303,30 +826,8 @@ async def webhook_tv2(
         # نُرجع 401 مع تفاصيل تشخيص (مؤقتًا أثناء التطوير)
         raise HTTPException(status_code=401, detail={"err":"Invalid secret (query)","debug":resp_dbg})
 
-    # قرار المؤشرات
-    d = decide_from_indicators(
-        rsi=payload.rsi,
-        macd=payload.macd,
-        macd_signal=payload.macd_signal,
-        ema_fast=payload.ema_fast,
-        ema_slow=payload.ema_slow,
-        trend_strength=payload.trend_strength
-    )
-
-    if d.action == "hold":
-        notify.send(f"🟡 HOLD {payload.symbol} — {d.reason}")
-        return {"ok": True, "action": "hold", "reason": d.reason, "confidence": round(d.confidence,2), "debug": resp_dbg}
-
-    side = d.action
-    last = payload.price or broker.get_last_price(payload.symbol)
-    if not last or last <= 0:
-        raise HTTPException(status_code=400, detail={"err":"No valid price","debug":resp_dbg})
-
-    import math
-    cap = float(payload.max_trade_amount or settings.MAX_TRADE_AMOUNT or 500.0)
-    qty = max(1, math.floor(cap / last))
-
-    alert = Alert(symbol=payload.symbol, side=side, qty_shares=qty, note=payload.note or d.reason, price=last)
-    result = _execute(alert)
-    result.update({"ai_confidence": round(d.confidence, 2), "ai_reason": d.reason, "debug": resp_dbg})
-    return result
+    # النتيجة تُحفظ في webhook_dedup وتُعاد لكل من يرسل نفس الجسم: بدون السر
+    resp_dbg = {**resp_dbg, "url": str(request.url.remove_query_params("secret")),
+                "secret_query": "***" if secret_q else None}
+    body = await request.body()
+    return await dedup.run(request.url.path, body, lambda: _handle_tv(payload, debug=resp_dbg))
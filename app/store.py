@@ -1,119 +1,678 @@
-import sqlite3
-from pathlib import Path
+import os
+import threading
 import json
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Iterator
 
-DB = Path("bot.db")
-
-def _conn():
-    conn = sqlite3.connect(DB)
-    conn.row_factory = sqlite3.Row
-    return conn
+from . import db, events
+from .config import settings
+from .risk import within_exposure
 
 def init_db():
-    conn = _conn()
-    c = conn.cursor()
+    with db.transaction() as c:
+        _create_schema(c)
+    # ترحيل لمرة واحدة: قاعدة قديمة فيها صفقات بدون دفتر مراكز
+    with db.read() as conn:
+        has_trades = conn.execute("SELECT 1 FROM trades LIMIT 1").fetchone()
+        has_positions = conn.execute("SELECT 1 FROM positions LIMIT 1").fetchone()
+        has_totals = conn.execute("SELECT 1 FROM trade_totals").fetchone()
+    if has_trades and not has_positions:
+        rebuild_positions()
+    if not has_totals:
+        rebuild_totals()
+        # كانت في state سابقًا: كل صفقة كانت تغيّر state وتبطل كاش _HotState
+        with db.transaction() as c:
+            c.execute("DELETE FROM state WHERE key='trade_totals'")
+
+def _create_schema(c):
     c.execute("""CREATE TABLE IF NOT EXISTS trades(
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         ts DATETIME DEFAULT CURRENT_TIMESTAMP,
         symbol TEXT, side TEXT, qty INTEGER, price REAL, note TEXT
     )""")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_trades_symbol_side ON trades(symbol, side)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_trades_ts ON trades(ts)")
     c.execute("""CREATE TABLE IF NOT EXISTS state(
         key TEXT PRIMARY KEY, val TEXT
     )""")
+    c.execute("""CREATE TABLE IF NOT EXISTS positions(
+        symbol TEXT PRIMARY KEY,
+        net_qty INTEGER NOT NULL DEFAULT 0,
+        avg_cost REAL NOT NULL DEFAULT 0,
+        realized_pnl REAL NOT NULL DEFAULT 0,
+        last_trade_id INTEGER
+    )""")
+    c.execute("""CREATE TABLE IF NOT EXISTS indicator_state(
+        key TEXT PRIMARY KEY,
+        state TEXT NOT NULL,
+        updated_ts DATETIME DEFAULT CURRENT_TIMESTAMP
+    )""")
+    c.execute("""CREATE TABLE IF NOT EXISTS webhook_dedup(
+        key TEXT PRIMARY KEY,
+        ts REAL NOT NULL,
+        status INTEGER,
+        result TEXT
+    )""")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_webhook_dedup_ts ON webhook_dedup(ts)")
+    c.execute("""CREATE TABLE IF NOT EXISTS trade_totals(
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        buy_notional REAL NOT NULL,
+        sell_notional REAL NOT NULL,
+        last_trade_id INTEGER NOT NULL
+    )""")
+    c.execute("""CREATE TABLE IF NOT EXISTS exposure_reservations(
+        ref TEXT PRIMARY KEY,
+        notional REAL NOT NULL,
+        expires REAL NOT NULL
+    )""")
     # defaults
     c.execute("INSERT OR IGNORE INTO state(key,val) VALUES('kill_switch','0')")
     c.execute("INSERT OR IGNORE INTO state(key,val) VALUES('watchlist','[\"AAPL\",\"TSLA\"]')")
-    conn.commit(); conn.close()
 
 def get_exposure_value():
-    conn = _conn(); c = conn.cursor()
-    c.execute("SELECT SUM(qty*price) FROM trades WHERE side='buy'")
-    val = c.fetchone()[0]
-    conn.close()
-    return float(val or 0.0)
-
-def log_trade(symbol, side, qty, price, note=""):
-    conn = _conn(); c = conn.cursor()
-    c.execute("INSERT INTO trades(symbol,side,qty,price,note) VALUES (?,?,?,?,?)",
-              (symbol, side, int(qty), float(price), note))
-    conn.commit(); conn.close()
+    """
+    إجمالي قيمة المشتريات (من المجاميع الجارية، بدون SUM على كامل trades).
+    """
+    return _ledger.totals()[0]
+
+def log_trade(symbol, side, qty, price, note="", consumed: dict[str, float] | None = None):
+    """
+    يسجّل الصفقة ويحدّث دفتر المراكز في نفس المعاملة.
+    """
+    log_trades_bulk([(symbol, side, qty, price, note)], consumed)
+
+# ===== حجز التعرّض (آمن عبر عدة عمّال uvicorn) =====
+def _reserved(conn, now: float, exclude: str = "") -> float:
+    return conn.execute(
+        "SELECT COALESCE(SUM(notional), 0) FROM exposure_reservations WHERE expires>? AND ref<>?", (now, exclude)
+    ).fetchone()[0]
+
+def reserve_exposure(ref: str, notional: float, ttl_s: float) -> bool:
+    """
+    فحص حد التعرّض وحجز قيمة الشراء في معاملة BEGIN IMMEDIATE واحدة:
+    المشتريات المسجّلة + الحجوزات القائمة + الجديد يجب أن تبقى ضمن الحد.
+    نفس ref يستبدل حجزه السابق (تعديل أمر). الحجز ينتهي بعد ttl_s إن لم يُسوَّ
+    (عامل مات بين الحجز والتسجيل). يرجّع False إن تجاوز الحد.
+    """
+    now = time.time()
+    with db.transaction(immediate=True) as conn:
+        conn.execute("DELETE FROM exposure_reservations WHERE expires<=?", (now,))
+        if not within_exposure(_read_totals(conn)[0] + _reserved(conn, now, exclude=ref), notional):
+            return False
+        conn.execute("INSERT OR REPLACE INTO exposure_reservations(ref,notional,expires) VALUES (?,?,?)",
+                     (ref, float(notional), now + ttl_s))
+    return True
+
+def _settle(conn, reservations: dict[str, float]):
+    # notional <= 0 يحرّر الحجز؛ غير ذلك يبقى لباقي أمر معلّق حتى EXPOSURE_HOLD_S
+    expires = time.time() + settings.EXPOSURE_HOLD_S
+    for ref, left in reservations.items():
+        if left > 0:
+            conn.execute("UPDATE exposure_reservations SET notional=?, expires=? WHERE ref=?", (left, expires, ref))
+        else:
+            conn.execute("DELETE FROM exposure_reservations WHERE ref=?", (ref,))
+
+def _consume(conn, consumed: dict[str, float]):
+    # خصم (لا تعيين): تنفيذات نفس الأمر قد يسجّلها عاملان بأي ترتيب، والحجز يبقى
+    # دائمًا = ما لم يُسجَّل بعد. الحجز الذي نفد يُحذف
+    expires = time.time() + settings.EXPOSURE_HOLD_S
+    conn.executemany("UPDATE exposure_reservations SET notional=notional-?, expires=? WHERE ref=?",
+                     [(float(v), expires, ref) for ref, v in consumed.items()])
+    conn.executemany("DELETE FROM exposure_reservations WHERE ref=? AND notional<=1e-6",
+                     [(ref,) for ref in consumed])
+
+def settle_reservations(reservations: dict[str, float]):
+    with db.transaction(immediate=True) as conn:
+        _settle(conn, reservations)
+
+def consume_reservations(consumed: dict[str, float]):
+    """
+    يخصم من كل حجز القيمة المعطاة ويمدّد صلاحية الباقي إلى EXPOSURE_HOLD_S
+    (القيمة 0 تمدّد فقط: أمر بقي معلّقًا دون تنفيذ).
+    """
+    with db.transaction(immediate=True) as conn:
+        _consume(conn, consumed)
+
+def get_reserved_exposure() -> float:
+    with db.read() as conn:
+        return _reserved(conn, time.time())
+
+def log_trades_bulk(trades: list[tuple[str, str, int, float, str]],
+                    consumed: dict[str, float] | None = None) -> list[int]:
+    """
+    يسجّل عدة صفقات (symbol, side, qty, price, note) بترتيبها في معاملة واحدة:
+    إدراج بـ executemany، وتحديث المراكز والمجاميع مرة واحدة. يرجّع ids الصفقات.
+    consumed = {ref: القيمة المحجوزة التي استهلكتها هذه الصفقات} تُخصم في نفس
+    المعاملة، فلا تُحسب الصفقة مرتين (حجز + مشتريات) ولا تظهر فجوة بينهما.
+    """
+    rows = [(sym, side, int(qty), float(price), note or "") for sym, side, qty, price, note in trades]
+    if not rows:
+        if consumed:
+            consume_reservations(consumed)
+        return []
+    # BEGIN IMMEDIATE يمنع عاملًا آخر من قراءة نفس المركز قبل أن نكتب عليه
+    with db.transaction(immediate=True) as conn:
+        if consumed:
+            _consume(conn, consumed)
+        conn.executemany("INSERT INTO trades(symbol,side,qty,price,note) VALUES (?,?,?,?,?)", rows)
+        # تحت قفل الكتابة ids المُدرجة متتالية وتنتهي عند last_insert_rowid
+        last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+        first_id = last_id - len(rows) + 1
+        symbols = list(dict.fromkeys(r[0] for r in rows))
+        marks = ",".join("?" * len(symbols))
+        positions = {
+            r[0]: (int(r[1]), float(r[2]), float(r[3]))
+            for r in conn.execute(
+                f"SELECT symbol, net_qty, avg_cost, realized_pnl FROM positions WHERE symbol IN ({marks})",
+                symbols
+            )
+        }
+        totals = _read_totals(conn)
+        last_ids: dict[str, int] = {}
+        for trade_id, (sym, side, qty, price, _) in enumerate(rows, start=first_id):
+            positions[sym] = apply_fill(positions.get(sym, (0, 0.0, 0.0)), side, qty, price)
+            totals = _add_to_totals(totals, side, qty * price)
+            last_ids[sym] = trade_id
+        conn.executemany("""INSERT INTO positions(symbol,net_qty,avg_cost,realized_pnl,last_trade_id)
+                            VALUES (?,?,?,?,?)
+                            ON CONFLICT(symbol) DO UPDATE SET
+                              net_qty=excluded.net_qty, avg_cost=excluded.avg_cost,
+                              realized_pnl=excluded.realized_pnl, last_trade_id=excluded.last_trade_id""",
+                         [(sym, *positions[sym], last_ids[sym]) for sym in symbols])
+        _write_totals(conn, totals, last_id)
+    _ledger.applied({sym: positions[sym] for sym in symbols}, totals, first_id, last_id)
+    events.publish(events.TradesLogged(tuple(events.Trade(i, *r) for i, r in enumerate(rows, start=first_id))))
+    return list(range(first_id, last_id + 1))
+
+TRADE_COLUMNS = ("id", "ts", "symbol", "side", "qty", "price", "note")
+
+def _ts_bound(value: str | None) -> str | None:
+    """
+    يحوّل تاريخ ISO (مع أو بدون وقت/منطقة زمنية) إلى صيغة عمود ts (UTC).
+    """
+    if not value:
+        return None
+    dt = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt.strftime("%Y-%m-%d %H:%M:%S")
+
+def _trade_filters(symbol=None, side=None, since=None, until=None) -> tuple[list[str], list]:
+    where, args = [], []
+    if symbol:
+        where.append("symbol=?"); args.append(symbol.strip().upper())
+    if side:
+        where.append("side=?"); args.append(side.strip().lower())
+    if since:
+        where.append("ts>=?"); args.append(_ts_bound(since))
+    if until:
+        where.append("ts<?"); args.append(_ts_bound(until))
+    return where, args
+
+def get_trades(limit: int = 100, cursor: int | None = None, symbol: str | None = None,
+               side: str | None = None, since: str | None = None, until: str | None = None
+               ) -> tuple[list[dict], int | None]:
+    """
+    صفحة من سجل الصفقات (الأحدث أولًا) بترقيم keyset على id:
+    cursor = id آخر صفقة في الصفحة السابقة. يرجّع (الصفقات, cursor التالي أو None).
+    since/until بصيغة ISO (until غير شامل).
+    """
+    limit = max(1, min(int(limit), 500))
+    where, args = _trade_filters(symbol, side, since, until)
+    if cursor is not None:
+        where.append("id<?"); args.append(int(cursor))
+    sql = f"SELECT {', '.join(TRADE_COLUMNS)} FROM trades"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY id DESC LIMIT ?"
+    with db.read() as conn:
+        rows = conn.execute(sql, (*args, limit + 1)).fetchall()
+    page = [dict(r) for r in rows[:limit]]
+    return page, (page[-1]["id"] if len(rows) > limit else None)
 
 def get_recent_trades(limit: int = 100) -> list[dict]:
     """
     يرجّع أحدث الصفقات مرتبة تنازليًا حسب تاريخ الإدراج.
     """
-    limit = max(1, min(int(limit), 500))
-    conn = _conn()
-    rows = conn.execute(
-        "SELECT ts, symbol, side, qty, price, note FROM trades ORDER BY id DESC LIMIT ?",
-        (limit,)
-    ).fetchall()
-    conn.close()
-    return [dict(r) for r in rows]
+    return get_trades(limit)[0]
+
+def iter_trades(symbol: str | None = None, side: str | None = None, since: str | None = None,
+                until: str | None = None, chunk_size: int = 1000) -> Iterator[tuple]:
+    """
+    يمر على الصفقات المطابقة بترتيب id تصاعديًا، دفعة بعد دفعة (keyset)،
+    فالذاكرة ثابتة مهما كبر الجدول ولا تبقى معاملة قراءة مفتوحة بين الدفعات.
+    """
+    where, args = _trade_filters(symbol, side, since, until)
+    sql = f"SELECT {', '.join(TRADE_COLUMNS)} FROM trades WHERE " + " AND ".join([*where, "id>?"])
+    sql += " ORDER BY id LIMIT ?"
+    last_id = 0
+    while True:
+        with db.read() as conn:
+            rows = conn.execute(sql, (*args, last_id, chunk_size)).fetchall()
+        for r in rows:
+            yield tuple(r)
+        if len(rows) < chunk_size:
+            return
+        last_id = rows[-1][0]
 
 # ===== state / kill switch =====
+def _parse_watchlist(raw: str) -> tuple[str, ...]:
+    try: return tuple(json.loads(raw))
+    except (ValueError, TypeError): return ()
+
+
+class _HotState:
+    """
+    نسخة مُحلَّلة في الذاكرة من جدول state (kill switch، watchlist...).
+    الكتابة تمر عبرها مباشرة (write-through). قبل كل قراءة نفحص PRAGMA data_version
+    على اتصال خاص بكل خيط: يتغيّر عند أي commit من اتصال آخر (عامل uvicorn آخر أو CLI)،
+    وعندها فقط نعيد قراءة الجدول ونعيد تحليل القيم التي تغيّرت فعلًا.
+    القراءة بلا قفل؛ القفل لإعادة التحميل والكتابة فقط.
+    """
+
+    def __init__(self, parsers: dict[str, Callable[[str], Any]]):
+        self._lock = threading.Lock()
+        self._parsers = parsers
+        self._raw: dict[str, str] = {}
+        self._values: dict[str, Any] = {}
+        self._versions: dict[str, int] = {}
+        self._version = 0
+        self._local = threading.local()
+
+    def _refresh(self) -> bool:
+        database, local = db.get_db(), self._local
+        if getattr(local, "owner", None) is not database or local.pid != os.getpid():
+            if not database.path.exists():
+                return False
+            local.conn = database.dedicated()
+            local.owner, local.pid, local.data_version = database, os.getpid(), None
+        data_version = local.conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version != local.data_version:
+            with self._lock:
+                # القراءة تحت القفل: إعادات التحميل المتتالية ترى لقطات أحدث فأحدث
+                rows = local.conn.execute("SELECT key, val FROM state").fetchall()
+                for key, val in rows:
+                    self._store_locked(key, val)
+            local.data_version = data_version
+        return True
+
+    def _store_locked(self, key: str, raw: str):
+        if key in self._raw and self._raw[key] == raw:
+            return
+        parse = self._parsers.get(key)
+        self._raw[key] = raw
+        self._values[key] = parse(raw) if parse else raw
+        self._version += 1
+        self._versions[key] = self._version
+
+    def get(self, key: str, default: Any = None, raw: bool = False) -> Any:
+        if not self._refresh():
+            return None
+        return (self._raw if raw else self._values).get(key, default)
+
+    def put(self, key: str, raw: str):
+        with self._lock:
+            self._store_locked(key, raw)
+
+    def version(self, key: str | None = None) -> int:
+        """
+        عدّاد يزيد مع كل تغيير (لمفتاح معيّن أو لأي مفتاح): يكفي للقارئ أن يقارنه
+        بآخر نسخة رآها ليتخطى إعادة الحساب.
+        """
+        self._refresh()
+        return self._version if key is None else self._versions.get(key, 0)
+
+
+_hot = _HotState({"kill_switch": lambda raw: raw == "1", "watchlist": _parse_watchlist})
+
+
 def get_state(key: str, default: str = "") -> str:
-    conn = _conn(); c = conn.cursor()
-    c.execute("SELECT val FROM state WHERE key=?", (key,))
-    row = c.fetchone()
-    conn.close()
+    val = _hot.get(key, default, raw=True)
+    if val is not None:
+        return val
+    # الملف غير موجود بعد (قبل init_db): قراءة مباشرة
+    with db.read() as conn:
+        row = conn.execute("SELECT val FROM state WHERE key=?", (key,)).fetchone()
     return row[0] if row else default
 
 def set_state(key: str, val: str):
-    conn = _conn(); c = conn.cursor()
-    c.execute("INSERT INTO state(key,val) VALUES(?,?) ON CONFLICT(key) DO UPDATE SET val=excluded.val", (key, val))
-    conn.commit(); conn.close()
+    db.connection().execute(
+        "INSERT INTO state(key,val) VALUES(?,?) ON CONFLICT(key) DO UPDATE SET val=excluded.val", (key, val)
+    )
+    _hot.put(key, val)
+
+def state_version(key: str | None = None) -> int:
+    return _hot.version(key)
 
 def is_kill_switch_on() -> bool:
-    return get_state("kill_switch","0") == "1"
+    return bool(_hot.get("kill_switch", False))
 
 def toggle_kill_switch() -> bool:
-    newv = "0" if is_kill_switch_on() else "1"
-    set_state("kill_switch", newv)
+    with db.transaction(immediate=True) as conn:
+        row = conn.execute("SELECT val FROM state WHERE key='kill_switch'").fetchone()
+        newv = "0" if row and row[0] == "1" else "1"
+        conn.execute(
+            "INSERT INTO state(key,val) VALUES('kill_switch',?) ON CONFLICT(key) DO UPDATE SET val=excluded.val",
+            (newv,)
+        )
+    _hot.put("kill_switch", newv)
+    events.publish(events.KillSwitchChanged(newv == "1"))
     return newv == "1"
 
 # ===== open positions & pnl =====
+def apply_fill(pos: tuple[int, float, float], side: str, qty: int, price: float) -> tuple[int, float, float]:
+    """
+    يطبّق صفقة على مركز (net_qty, avg_cost, realized_pnl) ويرجّع المركز الجديد.
+    الزيادة في نفس الاتجاه تعدّل متوسط التكلفة (وزني)، والتقليص يحقق ربحًا/خسارة
+    على متوسط التكلفة، وعبور الصفر يفتح الباقي بسعر الصفقة.
+    """
+    net_qty, avg_cost, realized = pos
+    delta = qty if side == "buy" else -qty
+    if net_qty == 0 or (net_qty > 0) == (delta > 0):
+        new_qty = net_qty + delta
+        avg_cost = (abs(net_qty) * avg_cost + abs(delta) * price) / abs(new_qty)
+        return new_qty, avg_cost, realized
+
+    closed = min(abs(delta), abs(net_qty))
+    direction = 1 if net_qty > 0 else -1
+    realized += (price - avg_cost) * closed * direction
+    new_qty = net_qty + delta
+    if new_qty == 0:
+        avg_cost = 0.0
+    elif (new_qty > 0) != (net_qty > 0):
+        avg_cost = price
+    return new_qty, avg_cost, realized
+
+
+class _PositionsLedger:
+    """
+    نسخة في الذاكرة من جدول positions ومن المجاميع الجارية (trade_totals).
+    تُعتبر صالحة طالما أن آخر id في trades لم يتغيّر (قد يكتب عامل uvicorn آخر).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows: dict[str, tuple[int, float, float]] = {}
+        self._totals: tuple[float, float] = (0.0, 0.0)
+        self._trade_id: int | None = None
+
+    def invalidate(self):
+        with self._lock:
+            self._trade_id = None
+
+    def applied(self, positions: dict[str, tuple[int, float, float]], totals: tuple[float, float],
+                first_id: int, last_id: int):
+        with self._lock:
+            # نحدّث النسخة فقط إن كانت متزامنة حتى الصفقة السابقة مباشرة
+            if self._trade_id is not None and self._trade_id == first_id - 1:
+                self._rows.update(positions)
+                self._totals = totals
+                self._trade_id = last_id
+            else:
+                self._trade_id = None
+
+    def _sync(self) -> tuple[int, dict[str, tuple[int, float, float]], tuple[float, float]]:
+        with db.read() as conn:
+            # معاملة قراءة واحدة: MAX(id) والمراكز والمجاميع من نفس اللقطة
+            conn.execute("BEGIN")
+            last_id = conn.execute("SELECT MAX(id) FROM trades").fetchone()[0] or 0
+            with self._lock:
+                if self._trade_id == last_id:
+                    return last_id, dict(self._rows), self._totals
+            rows = conn.execute(
+                "SELECT symbol, net_qty, avg_cost, realized_pnl FROM positions"
+            ).fetchall()
+            totals = _read_totals(conn)
+        data = {r[0]: (int(r[1]), float(r[2]), float(r[3])) for r in rows}
+        with self._lock:
+            self._rows = dict(data)
+            self._totals = totals
+            self._trade_id = last_id
+        return last_id, data, totals
+
+    def snapshot(self) -> dict[str, tuple[int, float, float]]:
+        return self._sync()[1]
+
+    def totals(self) -> tuple[float, float]:
+        return self._sync()[2]
+
+    def view(self) -> tuple[int, dict[str, tuple[int, float, float]], tuple[float, float]]:
+        return self._sync()
+
+
+_ledger = _PositionsLedger()
+
+
 def get_open_positions():
     """
     يرجّع [{'symbol': 'AAPL', 'net_qty': 12, 'avg_cost': 98.5}] للرموز ذات كمية صافية موجبة.
+    تُقرأ من دفتر المراكز (positions) لا من كامل سجل الصفقات.
+    """
+    return [
+        {"symbol": sym, "net_qty": net_qty, "avg_cost": avg_cost}
+        for sym, (net_qty, avg_cost, _) in sorted(_ledger.snapshot().items())
+        if net_qty > 0
+    ]
+
+
+def get_book() -> tuple[int, list[dict], float]:
+    """
+    (آخر id في trades, المراكز المفتوحة, النقد) من نفس اللقطة.
+    الـ id يصلح رقمَ إصدار: يتغيّر مع كل صفقة من أي عامل.
+    """
+    trade_id, rows, (buys, sells) = _ledger.view()
+    positions = [
+        {"symbol": sym, "net_qty": net_qty, "avg_cost": avg_cost}
+        for sym, (net_qty, avg_cost, _) in sorted(rows.items())
+        if net_qty > 0
+    ]
+    return trade_id, positions, settings.BASE_CAPITAL - buys + sells
+
+
+def get_realized_pnl() -> dict[str, float]:
+    """
+    يرجّع الربح/الخسارة المحققة لكل رمز.
+    """
+    return {sym: realized for sym, (_, _, realized) in _ledger.snapshot().items()}
+
+
+def _replay_positions(conn) -> dict[str, tuple[int, float, float, int]]:
+    out: dict[str, tuple[int, float, float, int]] = {}
+    for trade_id, sym, side, qty, price in conn.execute(
+        "SELECT id, symbol, side, qty, price FROM trades ORDER BY id"
+    ):
+        prev = out.get(sym, (0, 0.0, 0.0, 0))[:3]
+        out[sym] = (*apply_fill(prev, side, int(qty), float(price)), trade_id)
+    return out
+
+
+def rebuild_positions() -> int:
+    """
+    يعيد بناء جدول positions من جدول trades بالكامل (للترحيل أو بعد إصلاح يدوي).
+    يرجّع عدد الرموز.
+    """
+    with db.transaction(immediate=True) as conn:
+        replay = _replay_positions(conn)
+        conn.execute("DELETE FROM positions")
+        conn.executemany(
+            "INSERT INTO positions(symbol,net_qty,avg_cost,realized_pnl,last_trade_id) VALUES (?,?,?,?,?)",
+            [(sym, *vals) for sym, vals in replay.items()]
+        )
+    _ledger.invalidate()
+    return len(replay)
+
+
+def check_positions(tol: float = 1e-6) -> list[dict]:
+    """
+    يقارن دفتر المراكز بإعادة تشغيل كاملة لجدول trades.
+    يرجّع قائمة الفروقات (فارغة = متسق).
     """
-    conn = _conn(); c = conn.cursor()
-    # صافي الكمية
-    c.execute("""
-      SELECT symbol,
-             SUM(CASE WHEN side='buy' THEN qty ELSE -qty END) as net_qty
-      FROM trades
-      GROUP BY symbol
-      HAVING net_qty > 0
-    """)
-    rows = c.fetchall()
-    result = []
-    for sym, net_qty in rows:
-        # متوسط تكلفة للشراء فقط (وزني)
-        cur = conn.cursor()
-        cur.execute("SELECT qty, price FROM trades WHERE symbol=? AND side='buy'", (sym,))
-        buys = cur.fetchall()
-        cost_val = sum(q*qprice for q, qprice in buys)
-        qty_sum = sum(q for q, _ in buys)
-        avg_cost = (cost_val / qty_sum) if qty_sum else 0.0
-        result.append({"symbol": sym, "net_qty": int(net_qty), "avg_cost": float(avg_cost)})
-    conn.close()
-    return result
+    with db.read() as conn:
+        conn.execute("BEGIN")
+        expected = {sym: vals[:3] for sym, vals in _replay_positions(conn).items()}
+        actual = {
+            r[0]: (int(r[1]), float(r[2]), float(r[3]))
+            for r in conn.execute("SELECT symbol, net_qty, avg_cost, realized_pnl FROM positions")
+        }
+    issues = []
+    for sym in sorted(set(expected) | set(actual)):
+        exp, act = expected.get(sym), actual.get(sym)
+        if exp is None or act is None or exp[0] != act[0] or any(
+            abs(a - b) > tol for a, b in zip(exp[1:], act[1:])
+        ):
+            issues.append({"symbol": sym, "expected": exp, "actual": act})
+    return issues
 
 def sum_buys_sells():
-    conn = _conn(); c = conn.cursor()
-    c.execute("SELECT COALESCE(SUM(qty*price),0) FROM trades WHERE side='buy'")
-    buys = c.fetchone()[0]
-    c.execute("SELECT COALESCE(SUM(qty*price),0) FROM trades WHERE side='sell'")
-    sells = c.fetchone()[0]
-    conn.close()
-    return float(buys), float(sells)
+    """
+    (إجمالي المشتريات, إجمالي المبيعات) من المجاميع الجارية.
+    """
+    return _ledger.totals()
+
+def get_cash() -> float:
+    buys, sells = sum_buys_sells()
+    return settings.BASE_CAPITAL - buys + sells
+
+# ===== المجاميع الجارية (جدول trade_totals، صف واحد) =====
+def _read_totals(conn) -> tuple[float, float]:
+    row = conn.execute("SELECT buy_notional, sell_notional FROM trade_totals WHERE id=1").fetchone()
+    return (float(row[0]), float(row[1])) if row else (0.0, 0.0)
+
+def _write_totals(conn, totals: tuple[float, float], trade_id: int):
+    # REAL في SQLite هو double كامل: لا يتراكم خطأ من التخزين
+    conn.execute(
+        "INSERT INTO trade_totals(id,buy_notional,sell_notional,last_trade_id) VALUES (1,?,?,?) "
+        "ON CONFLICT(id) DO UPDATE SET buy_notional=excluded.buy_notional, "
+        "sell_notional=excluded.sell_notional, last_trade_id=excluded.last_trade_id",
+        (float(totals[0]), float(totals[1]), int(trade_id))
+    )
+
+def _add_to_totals(totals: tuple[float, float], side: str, notional: float) -> tuple[float, float]:
+    buys, sells = totals
+    return (buys + notional, sells) if side == "buy" else (buys, sells + notional)
+
+def _recompute_totals(conn) -> tuple[tuple[float, float], int]:
+    totals, last_id = (0.0, 0.0), 0
+    for trade_id, side, qty, price in conn.execute("SELECT id, side, qty, price FROM trades ORDER BY id"):
+        totals = _add_to_totals(totals, side, int(qty) * float(price))
+        last_id = trade_id
+    return totals, last_id
+
+def rebuild_totals() -> tuple[float, float]:
+    """
+    يعيد حساب المجاميع الجارية من كامل جدول trades (ترحيل أو إصلاح).
+    """
+    with db.transaction(immediate=True) as conn:
+        totals, last_id = _recompute_totals(conn)
+        _write_totals(conn, totals, last_id)
+    _ledger.invalidate()
+    return totals
+
+def check_totals(tol: float = 1e-6) -> list[dict]:
+    """
+    يقارن المجاميع الجارية بإعادة حساب كاملة. يرجّع الفروقات (فارغة = متسق).
+    """
+    with db.read() as conn:
+        conn.execute("BEGIN")
+        expected, _ = _recompute_totals(conn)
+        actual = _read_totals(conn)
+    issues = []
+    for name, exp, act in zip(("buy_notional", "sell_notional"), expected, actual):
+        if abs(exp - act) > tol * max(1.0, abs(exp)):
+            issues.append({"total": name, "expected": exp, "actual": act})
+    return issues
 
 # ===== watchlist =====
 def get_watchlist() -> list[str]:
-    raw = get_state("watchlist", "[]")
-    try: return json.loads(raw)
-    except: return []
+    return list(_hot.get("watchlist", ()) or ())
 
 def set_watchlist(symbols: list[str]):
     set_state("watchlist", json.dumps(symbols))
+    events.publish(events.WatchlistChanged(tuple(symbols)))
+
+# ===== حالة المؤشرات المتدفقة =====
+def load_indicator_states() -> dict[str, list]:
+    with db.read() as conn:
+        rows = conn.execute("SELECT key, state FROM indicator_state").fetchall()
+    out = {}
+    for r in rows:
+        try: out[r["key"]] = json.loads(r["state"])
+        except ValueError: continue
+    return out
+
+def save_indicator_states(states: dict[str, list]):
+    if not states:
+        return
+    with db.transaction(immediate=True) as c:
+        c.executemany(
+            "INSERT INTO indicator_state(key,state) VALUES(?,?) "
+            "ON CONFLICT(key) DO UPDATE SET state=excluded.state, updated_ts=CURRENT_TIMESTAMP",
+            [(k, json.dumps(v)) for k, v in states.items()]
+        )
+
+# ===== منع تكرار الإنذارات (webhook_dedup) =====
+def dedup_claim(key: str, now: float, ttl_s: float, pending_s: float) -> tuple[str, int | None, str | None]:
+    """
+    يحجز مفتاح الإنذار ذريًا بين العمّال. يرجّع ("claimed"|"pending"|"done", status, result).
+    الحجز المعلّق أقدم من pending_s (عامل توقف أثناء التنفيذ) يُعاد حجزه.
+    """
+    with db.transaction(immediate=True) as c:
+        row = c.execute("SELECT ts, status, result FROM webhook_dedup WHERE key=?", (key,)).fetchone()
+        if row and row[0] > now - ttl_s:
+            if row[1] is not None:
+                return "done", row[1], row[2]
+            if row[0] > now - pending_s:
+                return "pending", None, None
+        c.execute("INSERT OR REPLACE INTO webhook_dedup(key,ts,status,result) VALUES (?,?,NULL,NULL)", (key, now))
+    return "claimed", None, None
+
+def dedup_get(key: str) -> tuple[bool, int | None, str | None]:
+    """
+    (موجود؟, status, result). status = None يعني أن التنفيذ الأول ما زال جاريًا.
+    """
+    with db.read() as conn:
+        row = conn.execute("SELECT status, result FROM webhook_dedup WHERE key=?", (key,)).fetchone()
+    return (True, row[0], row[1]) if row else (False, None, None)
+
+def dedup_complete(key: str, status: int, result: str):
+    db.connection().execute("UPDATE webhook_dedup SET status=?, result=? WHERE key=?", (status, result, key))
+
+def dedup_release(key: str):
+    db.connection().execute("DELETE FROM webhook_dedup WHERE key=? AND status IS NULL", (key,))
+
+def dedup_prune(now: float, ttl_s: float, max_entries: int) -> int:
+    """
+    يحذف المنتهي، ثم الأقدم إن تجاوز الجدول max_entries. يرجّع عدد المحذوف.
+    """
+    with db.transaction(immediate=True) as c:
+        removed = c.execute("DELETE FROM webhook_dedup WHERE ts<?", (now - ttl_s,)).rowcount
+        removed += c.execute(
+            "DELETE FROM webhook_dedup WHERE key IN "
+            "(SELECT key FROM webhook_dedup ORDER BY ts DESC LIMIT -1 OFFSET ?)", (max(0, int(max_entries)),)
+        ).rowcount
+    return removed
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="bot.db maintenance")
+    parser.add_argument("command", choices=["rebuild-positions", "check-positions", "rebuild-totals", "check-totals"])
+    args = parser.parse_args()
+
+    init_db()
+    if args.command == "rebuild-positions":
+        print(f"rebuilt {rebuild_positions()} symbols")
+    elif args.command == "rebuild-totals":
+        buys, sells = rebuild_totals()
+        print(f"rebuilt totals: buy_notional={buys:.2f} sell_notional={sells:.2f}")
+    else:
+        if args.command == "check-positions":
+            problems, label = check_positions(), "positions ledger"
+        else:
+            problems, label = check_totals(), "trade totals"
+        for p in problems:
+            print(json.dumps(p))
+        print(f"{label} OK" if not problems else f"{len(problems)} mismatches")
+        raise SystemExit(1 if problems else 0)
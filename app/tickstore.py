@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+from .config import settings
+
+TICK_DTYPE = np.dtype([("ts", "<f8"), ("price", "<f8")])
+BAR_DTYPE = np.dtype([("ts", "<f8"), ("open", "<f8"), ("high", "<f8"), ("low", "<f8"),
+                      ("close", "<f8"), ("ticks", "<i8")])
+SUFFIX = ".ticks"
+
+_SAFE = re.compile(r"[^A-Z0-9._^=-]")
+
+
+class TickStore:
+    """
+    ملف لكل رمز بسجلات ثابتة (ts, price) من 16 بايت؛ الكتابة O_APPEND آمنة بين العمّال،
+    والقراءة عبر np.memmap بلا نسخ. عدة عمّال قد يكتبون تيكات بغير ترتيبها الزمني،
+    فالقراءة تتحقق من الترتيب وترتّب نسخة عند الحاجة قبل البحث الثنائي.
+    """
+
+    def __init__(self, root: str, max_open: int = 256):
+        self.root = root
+        self.max_open = max(1, int(max_open))
+        self._lock = threading.Lock()
+        self._fds: dict[str, int] = {}
+        # symbol -> (الربط، السجلات مرتبة حسب ts: الربط نفسه أو نسخة مرتبة)
+        self._maps: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+        self._pid = os.getpid()
+        self._stats = dict.fromkeys(("appended", "errors", "reordered"), 0)
+
+    def path(self, symbol: str) -> str:
+        # الرموز تأتي من التنبيهات والاستعلامات: لا تخرج أبدًا عن root
+        return os.path.join(self.root, _SAFE.sub("_", symbol.strip().upper()) + SUFFIX)
+
+    def _fd(self, symbol: str) -> int:
+        if self._pid != os.getpid():  # عامل منسوخ بـ fork: واصفات خاصة به
+            self._fds, self._maps, self._pid = {}, {}, os.getpid()
+        fd = self._fds.get(symbol)
+        if fd is None:
+            if len(self._fds) >= self.max_open:
+                os.close(self._fds.pop(next(iter(self._fds))))
+            os.makedirs(self.root, exist_ok=True)
+            fd = self._fds[symbol] = os.open(self.path(symbol), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        return fd
+
+    def append(self, symbol: str, price: float, ts: float | None = None) -> None:
+        self.append_many(symbol, np.array([(time.time() if ts is None else ts, price)], dtype=TICK_DTYPE))
+
+    def append_many(self, symbol: str, records: np.ndarray) -> None:
+        """
+        سجلات TICK_DTYPE مرتبة زمنيًا في كتابة واحدة.
+        """
+        data = np.ascontiguousarray(records, dtype=TICK_DTYPE).tobytes()
+        with self._lock:
+            try:
+                os.write(self._fd(symbol.strip().upper()), data)
+                self._stats["appended"] += len(records)
+            except OSError:
+                self._stats["errors"] += 1
+                raise
+
+    def _map(self, symbol: str) -> np.ndarray:
+        path = self.path(symbol)
+        try:
+            n = os.path.getsize(path) // TICK_DTYPE.itemsize
+        except FileNotFoundError:
+            return np.empty(0, dtype=TICK_DTYPE)
+        with self._lock:
+            entry = self._maps.pop(symbol, None)
+            if entry is None or len(entry[0]) != n:
+                # الملف كبر منذ آخر قراءة: نربط السجلات الكاملة فقط
+                mm = np.memmap(path, dtype=TICK_DTYPE, mode="r", shape=(n,)) if n else \
+                    np.empty(0, dtype=TICK_DTYPE)
+                # ما كان مرتبًا يكفي فحص الجزء الجديد (مع آخر سجل قبله)
+                start = len(entry[0]) - 1 if entry is not None and entry[1] is entry[0] else 0
+                ts = mm["ts"][max(start, 0):]
+                if len(ts) < 2 or bool((ts[1:] >= ts[:-1]).all()):
+                    entry = (mm, mm)
+                else:
+                    entry = (mm, mm[np.argsort(mm["ts"], kind="stable")])
+                    self._stats["reordered"] += 1
+            # LRU بحد الواصفات نفسه (المقاطع المُعطاة سابقًا تحتفظ بربطها)
+            self._maps[symbol] = entry
+            if len(self._maps) > self.max_open:
+                del self._maps[next(iter(self._maps))]
+        return entry[1]
+
+    def ticks(self, symbol: str, start: float | None = None, end: float | None = None) -> np.ndarray:
+        """
+        التيكات بين start و end (بحث ثنائي على ts)، مقطع للقراءة فقط من الملف أو من نسخته المرتبة.
+        """
+        mm = self._map(symbol.strip().upper())
+        ts = mm["ts"]
+        i = 0 if start is None else int(np.searchsorted(ts, start, side="left"))
+        j = len(mm) if end is None else int(np.searchsorted(ts, end, side="right"))
+        return mm[i:j]
+
+    def last(self, symbol: str) -> tuple[float, float] | None:
+        mm = self._map(symbol.strip().upper())
+        return (float(mm["ts"][-1]), float(mm["price"][-1])) if len(mm) else None
+
+    def ohlc(self, symbol: str, interval_s: float, start: float | None = None,
+             end: float | None = None) -> np.ndarray:
+        """
+        شموع OHLC بطول interval_s ثانية؛ الفترات بلا تيكات تُحذف.
+        """
+        if interval_s <= 0:
+            raise ValueError("interval_s must be > 0")
+        t = self.ticks(symbol, start, end)
+        if not len(t):
+            return np.empty(0, dtype=BAR_DTYPE)
+        ts, price = t["ts"], t["price"]
+        bucket = np.floor(ts / interval_s)
+        starts = np.flatnonzero(np.concatenate(([True], bucket[1:] != bucket[:-1])))
+        ends = np.append(starts[1:], len(t)) - 1
+        bars = np.empty(len(starts), dtype=BAR_DTYPE)
+        bars["ts"] = bucket[starts] * interval_s
+        bars["open"] = price[starts]
+        bars["high"] = np.maximum.reduceat(price, starts)
+        bars["low"] = np.minimum.reduceat(price, starts)
+        bars["close"] = price[ends]
+        bars["ticks"] = ends - starts + 1
+        return bars
+
+    def symbols(self) -> list[str]:
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return []
+        return sorted(n[:-len(SUFFIX)] for n in names if n.endswith(SUFFIX))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "root": self.root, "open_files": len(self._fds),
+                    "open_maps": len(self._maps)}
+
+
+_store = TickStore(settings.TICK_STORE_DIR) if settings.TICK_STORE_DIR else None
+
+
+def enabled() -> bool:
+    return _store is not None
+
+
+def store() -> TickStore | None:
+    return _store
+
+
+def record(symbol: str, price: float) -> None:
+    """
+    مستمع أسعار لـ app.quotes: تيك لكل سعر جُلب للتو.
+    """
+    if _store is not None and price > 0:
+        _store.append(symbol, price)
@@ -0,0 +1,74 @@
+"""
+Background pre-warming of the dependencies that are imported lazily.
+
+``yfinance`` (with pandas) and ``requests`` are only imported on first use, so
+a worker boots and starts answering without them. Once the app is up,
+``start()`` imports the modules this configuration will actually need on a
+daemon thread, which keeps the first quote fetch or Telegram send from paying
+for them. Nothing is loaded for a disabled feature: the fake quote provider
+never pulls in yfinance, and without a bot token requests stays unloaded.
+"""
+
+from __future__ import annotations
+
+import importlib
+import logging
+import sys
+import threading
+import time
+
+from . import notify, quotes
+
+logger = logging.getLogger(__name__)
+
+_thread: threading.Thread | None = None
+_timings: dict[str, float] = {}
+
+
+def wanted() -> list[str]:
+    modules = []
+    names = quotes.provider_names()
+    if {"yahoo_unofficial", "yahoo"} & set(names):
+        modules.append("yfinance")
+    if notify.enabled() or {"finnhub", "alpha_vantage", "twelve_data"} & set(names):
+        modules.append("requests")
+    return modules
+
+
+def _run(modules: list[str]) -> None:
+    for name in modules:
+        if name in sys.modules:
+            continue
+        t0 = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except Exception:
+            logger.exception("pre-warm import failed", extra={"import_name": name})
+            continue
+        _timings[name] = round(time.perf_counter() - t0, 3)
+    if "requests" in sys.modules and notify.enabled():
+        notify.session()
+    if _timings:
+        logger.info("pre-warmed imports", extra={f"{m}_s": t for m, t in _timings.items()})
+
+
+def start(modules: list[str] | None = None) -> threading.Thread | None:
+    """
+    Import ``modules`` (default: ``wanted()``) on a daemon thread. No-op if
+    everything is already loaded or a warm-up is running.
+    """
+    global _thread
+    modules = [m for m in (wanted() if modules is None else modules) if m not in sys.modules]
+    if not modules or (_thread is not None and _thread.is_alive()):
+        return None
+    _thread = threading.Thread(target=_run, args=(modules,), name="prewarm", daemon=True)
+    _thread.start()
+    return _thread
+
+
+def stats() -> dict:
+    return {
+        "running": _thread is not None and _thread.is_alive(),
+        "loaded": {m: m in sys.modules for m in ("yfinance", "pandas", "requests")},
+        "seconds": dict(_timings),
+    }
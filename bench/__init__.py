@@ -0,0 +1,6 @@
+"""
+Benchmarks for the FastAPI backend.
+
+Each module is runnable on its own (``python -m bench.<name>``) against a
+throwaway SQLite file, so results never touch the real ``bot.db``.
+"""
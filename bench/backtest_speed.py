@@ -0,0 +1,72 @@
+"""
+Backtest throughput on synthetic minute bars.
+
+Writes ``--symbols`` random-walk series of ``--bars`` one-minute bars to a
+temporary directory (Parquet when pyarrow is installed, CSV otherwise) and
+times ``app.backtest.run_backtest`` over them::
+
+    python -m bench.backtest_speed --symbols 100 --bars 100000 --workers 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app.backtest import run_backtest
+
+
+def write_synthetic(directory: Path, symbols: int, bars: int, seed: int = 7) -> str:
+    try:
+        import pyarrow  # noqa: F401
+        suffix = ".parquet"
+    except ImportError:
+        suffix = ".csv"
+    rng = np.random.default_rng(seed)
+    start = np.datetime64("2020-01-02T14:30", "s").astype(np.int64)
+    ts = start + 60 * np.arange(bars, dtype=np.int64)
+    for i in range(symbols):
+        close = np.round(50.0 * np.exp(np.cumsum(rng.normal(0.0, 0.0008, bars))), 4)
+        frame = pd.DataFrame({"ts": ts, "open": close, "high": close, "low": close,
+                              "close": close, "volume": 100})
+        path = directory / f"S{i:04d}{suffix}"
+        if suffix == ".parquet":
+            frame.to_parquet(path, index=False)
+        else:
+            frame.to_csv(path, index=False)
+    return suffix
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--symbols", type=int, default=50)
+    parser.add_argument("--bars", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="print machine-readable output")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        t0 = time.perf_counter()
+        fmt = write_synthetic(Path(tmp), args.symbols, args.bars)
+        prep = time.perf_counter() - t0
+        report = run_backtest(tmp, workers=args.workers)
+    result = {
+        "symbols": args.symbols,
+        "bars_per_symbol": args.bars,
+        "format": fmt,
+        "prepare_s": round(prep, 2),
+        "backtest_s": report["elapsed_s"],
+        "bars_per_s": report["bars_per_s"],
+        "trades": report["portfolio"].get("trades"),
+    }
+    print(json.dumps(result, indent=None if not args.json else 2))
+
+
+if __name__ == "__main__":
+    main()
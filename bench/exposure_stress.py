@@ -0,0 +1,157 @@
+"""
+Exposure cap under concurrent buys from several worker processes.
+
+Every process imports the app against one shared throwaway database (what
+``uvicorn --workers N`` does). Each process then fires buys from a pool of
+threads through ``router._execute`` until the demand is many times the cap.
+``legacy`` replays the old read-exposure / submit / log sequence. It should
+overshoot. ``atomic`` is the live reserve-then-record path, and it must stop
+at or below the cap::
+
+    python -m bench.exposure_stress --processes 4 --threads 8 --orders 400
+
+The exit code is 1 if the atomic run ends above the cap or the totals
+disagree with the trades table.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+CAPITAL = 100_000.0
+EXPOSURE_PCT = 0.1  # cap = 10_000
+PRICE = 10.0
+QTY = 7  # 70 per order: the cap is not a multiple of it
+
+
+def _env(db_path: str) -> None:
+    os.environ.update(
+        DB_PATH=db_path,
+        QUOTE_PROVIDER="fake",
+        BASE_CAPITAL=str(CAPITAL),
+        MAX_PORTFOLIO_EXPOSURE_PCT=str(EXPOSURE_PCT),
+        TELEGRAM_BOT_TOKEN="",
+        TELEGRAM_CHAT_ID="",
+    )
+
+
+def _legacy_execute(r, alert) -> None:
+    # the pre-reservation sequence: check and record in separate transactions
+    from app.risk import within_exposure
+    from app.store import get_exposure_value, log_trade
+
+    exposure_now = get_exposure_value()
+    if not within_exposure(exposure_now, alert.qty_shares * alert.price):
+        raise r.HTTPException(status_code=400, detail="Exposure limit reached")
+    order = r.broker.submit_order(alert.symbol, alert.side, alert.qty_shares, price=alert.price)
+    log_trade(alert.symbol, alert.side, order["filled_qty"], order["avg_price"], "")
+
+
+def _worker(db_path: str, mode: str, threads: int, orders: int, start: float) -> dict:
+    _env(db_path)
+    from app import router as r
+
+    run = r._execute if mode == "atomic" else lambda a: _legacy_execute(r, a)
+    symbols = [f"S{i}" for i in range(8)]
+
+    def one(i: int) -> bool:
+        alert = r.Alert(symbol=symbols[i % len(symbols)], side="buy", qty_shares=QTY, price=PRICE)
+        try:
+            run(alert)
+            return True
+        except r.HTTPException as exc:
+            if exc.status_code != 400:
+                raise
+            return False
+
+    while time.time() < start:  # all processes start firing together
+        time.sleep(0.001)
+    with ThreadPoolExecutor(threads) as pool:
+        accepted = sum(pool.map(one, range(orders)))
+    return {"accepted": accepted, "rejected": orders - accepted}
+
+
+def _init(db_path: str) -> None:
+    _env(db_path)
+    from app import store
+    store.init_db()
+
+
+def _measure(db_path: str) -> dict:
+    _env(db_path)
+    from app import store
+    with store.db.read() as conn:
+        notional, n_trades = conn.execute(
+            "SELECT COALESCE(SUM(qty*price), 0), COUNT(*) FROM trades WHERE side='buy'"
+        ).fetchone()
+    exposure = store.get_exposure_value()
+    return {
+        "trades": n_trades,
+        "notional": notional,
+        "exposure": exposure,
+        "reserved_left": store.get_reserved_exposure(),
+        "totals_consistent": not store.check_totals() and abs(notional - exposure) < 1e-6,
+    }
+
+
+def run(mode: str, processes: int, threads: int, orders: int) -> dict:
+    # the parent never imports the app: settings (DB_PATH) are fixed at import time
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "stress.db")
+        with mp.get_context("spawn").Pool(processes) as pool:
+            pool.apply(_init, (db_path,))
+            start = time.time() + 3.0  # time for every spawned interpreter to import the app
+            results = pool.starmap(_worker, [(db_path, mode, threads, orders, start)] * processes)
+            wall = time.time() - start
+            m = pool.apply(_measure, (db_path,))
+
+    cap = CAPITAL * EXPOSURE_PCT
+    return {
+        "mode": mode,
+        "processes": processes,
+        "threads": threads,
+        "orders": processes * orders,
+        "accepted": sum(r["accepted"] for r in results),
+        "trades": m["trades"],
+        "cap": cap,
+        "exposure": round(m["exposure"], 2),
+        "overshoot": round(max(0.0, m["notional"] - cap), 2),
+        "max_possible": int(cap // (QTY * PRICE)),
+        "reserved_left": round(m["reserved_left"], 2),
+        "totals_consistent": m["totals_consistent"],
+        "wall_s": round(wall, 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--orders", type=int, default=400, help="buys per process")
+    parser.add_argument("--mode", choices=("atomic", "legacy", "both"), default="both")
+    parser.add_argument("--json", action="store_true", help="print machine-readable output")
+    args = parser.parse_args()
+
+    modes = ("legacy", "atomic") if args.mode == "both" else (args.mode,)
+    results = [run(m, args.processes, args.threads, args.orders) for m in modes]
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for r in results:
+            print(f"{r['mode']:<7} {r['processes']}x{r['threads']} orders={r['orders']} accepted={r['accepted']} "
+                  f"(max {r['max_possible']}) exposure={r['exposure']:.2f}/{r['cap']:.2f} "
+                  f"overshoot={r['overshoot']:.2f} reserved_left={r['reserved_left']:.2f} "
+                  f"consistent={r['totals_consistent']}")
+    atomic = [r for r in results if r["mode"] == "atomic"]
+    if any(r["overshoot"] > 0 or not r["totals_consistent"] or r["reserved_left"] for r in atomic):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Cost of a log call on the calling thread: synchronous handler vs the queued pipeline.
+
+stdout is replaced by a stream whose writes take ``--write-ms`` (a slow or
+blocked pipe). Each mode logs ``--records`` structured records from the main
+thread and reports the per-call latency the caller pays, plus what the queued
+pipeline dropped or sampled out::
+
+    python -m bench.logging_pipeline --records 20000 --write-ms 0.2
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import logging
+import statistics
+import sys
+import time
+
+from app.core import logging as core_logging
+
+
+class SlowStream(io.TextIOBase):
+    def __init__(self, write_s: float):
+        self.write_s = write_s
+        self.lines = 0
+
+    def write(self, s: str) -> int:
+        if self.write_s:
+            time.sleep(self.write_s)
+        self.lines += s.count("\n")
+        return len(s)
+
+
+def _reset() -> None:
+    core_logging.shutdown_logging()
+    root = logging.getLogger()
+    for h in list(root.handlers):
+        root.removeHandler(h)
+
+
+def run(mode: str, records: int, write_s: float, queue_max: int, sampling: str) -> dict:
+    _reset()
+    stream = SlowStream(write_s)
+    stdout, sys.stdout = sys.stdout, stream
+    try:
+        if mode == "sync":
+            handler = logging.StreamHandler(stream)
+            handler.setFormatter(core_logging.JsonFormatter())
+            logging.basicConfig(level="INFO", handlers=[handler])
+        else:
+            core_logging.configure_logging("INFO", queue_max, sampling)
+        log = logging.getLogger("app.decisions")
+        samples = []
+        t_start = time.perf_counter()
+        for i in range(records):
+            t0 = time.perf_counter()
+            log.info("hold", extra={"symbol": "AAPL", "reason": "weak signal", "confidence": 0.2, "i": i})
+            samples.append(time.perf_counter() - t0)
+        caller_s = time.perf_counter() - t_start
+        stats = core_logging.logging_stats()
+        _reset()  # drains the queue
+        written = stream.lines
+    finally:
+        sys.stdout = stdout
+    samples.sort()
+    return {
+        "mode": mode,
+        "records": records,
+        "caller_total_s": round(caller_s, 3),
+        "p50_us": round(statistics.median(samples) * 1e6, 1),
+        "p99_us": round(samples[int(len(samples) * 0.99)] * 1e6, 1),
+        "max_us": round(samples[-1] * 1e6, 1),
+        "written": written,
+        "dropped": stats.get("dropped", 0),
+        "sampled_out": sum(stats.get("sampled_out", {}).values()),
+        "serializer": "orjson" if core_logging.orjson is not None else "json",
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=20_000)
+    parser.add_argument("--write-ms", type=float, default=0.2, help="simulated cost of one stdout write")
+    parser.add_argument("--queue-max", type=int, default=core_logging.DEFAULT_QUEUE_MAX)
+    parser.add_argument("--sampling", default="", help='e.g. "app.decisions=100/s"')
+    parser.add_argument("--json", action="store_true", help="print machine-readable output")
+    args = parser.parse_args()
+
+    results = [run(m, args.records, args.write_ms / 1000, args.queue_max, args.sampling)
+               for m in ("sync", "queued")]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for r in results:
+        print(f"{r['mode']:<7} caller {r['caller_total_s']:.3f}s p50={r['p50_us']}us p99={r['p99_us']}us "
+              f"max={r['max_us']}us written={r['written']} dropped={r['dropped']} "
+              f"sampled_out={r['sampled_out']} ({r['serializer']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Order operations per second through ``app.matching.MatchingEngine``.
+
+Replays a seeded random mix of limit/market/stop submits, cancels, replaces
+and quote ticks over a handful of symbols, and reports the throughput of each
+operation and of the whole mix::
+
+    python -m bench.matching --ops 500000 --symbols 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+
+from app.matching import MatchingEngine
+
+DEFAULT_MIX = {"limit": 50, "market": 5, "stop": 5, "cancel": 25, "replace": 10, "quote": 5}
+
+
+def _plan(ops: int, symbols: list[str], mix: dict[str, int], seed: int) -> list[tuple]:
+    rng = random.Random(seed)
+    kinds = rng.choices(list(mix), weights=list(mix.values()), k=ops)
+    mid = {s: 100.0 for s in symbols}
+    plan = []
+    for kind in kinds:
+        sym = rng.choice(symbols)
+        side = "buy" if rng.random() < 0.5 else "sell"
+        if kind == "quote":
+            mid[sym] = max(1.0, mid[sym] * (1 + rng.gauss(0, 0.001)))
+            plan.append((kind, sym, round(mid[sym], 2)))
+        elif kind == "limit":
+            # mostly passive, sometimes marketable: the book builds up and trades
+            off = rng.randint(-3, 30) * 0.01
+            price = mid[sym] - off if side == "buy" else mid[sym] + off
+            plan.append((kind, sym, side, rng.randint(1, 500), round(price, 2)))
+        elif kind == "stop":
+            off = rng.randint(5, 50) * 0.01
+            plan.append((kind, sym, side, rng.randint(1, 200), round(mid[sym] + (off if side == "buy" else -off), 2)))
+        elif kind == "market":
+            plan.append((kind, sym, side, rng.randint(1, 300)))
+        else:
+            plan.append((kind, rng.random(), rng.randint(1, 500)))
+    return plan
+
+
+def run(ops: int, n_symbols: int, depth: int, seed: int) -> dict:
+    symbols = [f"S{i:03d}" for i in range(n_symbols)]
+    plan = _plan(ops, symbols, DEFAULT_MIX, seed)
+    engine = MatchingEngine(tick_size=0.01, depth_per_quote=depth)
+    for s in symbols:
+        engine.on_quote(s, 100.0)
+
+    spent = dict.fromkeys(DEFAULT_MIX, 0.0)
+    counts = dict.fromkeys(DEFAULT_MIX, 0)
+    fills = 0
+    ids: list[int] = []
+    submit, cancel, replace, on_quote = engine.submit, engine.cancel, engine.replace, engine.on_quote
+    clock = time.perf_counter
+    t_all = clock()
+    for step in plan:
+        kind = step[0]
+        t0 = clock()
+        if kind == "limit":
+            oid, f = submit(step[1], step[2], step[3], "limit", limit_price=step[4])
+            ids.append(oid)
+        elif kind == "market":
+            oid, f = submit(step[1], step[2], step[3])
+        elif kind == "stop":
+            oid, f = submit(step[1], step[2], step[3], "stop", stop_price=step[4])
+            ids.append(oid)
+        elif kind == "quote":
+            f = on_quote(step[1], step[2])
+        elif not ids:
+            continue
+        else:
+            oid = ids[int(step[1] * len(ids))]
+            f = ()
+            if kind == "cancel":
+                cancel(oid)
+            else:
+                try:
+                    new, f = replace(oid, qty=step[2])
+                except (KeyError, ValueError):
+                    pass  # already filled/cancelled, or below the filled quantity
+        spent[kind] += clock() - t0
+        counts[kind] += 1
+        fills += len(f)
+    wall = clock() - t_all
+
+    return {
+        "ops": ops,
+        "symbols": n_symbols,
+        "depth_per_quote": depth,
+        "ops_per_s": round(ops / wall),
+        "fills": fills,
+        "per_op": {k: {"count": counts[k], "ops_per_s": round(counts[k] / spent[k]) if spent[k] else None,
+                       "mean_us": round(spent[k] / counts[k] * 1e6, 2) if counts[k] else None}
+                   for k in DEFAULT_MIX},
+        "open_orders": len(engine.open_orders()),
+        "engine": engine.stats(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--ops", type=int, default=200_000)
+    parser.add_argument("--symbols", type=int, default=8)
+    parser.add_argument("--depth", type=int, default=1000, help="shares per quote and side (0 = unlimited)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true", help="print machine-readable output")
+    args = parser.parse_args()
+
+    result = run(args.ops, args.symbols, args.depth, args.seed)
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(f"{result['ops']} ops over {result['symbols']} symbols: {result['ops_per_s']:,} ops/s, "
+          f"{result['fills']} fills, {result['open_orders']} orders still open")
+    for kind, r in result["per_op"].items():
+        if r["count"]:
+            print(f"  {kind:<8} n={r['count']:>7}  {r['mean_us']:>7.2f}us  {r['ops_per_s']:>10,} ops/s")
+
+
+if __name__ == "__main__":
+    main()
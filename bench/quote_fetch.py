@@ -0,0 +1,55 @@
+"""
+Wall time to price a watchlist: one-by-one loop vs ``QuoteProvider.fetch_many``.
+
+Uses ``FakeQuoteProvider`` with a simulated round-trip latency, so no network
+is needed::
+
+    python -m bench.quote_fetch --symbols 50 --latency-ms 40
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+
+from app.quotes import FakeQuoteProvider
+
+
+def _wall(fn) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return round((time.perf_counter() - t0) * 1000.0, 2)
+
+
+def run(n_symbols: int, latency_ms: float) -> dict[str, float]:
+    symbols = [f"SYM{i:04d}" for i in range(n_symbols)]
+    latency = latency_ms / 1000.0
+    pooled = FakeQuoteProvider(latency_s=latency)
+    bulk = FakeQuoteProvider(latency_s=latency, bulk=True)
+    return {
+        "symbols": n_symbols,
+        "latency_ms": latency_ms,
+        "sequential_ms": _wall(lambda: [pooled.fetch_last(s) for s in symbols]),
+        "thread_pool_ms": _wall(lambda: pooled.fetch_many(symbols)),
+        "bulk_endpoint_ms": _wall(lambda: bulk.fetch_many(symbols)),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--symbols", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=40.0)
+    parser.add_argument("--json", action="store_true", help="print machine-readable output")
+    args = parser.parse_args()
+
+    result = run(args.symbols, args.latency_ms)
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    for key, value in result.items():
+        print(f"{key:<18} {value}")
+
+
+if __name__ == "__main__":
+    main()
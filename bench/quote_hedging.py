@@ -0,0 +1,118 @@
+"""
+Tail latency of a quote fetch: one provider vs a hedged ``ProviderChain``.
+
+Two fake providers with a heavy-tailed latency: mostly ``--base-ms``, but
+``--stall-pct`` of calls stall for ``--stall-ms`` and ``--error-pct`` raise.
+Sequential single-symbol fetches (the ``get_last_price`` path, cache
+bypassed) are timed three ways:
+
+- the primary alone, with no timeout;
+- a chain of the primary alone, with only the timeout;
+- a chain of primary + backup, with hedging.
+
+::
+
+    python -m bench.quote_hedging --fetches 400 --stall-pct 3 --stall-ms 1500
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import random
+import statistics
+import threading
+import time
+
+from app.quote_chain import ProviderChain
+from app.quotes import FakeQuoteProvider
+
+
+class FlakyProvider(FakeQuoteProvider):
+    def __init__(self, name: str, base_s: float, stall_s: float, stall_p: float, error_p: float, seed: int):
+        super().__init__(seed=seed)
+        self.name = name
+        self.base_s, self.stall_s, self.stall_p, self.error_p = base_s, stall_s, stall_p, error_p
+        self._jitter = random.Random(seed)
+        self._jitter_lock = threading.Lock()
+
+    def _roundtrip(self) -> None:
+        with self._jitter_lock:
+            self.calls += 1
+            r, jitter = self._jitter.random(), self._jitter.uniform(0.8, 1.2)
+        if r < self.error_p:
+            time.sleep(self.base_s * jitter)
+            raise ConnectionError(f"{self.name}: upstream error")
+        time.sleep(self.stall_s if r < self.error_p + self.stall_p else self.base_s * jitter)
+
+
+def _measure(fetch, fetches: int) -> dict:
+    samples, missing = [], 0
+    for i in range(fetches):
+        sym = f"S{i % 50}"
+        t0 = time.perf_counter()
+        try:
+            price = fetch([sym]).get(sym)
+        except Exception:
+            price = None
+        samples.append(time.perf_counter() - t0)
+        missing += price is None
+    samples.sort()
+    return {
+        "p50_ms": round(statistics.median(samples) * 1000, 1),
+        "p95_ms": round(samples[int(len(samples) * 0.95)] * 1000, 1),
+        "p99_ms": round(samples[int(len(samples) * 0.99)] * 1000, 1),
+        "max_ms": round(samples[-1] * 1000, 1),
+        "unpriced": missing,
+    }
+
+
+def run(args) -> list[dict]:
+    def flaky(name: str, seed: int) -> FlakyProvider:
+        return FlakyProvider(name, args.base_ms / 1000, args.stall_ms / 1000, args.stall_pct / 100,
+                             args.error_pct / 100, seed)
+
+    timeout_s = args.timeout_ms / 1000
+    results = []
+    for label, make in (
+        ("single", lambda: flaky("primary", args.seed)),
+        ("timeout", lambda: ProviderChain([flaky("primary", args.seed)], timeout_s)),
+        ("hedged", lambda: ProviderChain([flaky("primary", args.seed), flaky("backup", args.seed + 1)], timeout_s)),
+    ):
+        provider = make()
+        r = {"mode": label, **_measure(provider.fetch_many, args.fetches)}
+        if isinstance(provider, ProviderChain):
+            r["providers"] = provider.stats()["providers"]
+        results.append(r)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--fetches", type=int, default=400)
+    parser.add_argument("--base-ms", type=float, default=20.0)
+    parser.add_argument("--stall-ms", type=float, default=1500.0)
+    parser.add_argument("--stall-pct", type=float, default=3.0)
+    parser.add_argument("--error-pct", type=float, default=2.0)
+    parser.add_argument("--timeout-ms", type=float, default=1000.0)
+    parser.add_argument("--seed", type=int, default=11)
+    parser.add_argument("--json", action="store_true", help="print machine-readable output")
+    args = parser.parse_args()
+
+    logging.getLogger("app.quote_chain").setLevel(logging.ERROR)  # one line per injected failure otherwise
+    results = run(args)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for r in results:
+        print(f"{r['mode']:<8} p50={r['p50_ms']:>7.1f}ms p95={r['p95_ms']:>7.1f}ms p99={r['p99_ms']:>7.1f}ms "
+              f"max={r['max_ms']:>7.1f}ms unpriced={r['unpriced']}")
+        for p in r.get("providers", ()):
+            print(f"         {p['name']:<8} calls={p['calls']} hedges={p['hedges']} wins={p['wins']} "
+                  f"errors={p['errors']} timeouts={p['timeouts']} skipped={p['skipped']} "
+                  f"state={p['state']} p95={p['p95_ms']}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Cold-start cost of ``import main`` and a boot-time budget check.
+
+Every measurement runs in a fresh interpreter against a throwaway database,
+like a uvicorn worker (re)spawn::
+
+    python -m bench.startup profile --top 25     # python -X importtime, heaviest modules first
+    python -m bench.startup check --budget-ms 900 --runs 5
+
+``check`` exits 1 if the median boot exceeds the budget or if a module that
+must stay lazy (yfinance, pandas, requests) was imported during boot.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+LAZY = ("yfinance", "pandas", "requests")
+
+_BOOT = """
+import sys, time, json
+t0 = time.perf_counter()
+import main
+elapsed = time.perf_counter() - t0
+print(json.dumps({"boot_s": elapsed, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (LAZY,)
+
+
+def _env(tmp: str) -> dict[str, str]:
+    return {
+        **os.environ,
+        "DB_PATH": os.path.join(tmp, "boot.db"),
+        "PYTHONPATH": os.pathsep.join(filter(None, [str(ROOT), os.environ.get("PYTHONPATH")])),
+    }
+
+
+def boot_once() -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        out = subprocess.run([sys.executable, "-c", _BOOT], cwd=ROOT, env=_env(tmp),
+                             capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def profile(top: int) -> list[dict]:
+    """
+    ``-X importtime`` of ``import main``: (module, self ms, cumulative ms), by cumulative time.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=ROOT,
+                             env=_env(tmp), capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line or "cumulative" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|")
+        rows.append({"module": name.strip(), "depth": (len(name) - len(name.lstrip())) // 2,
+                     "self_ms": int(self_us) / 1000, "cumulative_ms": int(cum_us) / 1000})
+    rows.sort(key=lambda r: r["cumulative_ms"], reverse=True)
+    return rows[:top]
+
+
+def check(budget_ms: float, runs: int) -> dict:
+    samples = [boot_once() for _ in range(runs)]
+    boots = sorted(s["boot_s"] * 1000 for s in samples)
+    loaded = sorted({m for s in samples for m in s["loaded"]})
+    median = statistics.median(boots)
+    return {
+        "budget_ms": budget_ms,
+        "runs": runs,
+        "median_ms": round(median, 1),
+        "min_ms": round(boots[0], 1),
+        "max_ms": round(boots[-1], 1),
+        "eagerly_loaded": loaded,
+        "ok": median <= budget_ms and not loaded,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("profile", help="per-module import times of `import main`")
+    p.add_argument("--top", type=int, default=25)
+    c = sub.add_parser("check", help="fail if the median boot exceeds the budget")
+    c.add_argument("--budget-ms", type=float, default=900.0)
+    c.add_argument("--runs", type=int, default=5)
+    for s in (p, c):
+        s.add_argument("--json", action="store_true", help="print machine-readable output")
+    args = parser.parse_args()
+
+    if args.command == "profile":
+        rows = profile(args.top)
+        if args.json:
+            print(json.dumps(rows, indent=2))
+            return
+        for r in rows:
+            print(f"{r['cumulative_ms']:>9.1f}ms {r['self_ms']:>8.1f}ms  {'  ' * r['depth']}{r['module']}")
+        return
+
+    result = check(args.budget_ms, args.runs)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"boot median {result['median_ms']:.1f}ms (min {result['min_ms']:.1f}, max {result['max_ms']:.1f}) "
+              f"over {result['runs']} runs, budget {result['budget_ms']:.0f}ms")
+        if result["eagerly_loaded"]:
+            print(f"imported during boot but should be lazy: {', '.join(result['eagerly_loaded'])}")
+        print("OK" if result["ok"] else "FAIL")
+    raise SystemExit(0 if result["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
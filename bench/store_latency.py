@@ -0,0 +1,102 @@
+"""
+Per-call latency of ``store.log_trade`` and ``store.get_state``.
+
+Compares the original connect/commit/close-per-call access pattern with the
+persistent WAL connections from ``app.db``::
+
+    python -m bench.store_latency --iterations 2000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sqlite3
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+from app import db, store
+
+
+def _legacy_conn(path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _legacy_log_trade(path: Path, symbol, side, qty, price, note=""):
+    conn = _legacy_conn(path); c = conn.cursor()
+    c.execute("INSERT INTO trades(symbol,side,qty,price,note) VALUES (?,?,?,?,?)",
+              (symbol, side, int(qty), float(price), note))
+    conn.commit(); conn.close()
+
+
+def _legacy_get_state(path: Path, key: str, default: str = "") -> str:
+    conn = _legacy_conn(path); c = conn.cursor()
+    c.execute("SELECT val FROM state WHERE key=?", (key,))
+    row = c.fetchone()
+    conn.close()
+    return row[0] if row else default
+
+
+def _time(fn: Callable[[int], object], iterations: int) -> dict[str, float]:
+    samples = []
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        fn(i)
+        samples.append((time.perf_counter() - t0) * 1e6)
+    samples.sort()
+    return {
+        "mean_us": round(statistics.fmean(samples), 2),
+        "p50_us": round(samples[len(samples) // 2], 2),
+        "p99_us": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))], 2),
+    }
+
+
+def run(iterations: int) -> dict[str, dict[str, dict[str, float]]]:
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = Path(tmp) / "legacy.db"
+        db.configure(legacy)
+        store.init_db()
+        db.get_db().close()
+        # الوضع الأصلي: journal_mode=DELETE واتصال جديد لكل استدعاء
+        conn = sqlite3.connect(legacy)
+        conn.execute("PRAGMA journal_mode=DELETE")
+        conn.close()
+        before = {
+            "log_trade": _time(lambda i: _legacy_log_trade(legacy, "AAPL", "buy", 1, 100.0 + i % 7), iterations),
+            "get_state": _time(lambda i: _legacy_get_state(legacy, "kill_switch", "0"), iterations),
+        }
+
+        db.configure(Path(tmp) / "pooled.db")
+        store.init_db()
+        after = {
+            "log_trade": _time(lambda i: store.log_trade("AAPL", "buy", 1, 100.0 + i % 7), iterations),
+            "get_state": _time(lambda i: store.get_state("kill_switch", "0"), iterations),
+        }
+        db.get_db().close()
+    return {"before": before, "after": after}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--json", action="store_true", help="print machine-readable output")
+    args = parser.parse_args()
+
+    result = run(args.iterations)
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    for op in ("log_trade", "get_state"):
+        b, a = result["before"][op], result["after"][op]
+        print(f"{op:<10} before p50={b['p50_us']:>9.1f}us p99={b['p99_us']:>9.1f}us | "
+              f"after p50={a['p50_us']:>9.1f}us p99={a['p99_us']:>9.1f}us | "
+              f"x{b['mean_us'] / max(a['mean_us'], 1e-9):.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+"""
+Load test and microbenchmarks for the webhook pipeline, with JSON output.
+
+Runs the FastAPI app in-process (httpx ASGITransport) against
+``FakeQuoteProvider`` and a fake Telegram session. The throwaway database is
+seeded with ``--trades`` historical trades first. Fires a weighted mix of
+endpoints, reports throughput, p50/p99/p999 latency and per-request
+allocation peaks, then runs microbenchmarks of the hot functions::
+
+    python -m bench.suite --trades 100000 --requests 2000 --concurrency 16
+    python -m bench.suite --json --out before.json
+    python -m bench.suite --compare before.json
+
+Seeding 10M trades takes a few minutes (positions and totals are rebuilt by
+replaying every trade, like a migration would).
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ.update(
+    DB_PATH=os.path.join(_tmp.name, "bench.db"),
+    TICK_STORE_DIR=os.path.join(_tmp.name, "ticks"),
+    QUOTE_PROVIDER="fake",
+    BASE_CAPITAL="1e12",
+    MAX_PORTFOLIO_EXPOSURE_PCT="1",
+    TELEGRAM_BOT_TOKEN="bench-token",
+    TELEGRAM_CHAT_ID="1",
+    NOTIFY_RATE_PER_S="1000",
+    WEBHOOK_SECRET="",
+    HMAC_SECRET="",
+)
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+from app import ai, db, notify, quotes, store  # noqa: E402
+
+ENDPOINTS = ("webhook", "webhook-tv", "portfolio", "open-positions")
+DEFAULT_MIX = "webhook=1,webhook-tv=4,portfolio=2,open-positions=2"
+SEED_CHUNK = 50_000
+
+
+class _FakeTelegram:
+    """
+    Stands in for ``requests.Session`` in ``app.notify``: fixed latency, always ok.
+    """
+
+    def __init__(self, latency_s: float):
+        self.latency_s = latency_s
+        self.sent = 0
+
+    def post(self, url, json=None, timeout=None):
+        time.sleep(self.latency_s)
+        self.sent += 1
+        return _FakeResponse()
+
+
+class _FakeResponse:
+    status_code = 200
+    text = '{"ok": true}'
+
+    def raise_for_status(self) -> None:
+        pass
+
+    def json(self) -> dict:
+        return {"ok": True, "result": {}}
+
+
+def _symbols(n: int) -> list[str]:
+    return [f"S{i:04d}" for i in range(n)]
+
+
+def seed(trades: int, symbols: list[str], rng: random.Random) -> float:
+    """
+    Bulk-insert ``trades`` rows, then rebuild positions and totals. Returns seconds.
+    """
+    t0 = time.perf_counter()
+    conn = db.connection()
+    remaining = trades
+    while remaining > 0:
+        n = min(SEED_CHUNK, remaining)
+        rows = [(rng.choice(symbols), "buy" if rng.random() < 0.6 else "sell", rng.randint(1, 20),
+                 round(rng.uniform(5, 500), 2), "seed") for _ in range(n)]
+        with db.transaction(immediate=True) as c:
+            c.executemany("INSERT INTO trades(symbol,side,qty,price,note) VALUES (?,?,?,?,?)", rows)
+        remaining -= n
+    store.rebuild_positions()
+    store.rebuild_totals()
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return time.perf_counter() - t0
+
+
+def _parse_mix(spec: str) -> dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ENDPOINTS:
+            raise SystemExit(f"unknown endpoint in --mix: {name!r} (choose from {', '.join(ENDPOINTS)})")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def _request(kind: str, rng: random.Random, symbols: list[str]) -> tuple[str, str, dict | None]:
+    sym = rng.choice(symbols)
+    if kind == "webhook":
+        return "POST", "/webhook", {"symbol": sym, "side": rng.choice(("buy", "sell")),
+                                     "qty_shares": rng.randint(1, 5), "price": round(rng.uniform(5, 500), 2)}
+    if kind == "webhook-tv":
+        body = {"symbol": sym, "rsi": rng.uniform(10, 90), "macd": rng.uniform(-1, 1), "macd_signal": 0.0,
+                "ema_fast": rng.uniform(99, 101), "ema_slow": 100.0}
+        if rng.random() < 0.5:
+            body["price"] = round(rng.uniform(5, 500), 2)  # the other half goes through the quote cache
+        return "POST", "/webhook-tv", body
+    if kind == "portfolio":
+        return "GET", "/api/portfolio", None
+    return "GET", "/api/open-positions", None
+
+
+def _percentiles(samples: list[float], unit: str = "ms") -> dict[str, float]:
+    s = sorted(samples)
+    scale = 1e3 if unit == "ms" else 1e6
+
+    def pick(q: float) -> float:
+        return round(s[min(len(s) - 1, int(len(s) * q))] * scale, 3) if s else 0.0
+
+    return {f"p50_{unit}": pick(0.5), f"p99_{unit}": pick(0.99), f"p999_{unit}": pick(0.999)}
+
+
+async def load(client: httpx.AsyncClient, mix: dict[str, float], requests: int, concurrency: int,
+               symbols: list[str], rng: random.Random) -> dict:
+    kinds = rng.choices(list(mix), weights=list(mix.values()), k=requests)
+    plan = [(kind, *_request(kind, rng, symbols)) for kind in kinds]
+    latencies: dict[str, list[float]] = {k: [] for k in mix}
+    errors: dict[str, int] = {k: 0 for k in mix}
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(kind: str, method: str, path: str, body: dict | None) -> None:
+        async with gate:
+            t0 = time.perf_counter()
+            resp = await client.request(method, path, json=body)
+            latencies[kind].append(time.perf_counter() - t0)
+            if resp.status_code >= 400:
+                errors[kind] += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(*p) for p in plan))
+    wall = time.perf_counter() - t0
+    every = [x for v in latencies.values() for x in v]
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "throughput_rps": round(requests / wall, 1),
+        **_percentiles(every),
+        "endpoints": {
+            k: {"requests": len(v), "errors": errors[k], **_percentiles(v)} for k, v in latencies.items()
+        },
+    }
+
+
+async def allocations(client: httpx.AsyncClient, mix: dict[str, float], per_endpoint: int,
+                      symbols: list[str], rng: random.Random) -> dict:
+    """
+    Sequential pass under tracemalloc: mean and max peak bytes allocated per request.
+    """
+    out = {}
+    tracemalloc.start()
+    try:
+        for kind in mix:
+            peaks = []
+            for _ in range(per_endpoint):
+                method, path, body = _request(kind, rng, symbols)
+                tracemalloc.reset_peak()
+                base = tracemalloc.get_traced_memory()[0]
+                await client.request(method, path, json=body)
+                peaks.append(tracemalloc.get_traced_memory()[1] - base)
+            out[kind] = {"mean_peak_kb": round(sum(peaks) / len(peaks) / 1024, 1),
+                         "max_peak_kb": round(max(peaks) / 1024, 1)}
+    finally:
+        tracemalloc.stop()
+    return out
+
+
+def _micro(fn, iterations: int) -> dict:
+    samples = []
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        for i in range(min(iterations, 200)):
+            fn(i)
+        peak = tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+    return {
+        "iterations": iterations,
+        "ops_per_s": round(iterations / sum(samples), 1),
+        **_percentiles(samples, "us"),
+        "peak_alloc_kb": round(peak / 1024, 1),
+    }
+
+
+def micro(iterations: int, symbols: list[str], rng: random.Random) -> dict:
+    rows = [(rng.uniform(10, 90), rng.uniform(-1, 1), 0.0, rng.uniform(99, 101), 100.0, None)
+            for _ in range(1024)]
+    return {
+        "decide_from_indicators": _micro(lambda i: ai.decide_from_indicators(*rows[i % 1024]), iterations * 10),
+        "get_open_positions": _micro(lambda i: store.get_open_positions(), iterations),
+        "log_trade": _micro(lambda i: store.log_trade(symbols[i % len(symbols)], "buy", 1, 100.0, "micro"),
+                            iterations),
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    rng = random.Random(args.seed)
+    symbols = _symbols(args.symbols)
+    seed_s = seed(args.trades, symbols, rng)
+    quotes.set_provider(quotes.FakeQuoteProvider(latency_s=args.quote_latency_ms / 1000.0, seed=args.seed))
+    telegram = notify._session = _FakeTelegram(args.telegram_latency_ms / 1000.0)
+    mix = _parse_mix(args.mix)
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # warm-up: first-use costs (connections, imports, quote cache) stay out of the numbers
+        await load(client, mix, min(200, args.requests), args.concurrency, symbols, rng)
+        result_load = await load(client, mix, args.requests, args.concurrency, symbols, rng)
+        result_alloc = await allocations(client, mix, args.alloc_requests, symbols, rng)
+    notify.flush(10.0)
+
+    return {
+        "meta": _meta(args),
+        "seed_seconds": round(seed_s, 2),
+        "load": result_load,
+        "allocations": result_alloc,
+        "micro": micro(args.iterations, symbols, rng),
+        "telegram_sent": telegram.sent,
+    }
+
+
+def _meta(args: argparse.Namespace) -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("json", "out", "compare")},
+    }
+
+
+def _flatten(d: dict, prefix: str = "") -> dict[str, float]:
+    out = {}
+    for k, v in d.items():
+        key = f"{prefix}{k}"
+        if isinstance(v, dict):
+            out.update(_flatten(v, key + "."))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            out[key] = float(v)
+    return out
+
+
+def compare(baseline: dict, current: dict) -> list[str]:
+    """
+    One line per shared metric: baseline, current and the ratio current/baseline.
+    """
+    base = _flatten({k: baseline.get(k, {}) for k in ("load", "allocations", "micro")})
+    cur = _flatten({k: current.get(k, {}) for k in ("load", "allocations", "micro")})
+    lines = [f"baseline {baseline.get('meta', {}).get('commit')} -> current {current['meta'].get('commit')}"]
+    for key in sorted(set(base) & set(cur)):
+        if key.endswith((".requests", ".iterations", ".concurrency", ".errors")):
+            continue
+        ratio = cur[key] / base[key] if base[key] else float("inf")
+        lines.append(f"{key:<55} {base[key]:>12.3f} {cur[key]:>12.3f}  x{ratio:.2f}")
+    return lines
+
+
+def _print(result: dict) -> None:
+    ld = result["load"]
+    print(f"seed: {result['meta']['params']['trades']} trades in {result['seed_seconds']} s")
+    print(f"load: {ld['requests']} req @ c={ld['concurrency']}  {ld['throughput_rps']} req/s  "
+          f"p50={ld['p50_ms']} ms p99={ld['p99_ms']} ms p999={ld['p999_ms']} ms")
+    for name, row in ld["endpoints"].items():
+        alloc = result["allocations"].get(name, {})
+        print(f"  {name:<15} n={row['requests']:<6} err={row['errors']:<4} p50={row['p50_ms']:>8} ms "
+              f"p99={row['p99_ms']:>8} ms p999={row['p999_ms']:>8} ms  peak={alloc.get('mean_peak_kb')} KB")
+    print("micro:")
+    for name, row in result["micro"].items():
+        print(f"  {name:<24} {row['ops_per_s']:>12} ops/s p50={row['p50_us']:>9} us "
+              f"p99={row['p99_us']:>9} us p999={row['p999_us']:>9} us  peak={row['peak_alloc_kb']} KB")
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--trades", type=int, default=10_000, help="seeded trade history (1k .. 10M)")
+    parser.add_argument("--symbols", type=int, default=200)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"endpoint weights (default {DEFAULT_MIX})")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--quote-latency-ms", type=float, default=20.0)
+    parser.add_argument("--telegram-latency-ms", type=float, default=50.0)
+    parser.add_argument("--alloc-requests", type=int, default=50, help="requests per endpoint under tracemalloc")
+    parser.add_argument("--iterations", type=int, default=2000, help="microbenchmark iterations")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print machine-readable output")
+    parser.add_argument("--out", help="also write the JSON result to this file")
+    parser.add_argument("--compare", help="JSON result of an earlier run to compare against")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    result = asyncio.run(run(args))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.json:
+        json.dump(result, sys.stdout, indent=2)
+        print()
+    else:
+        _print(result)
+    if args.compare:
+        with open(args.compare) as f:
+            print("\n".join(compare(json.load(f), result)))
+
+
+if __name__ == "__main__":
+    main_cli()
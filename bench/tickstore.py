@@ -0,0 +1,118 @@
+"""
+Append and read throughput of ``app.tickstore.TickStore``.
+
+Writes a random walk of ticks for a few symbols into a throwaway directory,
+one ``append()`` per tick (the live path: one write per fetched quote), then
+times range reads and OHLC downsampling over the result::
+
+    python -m bench.tickstore --ticks 2000000 --symbols 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from app.tickstore import TICK_DTYPE, TickStore
+
+
+def _walk(n: int, seed: int, t0: float) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    out = np.empty(n, dtype=TICK_DTYPE)
+    out["ts"] = t0 + np.cumsum(rng.exponential(0.5, n))
+    out["price"] = 100.0 * np.exp(np.cumsum(rng.normal(0, 0.0005, n)))
+    return out
+
+
+def _timed(fn, repeat: int) -> tuple[float, object]:
+    samples, result = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples), result
+
+
+def run(ticks: int, symbols: int, single: int, repeat: int, seed: int) -> dict:
+    names = [f"SYM{i}" for i in range(symbols)]
+    per = ticks // symbols
+    t0 = 1_700_000_000.0
+    data = {s: _walk(per, seed + i, t0) for i, s in enumerate(names)}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TickStore(tmp)
+
+        # one write per tick, as the quote listener does
+        n_single = min(single, per)
+        start = time.perf_counter()
+        for s in names:
+            for ts, price in data[s][:n_single].tolist():
+                store.append(s, price, ts)
+        single_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for s in names:
+            store.append_many(s, data[s][n_single:])
+        bulk_s = time.perf_counter() - start
+
+        sym = names[0]
+        span = float(data[sym]["ts"][-1] - t0)
+        lo, hi = t0 + span * 0.25, t0 + span * 0.75
+        first_map_s, _ = _timed(lambda: store.ticks(sym), 1)
+        range_s, window = _timed(lambda: store.ticks(sym, lo, hi), repeat)
+        ohlc_1m_s, bars_1m = _timed(lambda: store.ohlc(sym, 60, lo, hi), repeat)
+        ohlc_1d_s, bars_1d = _timed(lambda: store.ohlc(sym, 86_400), repeat)
+        copy_s, _ = _timed(lambda: np.fromfile(store.path(sym), dtype=TICK_DTYPE), repeat)
+
+        assert np.array_equal(store.ticks(sym)["price"], data[sym]["price"])
+        assert int(bars_1m["ticks"].sum()) == len(window)
+
+    return {
+        "ticks": per * symbols,
+        "symbols": symbols,
+        "single_appends": n_single * symbols,
+        "single_append_per_s": round(n_single * symbols / single_s),
+        "bulk_append_per_s": round((per - n_single) * symbols / bulk_s) if per > n_single else None,
+        "first_map_ms": round(first_map_s * 1000, 3),
+        "range_rows": len(window),
+        "range_read_ms": round(range_s * 1000, 3),
+        "ohlc_1m_bars": len(bars_1m),
+        "ohlc_1m_ms": round(ohlc_1m_s * 1000, 3),
+        "ohlc_1d_bars": len(bars_1d),
+        "ohlc_1d_ms": round(ohlc_1d_s * 1000, 3),
+        "full_copy_ms": round(copy_s * 1000, 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--ticks", type=int, default=2_000_000, help="total ticks across symbols")
+    parser.add_argument("--symbols", type=int, default=4)
+    parser.add_argument("--single", type=int, default=50_000, help="ticks per symbol written one at a time")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true", help="print machine-readable output")
+    args = parser.parse_args()
+
+    r = run(args.ticks, args.symbols, args.single, args.repeat, args.seed)
+    if args.json:
+        print(json.dumps(r, indent=2))
+        return
+    print(f"{r['ticks']} ticks over {r['symbols']} symbols")
+    print(f"append, one write per tick: {r['single_append_per_s']:>12,} ticks/s ({r['single_appends']} ticks)")
+    if r["bulk_append_per_s"]:
+        print(f"append_many:                {r['bulk_append_per_s']:>12,} ticks/s")
+    print(f"first map:        {r['first_map_ms']:>9.3f} ms")
+    print(f"range read:       {r['range_read_ms']:>9.3f} ms  ({r['range_rows']} rows, zero-copy)")
+    print(f"ohlc 1m:          {r['ohlc_1m_ms']:>9.3f} ms  ({r['ohlc_1m_bars']} bars)")
+    print(f"ohlc 1d, all:     {r['ohlc_1d_ms']:>9.3f} ms  ({r['ohlc_1d_bars']} bars)")
+    print(f"np.fromfile copy: {r['full_copy_ms']:>9.3f} ms  (for comparison)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Concurrent /webhook-tv throughput on a single worker (one event loop).
+
+Runs the FastAPI app in-process against ``FakeQuoteProvider`` with a simulated
+quote latency and a throwaway database. ``blocking`` replays the pre-offload
+handler (blocking calls straight on the loop); ``offloaded`` is the live
+endpoint::
+
+    python -m bench.webhook_concurrency --latency-ms 50 --concurrency 1 16 64
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import math
+import os
+import statistics
+import tempfile
+import time
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ.update(
+    DB_PATH=os.path.join(_tmp.name, "bench.db"),
+    QUOTE_PROVIDER="fake",
+    BASE_CAPITAL="1e12",
+    MAX_PORTFOLIO_EXPOSURE_PCT="1",
+    TELEGRAM_BOT_TOKEN="",
+    TELEGRAM_CHAT_ID="",
+    WEBHOOK_SECRET="",
+    HMAC_SECRET="",
+)
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+from app import quotes, router as r  # noqa: E402
+from app.config import settings  # noqa: E402
+
+
+@main.app.post("/bench/webhook-tv-blocking")
+async def _blocking_webhook_tv(payload: r.TVPayload):
+    # نسخة من المعالج قبل run_blocking: كل شيء على الـ event loop مباشرة
+    d = r.decide_from_indicators(rsi=payload.rsi, macd=payload.macd, macd_signal=payload.macd_signal,
+                                 ema_fast=payload.ema_fast, ema_slow=payload.ema_slow)
+    last = payload.price or r.broker.get_last_price(payload.symbol)
+    qty = max(1, math.floor(float(settings.MAX_TRADE_AMOUNT) / last))
+    alert = r.Alert(symbol=payload.symbol, side=d.action, qty_shares=qty, note=d.reason, price=last)
+    return r._execute(alert)
+
+
+_seq = itertools.count()
+
+
+async def _level(client: httpx.AsyncClient, path: str, concurrency: int, requests_per_level: int) -> dict:
+    gate = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+
+    async def one() -> None:
+        # رمز جديد لكل طلب حتى لا يخفي كاش الأسعار زمن المصدر
+        body = {"symbol": f"B{next(_seq):06d}", "rsi": 25, "ema_fast": 2, "ema_slow": 1}
+        async with gate:
+            t0 = time.perf_counter()
+            resp = await client.post(path, json=body)
+            latencies.append(time.perf_counter() - t0)
+            resp.raise_for_status()
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests_per_level)))
+    wall = time.perf_counter() - t0
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": requests_per_level,
+        "throughput_rps": round(requests_per_level / wall, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 1),
+    }
+
+
+async def run(latency_ms: float, levels: list[int], per_level: int) -> dict:
+    quotes.set_provider(quotes.FakeQuoteProvider(latency_s=latency_ms / 1000.0))
+    transport = httpx.ASGITransport(app=main.app)
+    out: dict = {"latency_ms": latency_ms}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for mode, path in (("blocking", "/bench/webhook-tv-blocking"), ("offloaded", "/webhook-tv")):
+            out[mode] = [await _level(client, path, c, max(per_level, c)) for c in levels]
+    return out
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--requests", type=int, default=64, help="requests per concurrency level")
+    parser.add_argument("--json", action="store_true", help="print machine-readable output")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    result = asyncio.run(run(args.latency_ms, args.concurrency, args.requests))
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(f"quote latency {result['latency_ms']} ms")
+    for mode in ("blocking", "offloaded"):
+        for row in result[mode]:
+            print(f"{mode:<10} c={row['concurrency']:<4} {row['throughput_rps']:>8} req/s "
+                  f"p50={row['p50_ms']:>7} ms p99={row['p99_ms']:>7} ms")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -1,16 +1,38 @@
-from fastapi import FastAPI, Request
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
 from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-import sqlite3
 
 from app.core.logging import configure_logging
+from app.core.metrics import CorrelationMiddleware
+from app.config import settings
 from app.router import router
-from app.store import init_db
+from app import events, indicator_state, warmup
+from app.offload import run_blocking
+from app.store import init_db, get_recent_trades
 
-configure_logging()
+configure_logging(settings.LOG_LEVEL, settings.LOG_QUEUE_MAX, settings.LOG_SAMPLING)
 init_db()
-app = FastAPI(title="Hello Trading Bot")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # حالة المؤشرات من SQLite وخيط الحفظ: عند الإقلاع وفي خيط، لا في أول طلب على الـ event loop
+    await run_blocking(indicator_state.load)
+    # yfinance/requests تُستورد كسولًا؛ نحمّلها في الخلفية بعد الإقلاع بدل أول طلب
+    if settings.PREWARM_IMPORTS:
+        warmup.start()
+    yield
+
+
+app = FastAPI(title="Hello Trading Bot", lifespan=lifespan)
+app.add_middleware(
+    CorrelationMiddleware,
+    timed_paths=("/webhook", "/webhook-tv", "/webhook-tv2", "/webhook-tv/batch"),
+    slow_request_s=settings.METRICS_SLOW_REQUEST_MS / 1000.0,
+)
 
 # تأكد أن المجلدين موجودين: templates و static
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -22,15 +44,33 @@ def health(request: Request):
 
 @app.get("/dashboard", response_class=HTMLResponse)
 def dashboard(request: Request):
-    conn = sqlite3.connect("bot.db")
-    conn.row_factory = sqlite3.Row
-    rows = conn.execute(
-        "SELECT ts, symbol, side, qty, price, note FROM trades ORDER BY id DESC LIMIT 50"
-    ).fetchall()
-    conn.close()
+    rows = get_recent_trades(limit=50)
     return templates.TemplateResponse("dashboard.html", {"request": request, "trades": rows, "title": "الصفقات"})
 
+@app.websocket("/ws/trades")
+async def ws_trades(websocket: WebSocket):
+    """
+    بث الصفقات وتغييرات Kill Switch والواتش ليست للوحة التحكم، من ناقل الأحداث مباشرة.
+    إن امتلأ طابور هذا العميل تُسقط أحداث ويُرسل resync ليعيد تحميل البيانات.
+    """
+    await websocket.accept()
+    sub = events.subscribe_async(events.TradesLogged, events.KillSwitchChanged, events.WatchlistChanged,
+                                 name="ws-trades", maxsize=256)
+    dropped = 0
+    try:
+        while True:
+            ev = await sub.next(timeout=15.0)
+            if sub.dropped != dropped:
+                dropped = sub.dropped
+                await websocket.send_json({"type": "resync"})
+            await websocket.send_json(ev.to_dict() if ev else {"type": "ping"})
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        events.unsubscribe(sub)
+
 app.include_router(router)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000)
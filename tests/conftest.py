@@ -0,0 +1,32 @@
+import os
+import tempfile
+
+import pytest
+
+# settings are read once at import time: fix them before anything imports app
+_tmp = tempfile.mkdtemp(prefix="trading-bot-tests-")
+os.environ.update(
+    DB_PATH=os.path.join(_tmp, "bot.db"),
+    QUOTE_PROVIDER="fake",
+    QUOTE_PROVIDERS="",
+    BASE_CAPITAL="10000",
+    MAX_PORTFOLIO_EXPOSURE_PCT="0.1",
+    TICK_STORE_DIR="",
+    PREWARM_IMPORTS="false",
+    LOG_LEVEL="WARNING",
+    WEBHOOK_SECRET="",
+    HMAC_SECRET="",
+    TELEGRAM_BOT_TOKEN="",
+    TELEGRAM_CHAT_ID="",
+)
+
+
+@pytest.fixture(autouse=True)
+def fresh_db(tmp_path):
+    from app import db, store
+
+    db.configure(tmp_path / "bot.db")
+    store._ledger.invalidate()
+    store.init_db()
+    yield
+    db.get_db().close()
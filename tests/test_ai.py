@@ -0,0 +1,65 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+from app.ai import decide_batch, decide_from_indicators
+
+FIELDS = ("rsi", "macd", "macd_signal", "ema_fast", "ema_slow", "trend_strength")
+
+
+def _value(rng: random.Random, name: str):
+    r = rng.random()
+    if r < 0.1:
+        return None
+    if r < 0.15:
+        return float("nan")
+    if name == "rsi":
+        # the 30 / 70 thresholds themselves and their neighbours
+        return rng.choice((30.0, 70.0, 29.95, 30.05, 69.95, 70.05, rng.uniform(0, 100)))
+    if name == "trend_strength":
+        return rng.uniform(-2, 5)
+    return rng.choice((0.0, 1.0, rng.uniform(-1, 1)))  # ties on EMA / MACD are common
+
+
+def _scalar(row: dict):
+    # the scalar rules skip None; the batch treats NaN as missing
+    return decide_from_indicators(**{k: None if v is not None and math.isnan(v) else v for k, v in row.items()})
+
+
+def _assert_same(rows: list[dict]):
+    batch = decide_batch(**{k: [r[k] for r in rows] for k in FIELDS})
+    assert len(batch) == len(rows)
+    for i, row in enumerate(rows):
+        want, got = _scalar(row), batch[i]
+        assert (got.action, got.reason) == (want.action, want.reason), row
+        assert got.confidence == pytest.approx(want.confidence), row
+
+
+def test_batch_matches_scalar_on_random_rows():
+    rng = random.Random(7)
+    _assert_same([{k: _value(rng, k) for k in FIELDS} for _ in range(5000)])
+
+
+def test_batch_matches_scalar_on_boundaries():
+    rows = [
+        dict(rsi=30.0, macd=None, macd_signal=None, ema_fast=2.0, ema_slow=1.0, trend_strength=None),
+        dict(rsi=70.0, macd=-1.0, macd_signal=0.0, ema_fast=None, ema_slow=None, trend_strength=9.0),
+        dict(rsi=50.0, macd=1.0, macd_signal=1.0, ema_fast=1.0, ema_slow=1.0, trend_strength=None),
+        dict(rsi=None, macd=1.0, macd_signal=0.0, ema_fast=2.0, ema_slow=1.0, trend_strength=float("nan")),
+        dict(rsi=float("nan"), macd=float("nan"), macd_signal=0.0, ema_fast=2.0, ema_slow=1.0,
+             trend_strength=None),
+        dict(rsi=25.0, macd=-1.0, macd_signal=0.0, ema_fast=0.0, ema_slow=1.0, trend_strength=None),
+        dict(rsi=None, macd=None, macd_signal=None, ema_fast=None, ema_slow=None, trend_strength=None),
+    ]
+    _assert_same(rows)
+
+
+def test_missing_columns_and_arrays():
+    batch = decide_batch(rsi=np.array([10.0, 50.0, np.nan]), ema_fast=[2.0, 2.0, 2.0], ema_slow=[1.0, 1.0, 1.0])
+    assert list(batch.actions) == ["buy", "hold", "hold"]
+    assert batch[0] == decide_from_indicators(rsi=10.0, ema_fast=2.0, ema_slow=1.0)
+    assert len(decide_batch()) == 0
+    with pytest.raises(ValueError):
+        decide_batch(rsi=[1.0, 2.0], macd=[1.0])
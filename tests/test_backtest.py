@@ -0,0 +1,31 @@
+import numpy as np
+
+from app import backtest
+from app.config import settings
+
+
+def _bars(n: int = 600) -> backtest.Bars:
+    t = np.arange(n)
+    close = 100 + 10 * np.sin(t / 15.0) + 0.01 * t
+    return backtest.Bars("TEST", t.astype(np.int64) * 60_000_000_000, close)
+
+
+def test_positions_follow_the_broker_fills(monkeypatch):
+    seen = []
+    apply_fill = backtest.apply_fill
+
+    def spy(pos, side, qty, price):
+        seen.append(qty)
+        return apply_fill(pos, side, qty, price)
+
+    monkeypatch.setattr(backtest, "apply_fill", spy)
+    full, _ = backtest.simulate(_bars())
+    assert full.trades and min(seen) > 1
+
+    # one share per quote: every order fills partially and the rest is cancelled
+    seen.clear()
+    monkeypatch.setattr(settings, "PAPER_DEPTH_PER_QUOTE", 1)
+    partial, equity = backtest.simulate(_bars())
+    assert partial.trades and set(seen) == {1}
+    assert partial.unfilled == 0
+    assert len(equity) == 600
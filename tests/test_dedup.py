@@ -0,0 +1,86 @@
+import asyncio
+import json
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from app import dedup
+
+
+def _run(cache: dedup.DedupCache, key: str, handler):
+    return asyncio.run(cache.run(key, handler))
+
+
+class Handler:
+    def __init__(self, result=None, exc: Exception | None = None, delay: float = 0.0):
+        self.calls = 0
+        self.result, self.exc, self.delay = result, exc, delay
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.exc is not None:
+            raise self.exc
+        return self.result
+
+
+def test_duplicate_body_is_replayed():
+    cache = dedup.DedupCache(60, 100)
+    handler = Handler({"status": "ok", "qty": 3})
+    key = dedup.body_key("/webhook", b'{"symbol":"AAPL"}')
+    assert _run(cache, key, handler) == {"status": "ok", "qty": 3}
+
+    replay = _run(cache, key, handler)
+    assert handler.calls == 1
+    assert replay.status_code == 200
+    assert replay.headers[dedup.HEADER] == "hit"
+    assert json.loads(replay.body) == {"status": "ok", "qty": 3}
+    assert dedup.body_key("/webhook", b'{"symbol":"MSFT"}') != key
+
+
+def test_another_worker_replays_from_the_table():
+    key = dedup.body_key("/webhook", b"same")
+    handler = Handler({"status": "ok"})
+    _run(dedup.DedupCache(60, 100), key, handler)
+    # a second worker starts with an empty in-process cache
+    replay = _run(dedup.DedupCache(60, 100), key, handler)
+    assert handler.calls == 1
+    assert json.loads(replay.body) == {"status": "ok"}
+
+
+def test_errors_are_not_remembered():
+    cache = dedup.DedupCache(60, 100)
+    for status in (400, 403, 503):
+        failing = Handler(exc=HTTPException(status_code=status, detail="rejected"))
+        for _ in range(2):
+            with pytest.raises(HTTPException):
+                _run(cache, f"k{status}", failing)
+        assert failing.calls == 2  # released: the retry runs again
+
+    # once the state that rejected it changes, the retry goes through and is remembered
+    ok = Handler({"status": "ok"})
+    assert _run(cache, "k403", ok) == {"status": "ok"}
+    assert _run(cache, "k403", ok).headers[dedup.HEADER] == "hit"
+    assert ok.calls == 1
+
+
+def test_concurrent_duplicates_run_once():
+    cache = dedup.DedupCache(60, 100)
+    handler = Handler({"status": "ok"}, delay=0.05)
+
+    async def burst():
+        return await asyncio.gather(*(cache.run("k", handler) for _ in range(5)))
+
+    results = asyncio.run(burst())
+    assert handler.calls == 1
+    assert sum(isinstance(r, dict) for r in results) == 1
+
+
+def test_expired_entries_run_again():
+    cache = dedup.DedupCache(0.05, 100)
+    handler = Handler({"status": "ok"})
+    _run(cache, "k", handler)
+    time.sleep(0.1)
+    _run(cache, "k", handler)
+    assert handler.calls == 2
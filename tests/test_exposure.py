@@ -0,0 +1,154 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import HTTPException
+
+from app import router, store
+from app.config import settings
+from app.matching import MatchingEngine
+
+CAP = settings.BASE_CAPITAL * settings.MAX_PORTFOLIO_EXPOSURE_PCT
+
+
+@pytest.fixture
+def broker(monkeypatch):
+    # a fresh book per test; 3 shares per quote so orders fill across several quotes
+    monkeypatch.setattr(router.broker, "engine", MatchingEngine(0.01, depth_per_quote=3))
+    monkeypatch.setattr(router.broker, "_holds", {})
+    return router.broker
+
+
+def _buy(qty: int, price: float, symbol: str = "AAPL", **kw) -> dict:
+    return router._execute(router.Alert(symbol=symbol, side="buy", qty_shares=qty, price=price, **kw))
+
+
+def _committed() -> float:
+    return store.get_exposure_value() + store.get_reserved_exposure()
+
+
+def test_reserve_exposure_respects_cap():
+    assert store.reserve_exposure("a", CAP * 0.6, 30)
+    assert not store.reserve_exposure("b", CAP * 0.5, 30)
+    assert store.reserve_exposure("b", CAP * 0.4, 30)
+    # the same ref replaces its own reservation instead of adding to it
+    assert store.reserve_exposure("a", CAP * 0.6, 30)
+    store.settle_reservations({"a": 0.0, "b": 0.0})
+    assert store.get_reserved_exposure() == 0
+
+
+def test_logged_trades_consume_their_reservation():
+    assert store.reserve_exposure("r", 500.0, 30)
+    store.log_trade("AAPL", "buy", 3, 50.0, "", consumed={"r": 150.0})
+    assert store.get_reserved_exposure() == pytest.approx(350.0)
+    assert _committed() == pytest.approx(500.0)
+    store.log_trade("AAPL", "buy", 7, 50.0, "", consumed={"r": 350.0})
+    assert store.get_reserved_exposure() == 0
+
+
+def test_resting_limit_buy_stays_reserved_until_filled(broker):
+    order = _buy(10, 50.0, order_type="limit", limit_price=49.0)["order"]
+    assert order["status"] == "new"
+    assert store.get_reserved_exposure() == pytest.approx(490.0)
+    with pytest.raises(HTTPException) as exc:
+        _buy(11, 50.0, order_type="limit", limit_price=49.0)  # 490 + 539 > 1000
+    assert exc.value.status_code == 400
+
+    for _ in range(4):
+        broker.on_quote("AAPL", 49.0)
+        assert _committed() == pytest.approx(490.0)
+    assert broker.get_order(order["id"])["status"] == "filled"
+    assert store.get_reserved_exposure() == 0
+    assert store.get_exposure_value() == pytest.approx(490.0)
+
+
+def test_resting_fill_logged_before_the_submitter(broker, monkeypatch):
+    # the rest of the order fills (and is logged) between submit_order and the
+    # submitter's own log_trade: the reservation must still end up at zero
+    log_trade = router.log_trade
+    seen = []
+
+    def late_log_trade(*args, **kw):
+        for _ in range(3):
+            broker.on_quote("AAPL", 50.0)
+            seen.append(_committed())
+        return log_trade(*args, **kw)
+
+    monkeypatch.setattr(router, "log_trade", late_log_trade)
+    order = _buy(10, 50.0)["order"]
+    assert order["filled_qty"] == 3
+    assert max(seen) <= 500.0 + 1e-6
+    assert broker.get_order(order["id"])["status"] == "filled"
+    assert store.get_exposure_value() == pytest.approx(500.0)
+    assert store.get_reserved_exposure() == 0
+
+
+def test_failed_log_cancels_the_order(broker, monkeypatch):
+    def broken(*args, **kw):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(router, "log_trade", broken)
+    with pytest.raises(RuntimeError):
+        _buy(10, 50.0)
+    assert store.get_reserved_exposure() == 0
+    assert broker.open_orders() == []
+    broker.on_quote("AAPL", 50.0)  # nothing left to fill, nothing logged
+    assert store.get_exposure_value() == 0
+
+
+def test_cap_holds_under_concurrent_buys_and_quotes(broker):
+    stop = threading.Event()
+
+    def quotes():
+        while not stop.is_set():
+            broker.on_quote("AAPL", 10.0)
+
+    def one(i: int) -> bool:
+        try:
+            _buy(3, 10.0, order_type="limit", limit_price=10.0)
+            return True
+        except HTTPException as exc:
+            assert exc.status_code == 400
+            return False
+
+    feeder = threading.Thread(target=quotes)
+    feeder.start()
+    try:
+        with ThreadPoolExecutor(4) as pool:
+            accepted = sum(pool.map(one, range(120)))
+            assert _committed() <= CAP + 1e-6
+    finally:
+        stop.set()
+        feeder.join()
+    while broker.open_orders():
+        broker.on_quote("AAPL", 10.0)
+
+    assert accepted == int(CAP // 30)
+    assert store.get_exposure_value() == pytest.approx(accepted * 30.0)
+    assert store.get_reserved_exposure() == 0
+    assert store.check_totals() == []
+    assert store.check_positions() == []
+
+
+def test_resting_fill_write_is_retried(broker, monkeypatch):
+    order = _buy(10, 50.0, order_type="limit", limit_price=49.0)["order"]
+    log_trades_bulk = router.log_trades_bulk
+
+    def busy(*args, **kw):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(router, "log_trades_bulk", busy)
+    for _ in range(4):
+        broker.on_quote("AAPL", 49.0)
+    # the book says filled, nothing is written yet: the reservation still covers it
+    assert broker.get_order(order["id"])["status"] == "filled"
+    assert router.unlogged_fills() == 4
+    assert store.get_exposure_value() == 0
+    assert store.get_reserved_exposure() == pytest.approx(490.0)
+
+    monkeypatch.setattr(router, "log_trades_bulk", log_trades_bulk)
+    assert router._flush_unlogged()
+    assert router.unlogged_fills() == 0
+    assert store.get_exposure_value() == pytest.approx(490.0)
+    assert store.get_reserved_exposure() == 0
+    assert store.check_positions() == []
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from app import indicators, indicator_state
+
+
+def _prices(n: int) -> np.ndarray:
+    rng = np.random.default_rng(3)
+    return 100 + np.cumsum(rng.normal(0, 0.5, n))
+
+
+def test_streaming_state_matches_vectorised_after_restore():
+    close = _prices(300)
+    book = indicator_state.IndicatorBook(60)
+    for p in close[:120]:
+        book.update("AAPL", float(p), "1m")
+    assert book.flush() == 1
+
+    # a restart: a new book loads what the last flush saved and carries on
+    restored = indicator_state.IndicatorBook(60)
+    for p in close[120:]:
+        values = restored.update("AAPL", float(p), "1m")
+    assert restored.stats()["series"] == 1
+
+    line, signal = indicators.macd(close)
+    expected = {
+        "rsi": indicators.rsi(close)[-1],
+        "ema_fast": indicators.ema(close, indicators.EMA_FAST)[-1],
+        "ema_slow": indicators.ema(close, indicators.EMA_SLOW)[-1],
+        "macd": line[-1],
+        "macd_signal": signal[-1],
+    }
+    assert values == pytest.approx(expected, rel=1e-9)
+    assert restored.values("AAPL") is None  # another timeframe is another series
+
+
+def test_values_stay_empty_until_warm():
+    book = indicator_state.IndicatorBook(60)
+    values = None
+    for p in _prices(indicators.RSI_PERIOD):
+        values = book.update("MSFT", float(p))
+    assert values["rsi"] is None and values["macd"] is None
+    assert values["ema_fast"] is not None
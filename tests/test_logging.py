@@ -0,0 +1,99 @@
+import logging
+import queue
+
+from app.core import logging as applog
+from app.core.logging import SamplingFilter
+
+
+def _rec(name, level=logging.INFO, msg="x"):
+    return logging.LogRecord(name, level, __file__, 0, msg, None, None)
+
+
+class Capture(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records: list[logging.LogRecord] = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def test_parse_rules():
+    f = SamplingFilter.parse("app.decisions=10/s, app.quotes=0.25,junk")
+    assert f._rules == {"app.decisions": (1.0, 10.0), "app.quotes": (0.25, 0.0)}
+
+
+def test_rate_limit_counts_suppressed(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(applog.time, "monotonic", lambda: clock[0])
+    f = SamplingFilter({"app.decisions": "5/s"})
+
+    kept = sum(f.filter(_rec("app.decisions")) for _ in range(20))
+    assert kept == 5
+    assert f.suppressed == {"app.decisions": 15}
+
+    clock[0] += 0.4  # يُعاد ملء رمزين
+    assert sum(f.filter(_rec("app.decisions")) for _ in range(5)) == 2
+
+
+def test_rule_covers_children_only():
+    f = SamplingFilter({"app.quotes": "0"})
+    assert not f.filter(_rec("app.quotes"))
+    assert not f.filter(_rec("app.quotes.chain"))
+    assert f.filter(_rec("app.quotes_extra"))
+    assert f.filter(_rec("app.router"))
+    assert f.suppressed == {"app.quotes": 2}
+
+
+def test_warnings_always_pass():
+    f = SamplingFilter({"app": "0"})
+    assert f.filter(_rec("app.x", logging.WARNING))
+    assert f.filter(_rec("app.x", logging.ERROR))
+    assert not f.filter(_rec("app.x", logging.DEBUG))
+
+
+def test_fraction_sampling(monkeypatch):
+    rolls = iter([0.05, 0.5, 0.09, 0.99])
+    monkeypatch.setattr(applog.random, "random", lambda: next(rolls))
+    f = SamplingFilter({"app.quotes": "0.1"})
+    assert [f.filter(_rec("app.quotes")) for _ in range(4)] == [True, False, True, False]
+
+
+def test_full_queue_drops_without_blocking():
+    q: queue.Queue = queue.Queue(2)
+    h = applog._QueueHandler(q)
+    for i in range(5):
+        h.handle(_rec("app", msg=f"m{i}"))
+    assert (h.enqueued, h.dropped) == (2, 3)
+    assert [q.get_nowait().msg for _ in range(2)] == ["m0", "m1"]
+
+
+def test_drop_notice_once_per_second(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(applog.time, "monotonic", lambda: clock[0])
+    q: queue.Queue = queue.Queue(1)
+    source = applog._QueueHandler(q)
+    out = Capture()
+    listener = applog._Listener(q, source, out)
+
+    def notices():
+        return [r for r in out.records if r.getMessage() == "log records dropped: queue full"]
+
+    source.dropped = 3
+    listener.handle(_rec("app"))
+    assert len(notices()) == 1
+    assert (notices()[0].dropped, notices()[0].dropped_total) == (3, 3)
+    assert notices()[0].levelno == logging.WARNING
+
+    source.dropped = 5
+    listener.handle(_rec("app"))  # داخل الثانية نفسها: لا إشعار جديد
+    assert len(notices()) == 1
+
+    clock[0] += 1.0
+    listener.handle(_rec("app"))
+    assert len(notices()) == 2
+    assert (notices()[1].dropped, notices()[1].dropped_total) == (2, 5)
+
+    clock[0] += 5.0
+    listener.handle(_rec("app"))  # لا إسقاط جديد
+    assert len(notices()) == 2
@@ -0,0 +1,121 @@
+import pytest
+
+from app.matching import MatchingEngine
+
+
+@pytest.fixture
+def engine():
+    return MatchingEngine(0.01)
+
+
+def test_avg_price_is_the_exact_vwap(engine):
+    engine.submit("AAPL", "sell", 5, "limit", limit_price=101.0)
+    engine.submit("AAPL", "sell", 3, "limit", limit_price=100.0)
+    oid, fills = engine.submit("AAPL", "buy", 8, "limit", limit_price=101.0)
+    assert [(f.qty, f.price) for f in fills if f.order_id == oid] == [(3, 100.0), (5, 101.0)]
+    assert engine.order(oid)["avg_price"] == pytest.approx(100.625, abs=1e-12)
+
+
+def _mine(fills, oid):
+    return [(f.qty, f.price, f.liquidity) for f in fills if f.order_id == oid]
+
+
+def test_price_then_time_priority(engine):
+    late = engine.submit("AAPL", "sell", 5, "limit", limit_price=100.0)[0]
+    best = engine.submit("AAPL", "sell", 5, "limit", limit_price=99.0)[0]
+    later = engine.submit("AAPL", "sell", 5, "limit", limit_price=100.0)[0]
+    oid, fills = engine.submit("AAPL", "buy", 12, "limit", limit_price=100.0)
+    # the better price first, then the earlier order at the same price; fills at the resting price
+    assert [(f.order_id, f.qty, f.price) for f in fills if f.order_id != oid] == \
+        [(best, 5, 99.0), (late, 5, 100.0), (later, 2, 100.0)]
+    assert engine.order(oid)["status"] == "filled"
+    assert engine.order(later)["status"] == "partially_filled"
+    assert engine.depth("AAPL")["asks"] == [[100.0, 3, 1]]
+
+
+def test_resting_orders_fill_when_a_quote_crosses(engine):
+    buy = engine.submit("AAPL", "buy", 10, "limit", limit_price=50.0)[0]
+    assert engine.on_quote("AAPL", 50.5) == []
+    fills = engine.on_quote("AAPL", 49.8)
+    assert _mine(fills, buy) == [(10, 49.8, "quote")]  # at the quote, not the limit
+
+
+def test_stop_triggers_a_market_order(engine):
+    engine.on_quote("AAPL", 100.0)
+    stop = engine.submit("AAPL", "sell", 4, "stop", stop_price=95.0)[0]
+    assert engine.order(stop)["status"] == "new"
+    assert engine.on_quote("AAPL", 96.0) == []
+    fills = engine.on_quote("AAPL", 94.5)
+    assert _mine(fills, stop) == [(4, 94.5, "quote")]
+    assert engine.order(stop)["type"] == "market"  # a triggered stop becomes a market order
+
+
+def test_stop_limit_rests_at_its_limit_once_triggered(engine):
+    engine.on_quote("AAPL", 100.0)
+    oid = engine.submit("AAPL", "buy", 3, "stop_limit", stop_price=105.0, limit_price=106.0)[0]
+    engine.on_quote("AAPL", 104.0)
+    assert engine.order(oid)["filled_qty"] == 0
+    # gaps through the limit: triggered, but 108 is above 106 so it rests
+    assert engine.on_quote("AAPL", 108.0) == []
+    assert engine.depth("AAPL")["bids"] == [[106.0, 3, 1]]
+    assert _mine(engine.on_quote("AAPL", 105.5), oid) == [(3, 105.5, "quote")]
+
+
+def test_stop_already_through_enters_immediately(engine):
+    engine.on_quote("AAPL", 90.0)
+    oid, fills = engine.submit("AAPL", "sell", 2, "stop", stop_price=95.0)
+    assert _mine(fills, oid) == [(2, 90.0, "quote")]
+
+
+def test_time_in_force():
+    engine = MatchingEngine(0.01, depth_per_quote=3)
+    engine.on_quote("AAPL", 10.0)
+    day = engine.submit("AAPL", "buy", 5, tif="day")[0]
+    gtc = engine.submit("AAPL", "buy", 5, tif="gtc")[0]
+    ioc = engine.submit("AAPL", "buy", 5, tif="ioc")[0]
+    # the quote offered 3 shares: day took them, gtc waits, ioc cancels what it did not get
+    assert [engine.order(o)["filled_qty"] for o in (day, gtc, ioc)] == [3, 0, 0]
+    assert [engine.order(o)["status"] for o in (day, gtc, ioc)] == ["partially_filled", "new", "cancelled"]
+    engine.on_quote("AAPL", 10.0)
+    engine.on_quote("AAPL", 10.0)
+    assert [engine.order(o)["filled_qty"] for o in (day, gtc, ioc)] == [5, 4, 0]
+    with pytest.raises(ValueError):
+        engine.submit("AAPL", "buy", 1, tif="fok")
+
+
+def test_cancel_is_lazy_and_skipped(engine):
+    first = engine.submit("AAPL", "sell", 5, "limit", limit_price=100.0)[0]
+    second = engine.submit("AAPL", "sell", 5, "limit", limit_price=100.0)[0]
+    assert engine.cancel(first)
+    assert not engine.cancel(first)
+    assert engine.depth("AAPL")["asks"] == [[100.0, 5, 1]]
+    assert [o["order_id"] for o in engine.open_orders("AAPL")] == [second]
+    oid, fills = engine.submit("AAPL", "buy", 5, "limit", limit_price=100.0)
+    assert [(f.order_id, f.qty) for f in fills if f.order_id != oid] == [(second, 5)]
+    assert engine.order(first)["status"] == "cancelled"
+    assert not engine.cancel(second)  # filled
+
+
+def test_replace_priority(engine):
+    a = engine.submit("AAPL", "sell", 5, "limit", limit_price=100.0)[0]
+    b = engine.submit("AAPL", "sell", 5, "limit", limit_price=100.0)[0]
+    # a smaller quantity keeps the id and the place in the queue
+    assert engine.replace(a, qty=4) == (a, [])
+    # a larger one is a new order at the back
+    new, _ = engine.replace(b, qty=8)
+    assert new != b and engine.order(b)["status"] == "replaced"
+    c = engine.submit("AAPL", "sell", 1, "limit", limit_price=100.0)[0]
+    a2, _ = engine.replace(a, qty=6)
+    oid, fills = engine.submit("AAPL", "buy", 20, "limit", limit_price=100.0)
+    assert [f.order_id for f in fills if f.order_id != oid] == [new, c, a2]
+    with pytest.raises(KeyError):
+        engine.replace(b, qty=1)  # replaced orders are closed
+
+
+def test_replace_keeps_what_already_filled(engine):
+    oid = engine.submit("AAPL", "buy", 10, "limit", limit_price=50.0)[0]
+    engine.submit("AAPL", "sell", 4, "limit", limit_price=50.0)
+    new, _ = engine.replace(oid, limit_price=51.0)
+    assert engine.order(new)["qty"] == 6 and engine.order(new)["limit_price"] == 51.0
+    with pytest.raises(ValueError):
+        engine.replace(new, qty=0)
@@ -0,0 +1,92 @@
+import time
+
+import pytest
+
+from app import notify
+from app.config import settings
+
+
+class Sent(list):
+    """
+    بديل الإرسال الفعلي: يسجّل (وقت الإرسال، النص) ويرد من replies ثم بالنجاح.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.replies: list[dict] = []
+
+    def __call__(self, text, *, parse_mode=None):
+        self.append((time.monotonic(), text))
+        return self.replies.pop(0) if self.replies else {"ok": True}
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    out = Sent()
+    monkeypatch.setattr(notify, "enabled", lambda: True)
+    monkeypatch.setattr(notify, "send", out)
+    return out
+
+
+def _notifier(monkeypatch, rate):
+    monkeypatch.setattr(settings, "NOTIFY_RATE_PER_S", rate)
+    return notify._Notifier()
+
+
+def test_sends_are_rate_limited(monkeypatch, sent):
+    n = _notifier(monkeypatch, 20.0)
+    for i in range(4):
+        assert n.enqueue(f"m{i}")
+    assert n.flush()
+    assert [t for _, t in sent] == ["m0", "m1", "m2", "m3"]
+    gaps = [b[0] - a[0] for a, b in zip(sent, sent[1:])]
+    assert min(gaps) >= 0.045
+    assert n.stats()["sent"] == 4
+
+
+def test_waiting_messages_merge_into_digest(monkeypatch, sent):
+    n = _notifier(monkeypatch, 4.0)
+    n.enqueue("first")
+    for i in range(5):
+        n.enqueue(f"HOLD {i}", digest="HOLD")
+    n.enqueue("other")
+    assert n.flush()
+    assert [t for _, t in sent] == ["first", "📦 5× HOLD\nHOLD 0\nHOLD 1\nHOLD 2\nHOLD 3\nHOLD 4", "other"]
+    assert n.stats()["merged"] == 4
+
+
+def test_digest_shows_last_lines(monkeypatch):
+    monkeypatch.setattr(settings, "NOTIFY_DIGEST_MAX_LINES", 2)
+    msg = notify._Pending([f"l{i}" for i in range(5)], digest="HOLD")
+    assert msg.render() == "📦 5× HOLD (آخر 2)\nl3\nl4"
+    assert notify._Pending(["x" * 5000]).render() == "x" * notify.TELEGRAM_MAX_TEXT
+
+
+def test_retry_after_is_honoured(monkeypatch, sent):
+    n = _notifier(monkeypatch, 100.0)
+    sent.replies.append({"ok": False, "status_code": 429, "retry_after": 0.2})
+    n.enqueue("a")
+    n.enqueue("b")
+    assert n.flush()
+    # 429 يوقف المحادثة كلها حتى retry_after، والرسالة نفسها تبقى في المقدمة
+    assert [t for _, t in sent] == ["a", "a", "b"]
+    assert sent[1][0] - sent[0][0] >= 0.19
+    assert {k: n.stats()[k] for k in ("sent", "retried", "failed")} == {"sent": 2, "retried": 1, "failed": 0}
+
+
+def test_client_errors_are_not_retried(monkeypatch, sent):
+    n = _notifier(monkeypatch, 100.0)
+    sent.replies.append({"ok": False, "status_code": 400})
+    n.enqueue("bad")
+    n.enqueue("good")
+    assert n.flush()
+    assert [t for _, t in sent] == ["bad", "good"]
+    assert {k: n.stats()[k] for k in ("sent", "retried", "failed")} == {"sent": 1, "retried": 0, "failed": 1}
+
+
+def test_full_queue_drops(monkeypatch):
+    monkeypatch.setattr(settings, "NOTIFY_QUEUE_MAX", 2)
+    n = notify._Notifier()
+    monkeypatch.setattr(n, "_ensure_worker", lambda: None)  # بلا عامل: الطابور لا يُفرَّغ
+    assert [n.enqueue(f"m{i}") for i in range(3)] == [True, True, False]
+    assert (n.stats()["enqueued"], n.stats()["dropped"]) == (2, 1)
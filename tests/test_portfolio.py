@@ -0,0 +1,94 @@
+import json
+
+import pytest
+
+from app import portfolio, quotes, store
+
+
+class Prices(quotes.QuoteProvider):
+    name = "test"
+
+    def __init__(self, prices):
+        self.prices = prices
+        self.calls = 0
+
+    def fetch_many(self, symbols):
+        self.calls += 1
+        return {s: self.prices.get(s) for s in symbols}
+
+    def fetch_last(self, symbol):
+        return self.fetch_many([symbol])[symbol]
+
+    def fetch_detail(self, symbol):
+        return None
+
+
+@pytest.fixture
+def prices():
+    original = quotes.get_provider()
+    provider = Prices({"AAPL": 110.0})
+    quotes.set_provider(provider)
+    yield provider
+    quotes.set_provider(original)
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = portfolio.SnapshotCache()
+    monkeypatch.setattr(portfolio, "_cache", cache)
+    return cache
+
+
+def _get(response):
+    return response.status_code, response.headers["ETag"], json.loads(response.body) if response.body else None
+
+
+def test_etag_and_304(prices, cache):
+    store.log_trade("AAPL", "buy", 10, 100.0)
+    status, etag, body = _get(portfolio.portfolio_response())
+    assert status == 200 and etag.startswith('W/"')
+    assert body["market_value"] == 1100.0 and body["pnl"] == 100.0
+
+    # strong or weak form, in a list, or '*'
+    for header in (etag, etag.removeprefix("W/"), f'"x", {etag}', "*"):
+        assert portfolio.portfolio_response(header).status_code == 304
+    assert portfolio.portfolio_response('"other"').status_code == 200
+    assert cache.stats()["not_modified"] == 4 and cache.stats()["builds"] == 1
+
+
+def test_a_trade_changes_the_etag(prices, cache):
+    store.log_trade("AAPL", "buy", 10, 100.0)
+    _, etag, _ = _get(portfolio.positions_response())
+    store.log_trade("AAPL", "buy", 1, 100.0)
+    status, new, body = _get(portfolio.positions_response(etag))
+    assert status == 200 and new != etag
+    assert body["positions"][0]["qty"] == 11
+    assert cache.stats()["builds"] == 2
+
+
+def test_price_moves_rebuild_refetches_at_the_same_price_do_not(prices, cache, monkeypatch):
+    store.log_trade("AAPL", "buy", 10, 100.0)
+    _, etag, _ = _get(portfolio.portfolio_response())
+    # the cached price expires and is refetched unchanged: same snapshot, same ETag
+    monkeypatch.setattr(portfolio.settings, "QUOTE_CACHE_TTL_S", -1.0)
+    monkeypatch.setattr(quotes._cache, "ttl_s", 0.0)
+    calls = prices.calls
+    status, same, _ = _get(portfolio.portfolio_response(etag))
+    assert prices.calls == calls + 1
+    assert status == 304 and same == etag
+    assert cache.stats()["builds"] == 1
+
+    prices.prices["AAPL"] = 120.0
+    status, moved, body = _get(portfolio.portfolio_response(etag))
+    assert status == 200 and moved != etag and body["market_value"] == 1200.0
+    assert cache.stats()["builds"] == 2
+
+
+def test_quote_ages_do_not_change_the_etag(prices, cache):
+    store.log_trade("AAPL", "buy", 10, 100.0)
+    first = portfolio.positions_response()
+    row = json.loads(first.body)["positions"][0]
+    assert row["last"] == 110.0 and row["last_age_s"] is not None
+    again = portfolio.positions_response()
+    assert again.headers["ETag"] == first.headers["ETag"]
+    assert cache.stats()["hits"] >= 1
@@ -0,0 +1,146 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.config import settings
+from app.quote_chain import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, ProviderChain
+from app.quotes import QuoteProvider
+
+
+class Fake(QuoteProvider):
+    def __init__(self, name, prices=None, delay=0.0, fail=False):
+        self.name = name
+        self.prices = prices or {}
+        self.delay, self.fail = delay, fail
+        self.asked: list[list[str]] = []
+
+    def fetch_many(self, symbols):
+        self.asked.append(list(symbols))
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError(f"{self.name} down")
+        return {s: self.prices.get(s) for s in symbols}
+
+    def fetch_last(self, symbol):
+        return self.fetch_many([symbol])[symbol]
+
+    def fetch_detail(self, symbol):
+        return None
+
+
+def _stats(chain, name):
+    return next(p for p in chain.stats()["providers"] if p["name"] == name)
+
+
+def test_breaker_opens_probes_once_and_closes():
+    b = CircuitBreaker(failures=2, reset_s=0.05)
+    b.failure()
+    assert b.state == CLOSED and b.allow()
+    b.failure()
+    assert b.state == OPEN and not b.allow() and b.trips == 1
+    time.sleep(0.06)
+    assert b.allow() and b.state == HALF_OPEN
+    assert not b.allow()  # a single probe at a time
+    b.success()
+    assert b.state == CLOSED and b.failures == 0 and b.allow()
+
+
+def test_failed_probe_reopens_the_breaker():
+    b = CircuitBreaker(failures=1, reset_s=0.05)
+    b.failure()
+    time.sleep(0.06)
+    assert b.allow()
+    b.failure()
+    assert b.state == OPEN and not b.allow() and b.trips == 2
+
+
+def test_missing_symbols_fall_through_to_the_next_provider():
+    first = Fake("first", {"AAPL": 1.0})
+    second = Fake("second", {"AAPL": 9.0, "MSFT": 2.0})
+    chain = ProviderChain([first, second], timeout_s=1.0)
+    assert chain.fetch_many(["AAPL", "MSFT", "NOPE"]) == {"AAPL": 1.0, "MSFT": 2.0, "NOPE": None}
+    assert second.asked == [["MSFT", "NOPE"]]
+    assert chain.stats()["unpriced"] == 1
+
+
+def test_errors_open_the_breaker_and_skip_the_provider():
+    down = Fake("down", fail=True)
+    backup = Fake("backup", {"AAPL": 3.0})
+    chain = ProviderChain([down, backup], timeout_s=1.0)
+    chain.members[0].breaker.threshold = 2
+    for _ in range(3):
+        assert chain.fetch_last("AAPL") == 3.0
+    assert len(down.asked) == 2
+    s = _stats(chain, "down")
+    assert (s["state"], s["errors"], s["skipped"], s["breaker_trips"]) == ("open", 2, 1, 1)
+
+
+def test_slow_provider_is_hedged():
+    slow = Fake("slow", {"AAPL": 1.0}, delay=0.5)
+    fast = Fake("fast", {"AAPL": 2.0})
+    chain = ProviderChain([slow, fast], timeout_s=0.4)
+    t0 = time.perf_counter()
+    # no latency history yet: the hedge goes out after half the timeout, well before slow answers
+    assert chain.fetch_last("AAPL") == 2.0
+    assert time.perf_counter() - t0 < 0.45
+    assert _stats(chain, "fast")["hedges"] == 1 and _stats(chain, "fast")["wins"] == 1
+
+
+def test_hedge_waits_for_the_providers_p95():
+    slow = Fake("slow", {"AAPL": 1.0}, delay=0.01)
+    other = Fake("other", {"AAPL": 2.0})
+    chain = ProviderChain([slow, other], timeout_s=1.0)
+    for _ in range(25):
+        chain.members[0].observe(0.2)
+    assert chain.members[0].hedge_delay(1.0) == pytest.approx(0.2)
+    assert chain.fetch_last("AAPL") == 1.0  # answered well inside its usual p95: no hedge
+    assert other.asked == []
+
+
+def test_timeout_returns_none_and_counts_it():
+    stuck = Fake("stuck", {"AAPL": 1.0}, delay=0.3)
+    chain = ProviderChain([stuck], timeout_s=0.1)
+    t0 = time.perf_counter()
+    assert chain.fetch_last("AAPL") is None
+    assert time.perf_counter() - t0 < 0.25
+    assert _stats(chain, "stuck")["timeouts"] == 1
+
+
+class Hung(Fake):
+    def __init__(self, name):
+        super().__init__(name)
+        self.gate = threading.Event()
+
+    def fetch_many(self, symbols):
+        self.asked.append(list(symbols))
+        self.gate.wait(5)
+        return {}
+
+
+def test_hung_provider_cannot_fill_the_pool(monkeypatch):
+    monkeypatch.setattr(settings, "QUOTE_FETCH_WORKERS", 1)  # حصة كل مزوّد: خيطان
+    hung = Hung("hung")
+    backup = Fake("backup", {"AAPL": 2.0})
+    chain = ProviderChain([hung, backup], timeout_s=0.1)
+    try:
+        for _ in range(4):
+            assert chain.fetch_last("AAPL") == 2.0
+        assert len(hung.asked) == 2
+        s = _stats(chain, "hung")
+        assert (s["inflight"], s["saturated"]) == (2, 2)
+        assert _stats(chain, "backup")["inflight"] == 0
+    finally:
+        hung.gate.set()
+    deadline = time.monotonic() + 2
+    while chain.members[0].inflight and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert chain.members[0].inflight == 0
+
+
+def test_unpriced_counter_is_exact_across_threads():
+    chain = ProviderChain([Fake("empty")], timeout_s=1.0)
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda _: chain.fetch_many(["A", "B", "C"]), range(200)))
+    assert chain.stats()["unpriced"] == 600
@@ -0,0 +1,39 @@
+import asyncio
+
+from app.quote_stream import QuoteStream
+
+
+def test_snapshot_then_only_changes():
+    async def go():
+        stream = QuoteStream(0.2, 10)
+        sub = stream.subscribe(["msft"])
+        first = await sub.next(2)
+        assert first["type"] == "snapshot"
+        assert "MSFT" in {q["symbol"] for q in first["quotes"]}
+        stream._wake.set()
+        await asyncio.sleep(0.05)
+        assert sub.queue.empty()  # لا تغيير في السعر: لا رسالة
+        stream.unsubscribe(sub)
+
+    asyncio.run(go())
+
+
+def test_last_is_pruned_with_its_last_subscriber():
+    async def go():
+        stream = QuoteStream(0.2, 10)
+        a = stream.subscribe(["ZZZ0", "ZZZ1"])
+        b = stream.subscribe(["ZZZ1", "ZZZ2"])
+        await a.next(2)
+        await b.next(2)
+        assert {"ZZZ0", "ZZZ1", "ZZZ2"} <= stream._last.keys()
+
+        stream.unsubscribe(a)
+        assert "ZZZ1" in stream._last and "ZZZ2" in stream._last
+        assert "ZZZ0" not in stream._last
+
+        stream.unsubscribe(b)
+        assert stream._last == {}
+        await asyncio.sleep(0.3)
+        assert not stream.stats()["running"]
+
+    asyncio.run(go())
@@ -0,0 +1,104 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.quotes import QuoteCache
+
+
+class Loader:
+    def __init__(self, prices=None, fail=False):
+        self.calls: list[list[str]] = []
+        self.prices = prices or {}
+        self.fail = fail
+        self.gate: threading.Event | None = None
+
+    def __call__(self, keys):
+        self.calls.append(list(keys))
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.fail:
+            raise RuntimeError("provider down")
+        return {k: self.prices.get(k, 1.0) for k in keys}
+
+
+def test_hits_within_ttl_and_refetch_after():
+    cache = QuoteCache(ttl_s=0.05, max_entries=10, max_stale_s=60)
+    load = Loader({"AAPL": 10.0})
+    assert cache.get_many(["AAPL"], load)["AAPL"][0] == 10.0
+    value, age, stale = cache.get_many(["AAPL"], load)["AAPL"]
+    assert (value, stale) == (10.0, False) and age < 0.05
+    assert len(load.calls) == 1
+    time.sleep(0.06)
+    cache.get_many(["AAPL"], load)
+    assert len(load.calls) == 2
+    assert cache.stats()["hits"] == 1 and cache.stats()["stale"] == 1
+
+
+def test_only_missing_keys_are_loaded_in_one_call():
+    cache = QuoteCache(60, 10, 60)
+    load = Loader()
+    cache.get_many(["A", "B"], load)
+    cache.get_many(["B", "C", "D", "C"], load)
+    assert load.calls == [["A", "B"], ["C", "D"]]
+
+
+def test_lru_eviction():
+    cache = QuoteCache(60, 2, 60)
+    load = Loader()
+    cache.get_many(["A"], load)
+    cache.get_many(["B"], load)
+    cache.get_many(["A"], load)  # A is now the most recently used
+    cache.get_many(["C"], load)  # evicts B
+    assert cache.ages(["A", "B", "C"])["B"] is None
+    cache.get_many(["A", "B"], load)
+    assert load.calls[-1] == ["B"]
+    assert cache.stats()["evictions"] == 2
+
+
+def test_concurrent_lookups_share_one_fetch():
+    cache = QuoteCache(60, 10, 60)
+    load = Loader({"AAPL": 5.0})
+    load.gate = threading.Event()
+    with ThreadPoolExecutor(8) as pool:
+        futures = [pool.submit(cache.get_many, ["AAPL"], load) for _ in range(8)]
+        while cache.stats()["coalesced"] < 7:
+            time.sleep(0.001)
+        load.gate.set()
+        results = [f.result()["AAPL"][0] for f in futures]
+    assert results == [5.0] * 8
+    assert load.calls == [["AAPL"]]
+
+
+def test_failures_serve_stale_then_nothing():
+    cache = QuoteCache(ttl_s=0.0, max_entries=10, max_stale_s=0.2)
+    cache.get_many(["AAPL"], Loader({"AAPL": 7.0}))
+    down = Loader(fail=True)
+    assert cache.get_many(["AAPL"], down)["AAPL"][::2] == (7.0, True)
+    time.sleep(0.25)
+    assert cache.get_many(["AAPL"], down)["AAPL"] == (None, 0.0, False)
+    assert cache.get_many(["MSFT"], down)["MSFT"] == (None, 0.0, False)
+    assert cache.stats()["inflight"] == 0
+
+
+def test_waiters_are_released_when_the_loader_is_interrupted():
+    cache = QuoteCache(60, 10, 60)
+
+    def interrupted(keys):
+        raise KeyboardInterrupt
+
+    try:
+        cache.get_many(["AAPL"], interrupted)
+    except KeyboardInterrupt:
+        pass
+    assert cache.stats()["inflight"] == 0
+    assert cache.get_many(["AAPL"], Loader({"AAPL": 3.0}))["AAPL"][0] == 3.0
+
+
+def test_version_changes_only_with_the_value():
+    cache = QuoteCache(0.0, 10, 60)
+    cache.get_many(["AAPL"], Loader({"AAPL": 1.0}))
+    v = cache.version(["AAPL"])
+    cache.get_many(["AAPL"], Loader({"AAPL": 1.0}))
+    assert cache.version(["AAPL"]) == v
+    cache.get_many(["AAPL"], Loader({"AAPL": 2.0}))
+    assert cache.version(["AAPL"]) > v
@@ -0,0 +1,28 @@
+import subprocess
+import sys
+
+from bench.startup import LAZY, ROOT, boot_once
+
+
+def test_boot_leaves_heavy_modules_unloaded():
+    # a fresh interpreter, like a uvicorn worker spawn: this process has already imported the app
+    assert boot_once()["loaded"] == [], f"imported during boot, must stay lazy: {LAZY}"
+
+
+def test_scalar_decisions_do_not_import_numpy():
+    code = ("import sys; from app.ai import decide_from_indicators as d; d(rsi=25, ema_fast=2, ema_slow=1); "
+            "print('numpy' in sys.modules)")
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "False"
+
+
+def test_lifespan_loads_indicator_state(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import main
+    from app import indicator_state
+
+    monkeypatch.setattr(indicator_state, "_book", indicator_state.IndicatorBook(60))
+    assert not indicator_state.loaded()
+    with TestClient(main.app):
+        assert indicator_state.loaded()
@@ -0,0 +1,112 @@
+import time
+
+import pytest
+
+from app import db, store
+
+
+def test_apply_fill_averages_closes_and_flips():
+    pos = store.apply_fill((0, 0.0, 0.0), "buy", 10, 100.0)
+    assert pos == (10, 100.0, 0.0)
+    pos = store.apply_fill(pos, "buy", 10, 110.0)
+    assert pos == (20, pytest.approx(105.0), 0.0)
+    pos = store.apply_fill(pos, "sell", 5, 115.0)  # partial close: realizes on the average cost
+    assert pos == (15, pytest.approx(105.0), pytest.approx(50.0))
+    pos = store.apply_fill(pos, "sell", 20, 100.0)  # through zero: the rest opens short at the fill price
+    assert pos == (-5, pytest.approx(100.0), pytest.approx(-25.0))
+    pos = store.apply_fill(pos, "buy", 5, 90.0)
+    assert pos == (0, 0.0, pytest.approx(25.0))
+
+
+def test_log_trade_updates_the_ledger():
+    store.log_trade("AAPL", "buy", 10, 100.0)
+    store.log_trade("MSFT", "buy", 2, 300.0)
+    store.log_trade("AAPL", "sell", 4, 120.0)
+    assert store.get_open_positions() == [
+        {"symbol": "AAPL", "net_qty": 6, "avg_cost": 100.0},
+        {"symbol": "MSFT", "net_qty": 2, "avg_cost": 300.0},
+    ]
+    assert store.get_realized_pnl() == {"AAPL": pytest.approx(80.0), "MSFT": 0.0}
+    assert store.sum_buys_sells() == (pytest.approx(1600.0), pytest.approx(480.0))
+    trade_id, positions, cash = store.get_book()
+    assert trade_id == 3 and len(positions) == 2
+    assert cash == pytest.approx(10_000 - 1600 + 480)
+    assert store.check_positions() == []
+    assert store.check_totals() == []
+
+
+def test_bulk_log_matches_one_by_one():
+    trades = [("AAPL", "buy", 3, 10.0, ""), ("AAPL", "buy", 1, 14.0, ""), ("TSLA", "buy", 2, 50.0, ""),
+              ("AAPL", "sell", 4, 12.0, "")]
+    ids = store.log_trades_bulk(trades)
+    assert ids == [1, 2, 3, 4]
+    bulk = store._ledger.snapshot()
+    store.rebuild_positions()
+    assert store._ledger.snapshot() == bulk
+    assert store.check_positions() == []
+
+
+def test_positions_check_and_rebuild():
+    store.log_trade("AAPL", "buy", 10, 100.0)
+    store.log_trade("AAPL", "sell", 3, 110.0)
+    with db.transaction() as conn:
+        conn.execute("UPDATE positions SET net_qty=99 WHERE symbol='AAPL'")
+        conn.execute("INSERT INTO positions(symbol,net_qty,avg_cost,realized_pnl) VALUES ('GHOST',1,1,0)")
+    issues = store.check_positions()
+    assert [i["symbol"] for i in issues] == ["AAPL", "GHOST"]
+
+    assert store.rebuild_positions() == 1
+    assert store.check_positions() == []
+    assert store.get_open_positions() == [{"symbol": "AAPL", "net_qty": 7, "avg_cost": 100.0}]
+
+
+def test_totals_check_and_rebuild():
+    store.log_trade("AAPL", "buy", 10, 100.0)
+    store.log_trade("AAPL", "sell", 5, 120.0)
+    with db.transaction() as conn:
+        store._write_totals(conn, (1.0, 2.0), 2)
+    assert {i["total"] for i in store.check_totals()} == {"buy_notional", "sell_notional"}
+
+    assert store.rebuild_totals() == (pytest.approx(1000.0), pytest.approx(600.0))
+    assert store.check_totals() == []
+    assert store.get_exposure_value() == pytest.approx(1000.0)
+
+
+def test_init_db_migrates_a_trades_only_database():
+    with db.transaction() as conn:
+        conn.execute("INSERT INTO trades(symbol,side,qty,price,note) VALUES ('AAPL','buy',4,25.0,'')")
+        conn.execute("DELETE FROM positions")
+        conn.execute("DELETE FROM trade_totals")
+        conn.execute("INSERT INTO state(key,val) VALUES ('trade_totals','{}')")  # where older versions kept them
+    store.init_db()
+    assert store.check_positions() == []
+    assert store.check_totals() == []
+    assert store.get_exposure_value() == pytest.approx(100.0)
+    with db.read() as conn:
+        assert conn.execute("SELECT 1 FROM state WHERE key='trade_totals'").fetchone() is None
+
+
+def test_trades_do_not_bump_state_versions():
+    store.set_watchlist(["AAPL"])
+    before = store.state_version(), store.state_version("watchlist")
+    store.log_trade("AAPL", "buy", 1, 10.0)
+    assert store.is_kill_switch_on() is False
+    assert (store.state_version(), store.state_version("watchlist")) == before
+    assert store.toggle_kill_switch() is True
+    assert store.state_version() > before[0]
+    assert store.state_version("watchlist") == before[1]
+
+
+def test_state_written_by_another_connection_is_seen():
+    assert store.get_watchlist() == ["AAPL", "TSLA"]
+    conn = db.get_db().dedicated(readonly=False)
+    conn.execute("UPDATE state SET val='[\"MSFT\"]' WHERE key='watchlist'")  # another worker
+    assert store.get_watchlist() == ["MSFT"]
+
+
+def test_expired_reservations_do_not_count():
+    assert store.reserve_exposure("stale", 900.0, 0.05)
+    assert not store.reserve_exposure("new", 200.0, 30)
+    time.sleep(0.1)
+    assert store.get_reserved_exposure() == 0
+    assert store.reserve_exposure("new", 200.0, 30)
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from app.tickstore import TICK_DTYPE, TickStore
+
+
+@pytest.fixture
+def ticks(tmp_path):
+    return TickStore(str(tmp_path / "ticks"))
+
+
+def _records(ts, price=1.0):
+    out = np.empty(len(ts), dtype=TICK_DTYPE)
+    out["ts"], out["price"] = ts, price
+    return out
+
+
+def test_out_of_order_appends_are_still_found(ticks):
+    # two workers whose clocks are a little apart append interleaved
+    ticks.append_many("AAPL", _records([1.0, 2.0, 4.0]))
+    ticks.append_many("AAPL", _records([3.0, 5.0]))
+    assert ticks.ticks("AAPL", 2.5, 3.5)["ts"].tolist() == [3.0]
+    assert ticks.ticks("AAPL")["ts"].tolist() == [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert ticks.last("AAPL")[0] == 5.0
+    assert ticks.stats()["reordered"] == 1
+
+    # in-order growth of a sorted file only checks the new tail and stays a view of the mapping
+    ticks.append_many("MSFT", _records([1.0, 2.0]))
+    ticks.ticks("MSFT")
+    ticks.append_many("MSFT", _records([2.0, 3.0]))
+    view = ticks.ticks("MSFT")
+    assert view["ts"].tolist() == [1.0, 2.0, 2.0, 3.0] and isinstance(view, np.memmap)
+    assert ticks.stats()["reordered"] == 1
+
+
+def test_append_and_range_search(ticks):
+    ticks.append("AAPL", 10.0, ts=100.0)
+    ticks.append("aapl ", 11.0, ts=101.0)  # same file: symbols are normalised
+    ticks.append_many("AAPL", _records([102.0, 103.0, 104.0], [12.0, 13.0, 14.0]))
+    assert ticks.symbols() == ["AAPL"]
+    assert ticks.stats()["appended"] == 5
+    # both bounds inclusive
+    assert ticks.ticks("AAPL", 101.0, 103.0)["price"].tolist() == [11.0, 12.0, 13.0]
+    assert ticks.ticks("AAPL", 103.5)["ts"].tolist() == [104.0]
+    assert ticks.ticks("AAPL", end=99.0).size == 0
+    assert ticks.last("AAPL") == (104.0, 14.0)
+    assert ticks.ticks("MSFT").size == 0 and ticks.last("MSFT") is None
+
+
+def test_reads_see_later_appends(ticks):
+    ticks.append("AAPL", 1.0, ts=1.0)
+    assert len(ticks.ticks("AAPL")) == 1
+    ticks.append("AAPL", 2.0, ts=2.0)
+    assert len(ticks.ticks("AAPL")) == 2
+
+
+def test_symbols_cannot_escape_the_root(ticks, tmp_path):
+    ticks.append("../../etc/passwd", 1.0)
+    assert ticks.path("../x").startswith(ticks.root)
+    assert not (tmp_path / "etc").exists()
+
+
+def test_ohlc(ticks):
+    ticks.append_many("AAPL", _records([0.0, 10.0, 59.0, 60.0, 179.0], [5.0, 7.0, 6.0, 8.0, 9.0]))
+    bars = ticks.ohlc("AAPL", 60.0)
+    assert bars["ts"].tolist() == [0.0, 60.0, 120.0]
+    assert [tuple(b)[1:] for b in bars] == [(5.0, 7.0, 5.0, 6.0, 3), (8.0, 8.0, 8.0, 8.0, 1), (9.0, 9.0, 9.0, 9.0, 1)]
+    with pytest.raises(ValueError):
+        ticks.ohlc("AAPL", 0)
+
+
+def test_mapped_files_are_capped(tmp_path):
+    ticks = TickStore(str(tmp_path), max_open=2)
+    for s in ("A", "B", "C"):
+        ticks.append(s, 1.0, ts=1.0)
+        ticks.ticks(s)
+    assert ticks.stats()["open_maps"] == 2 and ticks.stats()["open_files"] == 2
@@ -0,0 +1,77 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import db, store
+from app.router import router
+
+
+def _seed():
+    store.log_trades_bulk([(s, side, 1, 10.0, "") for s, side in
+                           [("AAPL", "buy"), ("MSFT", "buy"), ("AAPL", "sell"), ("AAPL", "buy"), ("TSLA", "sell")]])
+    with db.transaction() as conn:
+        conn.executemany("UPDATE trades SET ts=? WHERE id=?", [
+            ("2024-01-01 09:00:00", 1), ("2024-01-01 12:00:00", 2), ("2024-01-02 00:00:00", 3),
+            ("2024-01-02 15:30:00", 4), ("2024-01-03 08:00:00", 5),
+        ])
+
+
+def _ids(rows):
+    return [r["id"] if isinstance(r, dict) else r[0] for r in rows]
+
+
+def test_keyset_pages_cover_everything_once():
+    _seed()
+    seen, cursor = [], None
+    while True:
+        page, cursor = store.get_trades(limit=2, cursor=cursor)
+        seen += _ids(page)
+        if cursor is None:
+            break
+        assert cursor == seen[-1]
+    assert seen == [5, 4, 3, 2, 1]
+    # a trade logged between pages does not shift the next page
+    page, cursor = store.get_trades(limit=2)
+    store.log_trade("AAPL", "buy", 1, 10.0)
+    assert _ids(store.get_trades(limit=2, cursor=cursor)[0]) == [3, 2]
+    assert store.get_trades(limit=10_000)[0][0]["id"] == 6 and len(store.get_trades(limit=10_000)[0]) == 6
+
+
+def test_filters():
+    _seed()
+    assert _ids(store.get_trades(symbol=" aapl ")[0]) == [4, 3, 1]
+    assert _ids(store.get_trades(symbol="AAPL", side="BUY")[0]) == [4, 1]
+    # since is inclusive, until exclusive; dates alone mean midnight UTC
+    assert _ids(store.get_trades(since="2024-01-01T12:00:00", until="2024-01-02")[0]) == [2]
+    # offsets are converted to UTC: 10:30-05:00 is 15:30Z
+    assert _ids(store.get_trades(since="2024-01-02T10:30:00-05:00")[0]) == [5, 4]
+    assert _ids(store.get_trades(until="2024-01-01T09:00:00Z")[0]) == []
+    assert _ids(store.iter_trades(symbol="AAPL", since="2024-01-01T10:00")) == [3, 4]
+
+
+def test_iter_trades_in_chunks():
+    _seed()
+    assert _ids(store.iter_trades(chunk_size=2)) == [1, 2, 3, 4, 5]
+    assert _ids(store.iter_trades(side="sell", chunk_size=1)) == [3, 5]
+    assert list(store.iter_trades(symbol="NONE")) == []
+
+
+def test_invalid_bounds():
+    with pytest.raises(ValueError):
+        store.get_trades(since="yesterday")
+    with pytest.raises(ValueError):
+        next(store.iter_trades(until="2024-13-01"))
+
+    client = TestClient(FastAPI(routes=router.routes))
+    assert client.get("/api/trades", params={"since": "nope"}).status_code == 400
+    assert client.get("/api/trades/export", params={"until": "nope"}).status_code == 400
+    assert client.get("/api/trades/export", params={"format": "xml"}).status_code == 400
+
+
+def test_export_streams_csv_and_ndjson():
+    _seed()
+    client = TestClient(FastAPI(routes=router.routes))
+    csv_lines = client.get("/api/trades/export", params={"symbol": "AAPL"}).text.strip().splitlines()
+    assert csv_lines[0] == ",".join(store.TRADE_COLUMNS) and len(csv_lines) == 4
+    nd = client.get("/api/trades/export", params={"format": "ndjson", "side": "sell"}).text.strip().splitlines()
+    assert len(nd) == 2 and '"symbol": "TSLA"' in nd[1]
@@ -0,0 +1,26 @@
+import json
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import db, dedup
+from app.router import router
+
+client = TestClient(FastAPI(routes=router.routes))
+
+
+def test_tv2_result_is_stored_without_the_secret():
+    # rsi in the neutral band: a HOLD decision, nothing is priced or traded
+    body = {"symbol": "AAPL", "rsi": 50.0}
+    first = client.post("/webhook-tv2?secret=s3cr3t&x=1", json=body)
+    assert first.status_code == 200
+    assert first.json()["debug"]["secret_query"] == "***"
+    assert "s3cr3t" not in first.json()["debug"]["url"]
+
+    with db.read() as conn:
+        stored = [r[0] for r in conn.execute("SELECT result FROM webhook_dedup")]
+    assert len(stored) == 1 and "s3cr3t" not in stored[0]
+
+    replay = client.post("/webhook-tv2?secret=other", json=body)
+    assert replay.headers[dedup.HEADER] == "hit"
+    assert json.loads(replay.content) == first.json()